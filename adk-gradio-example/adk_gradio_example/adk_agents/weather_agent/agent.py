@@ -5,6 +5,12 @@ from google.adk.runners import Runner
 from google.genai import types # For creating message Content/Parts
 from google.adk.tools.tool_context import ToolContext
 
+from .credentials import SessionKeyGemini
+from .llm_cache import CachingLlm
+from .mock_model import ScriptedLlm
+from .tool_cache import memoize_tool
+
+import os
 import warnings
 # Ignore all warnings
 warnings.filterwarnings("ignore")
@@ -15,7 +21,20 @@ logging.basicConfig(level=logging.ERROR)
 print("Libraries imported.")
 
 
+# Mock weather data for simplicity
+MOCK_WEATHER_DB = {
+    "newyork": {"temp_c": 25, "condition": "sunny"},
+    "london": {"temp_c": 15, "condition": "cloudy"},
+    "tokyo": {"temp_c": 18, "condition": "light rain"},
+}
+
+
 # @title Define the get_weather Tool
+# Results are cached per city and temperature unit, for WEATHER_AGENT_TOOL_CACHE_TTL seconds (see tool_cache.py)
+@memoize_tool(
+    ttl=float(os.environ.get("WEATHER_AGENT_TOOL_CACHE_TTL", "300")),
+    state_keys=("user_preference_temperature_unit",),
+)
 def get_weather(city: str, tool_context: ToolContext) -> dict:
     """Retrieves the current weather report for a specified city.
 
@@ -37,16 +56,9 @@ def get_weather(city: str, tool_context: ToolContext) -> dict:
 
     city_normalized = city.lower().replace(" ", "") # Basic input normalization
 
-    # Mock weather data for simplicity
-    mock_weather_db = {
-        "newyork": {"temp_c": 25, "condition": "sunny"},
-        "london": {"temp_c": 15, "condition": "cloudy"},
-        "tokyo": {"temp_c": 18, "condition": "light rain"},
-    }
-
     # Best Practice: Handle potential errors gracefully within the tool
-    if city_normalized in mock_weather_db:
-        data = mock_weather_db[city_normalized]
+    if city_normalized in MOCK_WEATHER_DB:
+        data = MOCK_WEATHER_DB[city_normalized]
         temp_c = data["temp_c"]
         condition = data["condition"]
 
@@ -71,9 +83,17 @@ def get_weather(city: str, tool_context: ToolContext) -> dict:
 
 # @title Define the Weather Agent
 
+# WEATHER_AGENT_MODEL=scripted replays recorded responses instead of calling Gemini (see mock_model.py)
+if os.environ.get("WEATHER_AGENT_MODEL", "gemini") == "scripted":
+    model = ScriptedLlm.from_env()
+else:
+    model = SessionKeyGemini(model="gemini-2.0-flash") # Specifies the underlying LLM, called with the key of the request (see credentials.py)
+# WEATHER_AGENT_LLM_CACHE=readwrite|record|replay caches the model responses on disk (see llm_cache.py)
+model = CachingLlm.from_env(model)
+
 root_agent = Agent(
     name="weather_agent_v1",
-    model="gemini-2.0-flash", # Specifies the underlying LLM
+    model=model,
     description="Provides weather information for specific cities.", # Crucial for delegation later
     instruction="You are a helpful weather assistant. Your primary goal is to provide current weather reports. "
                 "When the user asks for the weather in a specific city, "
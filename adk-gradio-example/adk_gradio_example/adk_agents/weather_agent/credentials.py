@@ -0,0 +1,87 @@
+"""Per-request Google API keys for the agent's model.
+
+The Gradio app lets each user set their own API key. Instead of swapping the
+process-wide GOOGLE_API_KEY environment variable (which races between concurrent
+requests), the key travels with each `/run` or `/run_sse` request in the
+`X-Goog-Api-Key` header:
+
+- `ApiKeyMiddleware`, added to the ADK FastAPI app, stores the header value in a
+  context variable for the duration of the request
+- `SessionKeyGemini` uses a client built for that key (cached per key), or the
+  default client when the request has no key
+
+The middleware is only installed when the ADK API server runs inside the Gradio
+app (`python app.py --no-external-adk-api-server`); a standalone `adk api_server`
+ignores the header and uses the key from its environment.
+
+This module lives next to the agent because the ADK loader imports the agent as
+the top-level `weather_agent` package: the app must import it as
+`weather_agent.credentials` too, so that both share the same context variable.
+"""
+
+from collections import OrderedDict
+from contextvars import ContextVar
+import threading
+from typing import Optional
+
+from google.adk.models import Gemini
+from google.genai import Client, types
+
+API_KEY_HEADER = "x-goog-api-key"
+
+_MAX_CLIENTS = 64
+
+request_api_key: ContextVar[Optional[str]] = ContextVar(
+    "request_api_key", default=None
+)
+
+_clients: "OrderedDict[str, Client]" = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+class ApiKeyMiddleware:
+    """ASGI middleware exposing the `X-Goog-Api-Key` header as `request_api_key`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        api_key = None
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == API_KEY_HEADER.encode():
+                    api_key = value.decode()
+                    break
+        if not api_key:
+            await self.app(scope, receive, send)
+            return
+        token = request_api_key.set(api_key)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_api_key.reset(token)
+
+
+def _client_for_key(api_key: str, headers: dict) -> Client:
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is not None:
+            _clients.move_to_end(api_key)
+            return client
+    client = Client(api_key=api_key, http_options=types.HttpOptions(headers=headers))
+    with _clients_lock:
+        client = _clients.setdefault(api_key, client)
+        while len(_clients) > _MAX_CLIENTS:
+            _clients.popitem(last=False)
+    return client
+
+
+class SessionKeyGemini(Gemini):
+    """Gemini model calling the API with the key of the current request, if any."""
+
+    @property
+    def api_client(self) -> Client:
+        api_key = request_api_key.get()
+        if api_key:
+            return _client_for_key(api_key, self._tracking_headers)
+        return super().api_client
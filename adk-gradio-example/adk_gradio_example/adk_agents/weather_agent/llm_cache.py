@@ -0,0 +1,271 @@
+"""Disk cache of the agent's model responses, for replaying conversations.
+
+`CachingLlm` wraps the agent's model and keys each call on a hash of the request
+in canonical form: model, system instruction, contents and tool declarations,
+serialized with sorted keys, without the random ids ADK gives to function calls
+and responses. The responses are stored zlib-compressed in a SQLite database,
+dropped after a TTL and, least recently used first, when the database outgrows
+its size budget. The model calls read and write the database in a thread, so
+they do not block the event loop of the ADK API server.
+
+Modes:
+
+- "off": no cache, the model is called directly (default)
+- "readwrite": cached responses are returned, misses call the model and are stored
+- "record": the model is always called, and its responses stored
+- "replay": only cached responses are returned; a miss is an error response,
+  the model is never called
+
+Each response carries its cache outcome and the hit and miss counts of the
+process in `custom_metadata["llm_cache"]`, shown with the LLM response in the
+agent inspector, and as `gcp.vertex.agent.llm_cache.*` attributes of the
+`call_llm` span.
+
+The agent sets it up from the environment (see `from_env`):
+
+- WEATHER_AGENT_LLM_CACHE: the mode
+- WEATHER_AGENT_LLM_CACHE_PATH: the database (default "llm_cache.db")
+- WEATHER_AGENT_LLM_CACHE_TTL: seconds a response is kept (default 7 days, 0: forever)
+- WEATHER_AGENT_LLM_CACHE_MAX_BYTES: size budget (default 64 MiB of compressed
+  responses)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncGenerator, List, Optional
+import zlib
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from opentelemetry import trace
+
+MODES = ("off", "readwrite", "record", "replay")
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+SPAN_ATTRIBUTE_PREFIX = "gcp.vertex.agent.llm_cache"
+
+
+def _without_ids(value: Any) -> Any:
+    """`value` without the ids of its function calls and responses."""
+    if isinstance(value, dict):
+        value = {k: _without_ids(v) for k, v in value.items()}
+        for name in ("function_call", "function_response"):
+            if isinstance(value.get(name), dict):
+                value[name].pop("id", None)
+        return value
+    if isinstance(value, list):
+        return [_without_ids(v) for v in value]
+    return value
+
+
+def request_key(llm_request: LlmRequest) -> str:
+    """SHA-256 of the canonical form of the request."""
+    config = llm_request.config
+    canonical = {
+        "model": llm_request.model,
+        "system_instruction": config.system_instruction if config else None,
+        "contents": [
+            c.model_dump(mode="json", exclude_none=True) for c in llm_request.contents
+        ],
+        "tools": [
+            t.model_dump(mode="json", exclude_none=True) for t in (config.tools or [])
+        ]
+        if config
+        else [],
+    }
+    data = json.dumps(
+        _without_ids(canonical), sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class LlmResponseCache:
+    """Responses by request key, in a SQLite database bounded by TTL and size."""
+
+    # evict over-budget entries every so many writes (the size is a table scan)
+    EVICT_EVERY = 32
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        clock=time.time,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False, timeout=30
+        )
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_created ON responses (created);
+            CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+            """
+        )
+
+    def get(self, key: str) -> Optional[List[LlmResponse]]:
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl and row[1] <= now - self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+        return [
+            LlmResponse.model_validate(r) for r in json.loads(zlib.decompress(row[0]))
+        ]
+
+    def put(self, key: str, responses: List[LlmResponse]) -> None:
+        content = zlib.compress(
+            json.dumps(
+                [r.model_dump(mode="json", exclude_none=True) for r in responses]
+            ).encode(),
+            1,
+        )
+        if len(content) > self.max_bytes:
+            return
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, content, len(content), now, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        if self.ttl:
+            self._conn.execute(
+                "DELETE FROM responses WHERE created <= ?", (now - self.ttl,)
+            )
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # drop the least recently used entries, down to 90% of the budget
+        excess = total - int(self.max_bytes * 0.9)
+        self._conn.execute(
+            """
+            DELETE FROM responses WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(size) OVER (ORDER BY last_used, rowid) - size
+                        AS freed_before
+                    FROM responses
+                ) WHERE freed_before < ?
+            )
+            """,
+            (excess,),
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class CachingLlm(BaseLlm):
+    """`llm` behind a response cache, in one of the `MODES`."""
+
+    llm: BaseLlm
+    cache: LlmResponseCache
+    mode: str = "readwrite"
+
+    def __init__(self, llm: BaseLlm, cache: LlmResponseCache, mode: str = "readwrite"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown LLM cache mode: {mode!r} (use one of {MODES})")
+        super().__init__(model=llm.model, llm=llm, cache=cache, mode=mode)
+
+    @classmethod
+    def from_env(cls, llm: BaseLlm) -> BaseLlm:
+        """`llm` behind the cache configured by the environment, or `llm` when off."""
+        mode = os.environ.get("WEATHER_AGENT_LLM_CACHE", "off")
+        if mode == "off":
+            return llm
+        cache = LlmResponseCache(
+            os.environ.get("WEATHER_AGENT_LLM_CACHE_PATH", "llm_cache.db"),
+            ttl=float(os.environ.get("WEATHER_AGENT_LLM_CACHE_TTL", DEFAULT_TTL)),
+            max_bytes=int(
+                os.environ.get("WEATHER_AGENT_LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+            ),
+        )
+        return cls(llm, cache, mode)
+
+    def _annotate(self, response: LlmResponse, outcome: str, key: str) -> LlmResponse:
+        stats = {
+            "outcome": outcome,
+            "key": key[:16],
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+        }
+        response.custom_metadata = {**(response.custom_metadata or {}), "llm_cache": stats}
+        span = trace.get_current_span()
+        for name, value in stats.items():
+            span.set_attribute(f"{SPAN_ATTRIBUTE_PREFIX}.{name}", value)
+        return response
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        key = request_key(llm_request)
+
+        # the database is read and written in a thread, off the event loop
+        if self.mode in ("readwrite", "replay"):
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                for response in cached:
+                    yield self._annotate(response, "hit", key)
+                return
+            if self.mode == "replay":
+                yield self._annotate(
+                    LlmResponse(
+                        error_code="LLM_CACHE_MISS",
+                        error_message="No cached response for this request (replay mode).",
+                    ),
+                    "miss",
+                    key,
+                )
+                return
+
+        outcome = "miss" if self.mode == "readwrite" else "record"
+        # partial text chunks are streamed through, the complete responses stored
+        complete: List[LlmResponse] = []
+        failed = False
+        async for response in self.llm.generate_content_async(llm_request, stream):
+            if response.partial:
+                yield response
+                continue
+            failed = failed or response.error_code is not None
+            complete.append(response.model_copy(deep=True))
+            yield self._annotate(response, outcome, key)
+        if complete and not failed:
+            await asyncio.to_thread(self.cache.put, key, complete)
@@ -0,0 +1,175 @@
+"""Local model replaying scripted responses, to run the agent offline.
+
+`ScriptedLlm` answers each LLM request with the next response of a script, so the
+ADK runner, the tool calls and the tracing run as with Gemini, without network
+access or API key. A script is a list of `llm_response`s, as recorded in the
+traces of the ADK web UI (see `demo/event-trace` of the agent inspector):
+
+- a JSON file with a list of responses (or of traces), or a single trace
+- a directory of `trace-*.json` files, replayed in file name order
+
+The response returned for a request is picked by the number of model turns
+already in its contents, so the same conversation always gets the same responses
+(concurrent sessions do not share a position in the script), and the script
+starts over when it is exhausted. The default script is the recorded weather
+conversation: a greeting, a `get_weather` call and the weather report.
+
+The agent uses it when WEATHER_AGENT_MODEL is "scripted" (see `from_env`):
+
+- WEATHER_AGENT_SCRIPT: the script file or directory (default: built-in script)
+- WEATHER_AGENT_LATENCY: seconds spent per call (default 0)
+- WEATHER_AGENT_PROMPT_TOKENS / WEATHER_AGENT_CANDIDATES_TOKENS: token counts
+  reported in the usage metadata (default: the recorded ones)
+"""
+
+import asyncio
+import glob
+import json
+import os
+from typing import AsyncGenerator, List, Optional
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types
+
+DEFAULT_SCRIPT = [
+    {
+        "content": {
+            "parts": [{"text": "Hi there! How can I help you today?\n"}],
+            "role": "model",
+        },
+        "usage_metadata": {
+            "candidates_token_count": 11,
+            "prompt_token_count": 246,
+            "total_token_count": 257,
+        },
+    },
+    {
+        "content": {
+            "parts": [
+                {"function_call": {"args": {"city": "New York"}, "name": "get_weather"}}
+            ],
+            "role": "model",
+        },
+        "usage_metadata": {
+            "candidates_token_count": 6,
+            "prompt_token_count": 264,
+            "total_token_count": 270,
+        },
+    },
+    {
+        "content": {
+            "parts": [
+                {"text": "The weather in New York is sunny with a temperature of 25°C.\n"}
+            ],
+            "role": "model",
+        },
+        "usage_metadata": {
+            "candidates_token_count": 18,
+            "prompt_token_count": 293,
+            "total_token_count": 311,
+        },
+    },
+]
+
+LLM_RESPONSE_ATTRIBUTE = "gcp.vertex.agent.llm_response"
+
+
+def _response_from_fixture(fixture: dict) -> Optional[LlmResponse]:
+    """`fixture` is an `llm_response` or a trace; None when it has no response."""
+    if LLM_RESPONSE_ATTRIBUTE in fixture:
+        fixture = json.loads(fixture[LLM_RESPONSE_ATTRIBUTE] or "{}")
+    if not fixture:
+        return None
+    return LlmResponse.model_validate(fixture)
+
+
+def load_script(path: str) -> List[LlmResponse]:
+    """Reads the responses of a JSON file or of the `trace-*.json` of a directory."""
+    if os.path.isdir(path):
+        fixtures = []
+        for file in sorted(glob.glob(os.path.join(path, "trace-*.json"))):
+            with open(file, encoding="utf-8") as f:
+                fixtures.append(json.load(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            fixtures = json.load(f)
+        if isinstance(fixtures, dict):
+            fixtures = [fixtures]
+    script = [r for r in map(_response_from_fixture, fixtures) if r is not None]
+    if not script:
+        raise ValueError(f"No llm_response found in {path}")
+    return script
+
+
+class ScriptedLlm(BaseLlm):
+    """Model replaying `script`, with a fixed latency and token counts per call."""
+
+    model: str = "scripted"
+    script: List[LlmResponse] = [
+        LlmResponse.model_validate(r) for r in DEFAULT_SCRIPT
+    ]
+    # seconds spent before the (first chunk of the) response
+    latency: float = 0.0
+    # override the token counts of the scripted usage metadata
+    prompt_tokens: Optional[int] = None
+    candidates_tokens: Optional[int] = None
+    # words per partial response when streaming text
+    chunk_words: int = 4
+
+    @classmethod
+    def supported_models(cls) -> list[str]:
+        return [r"scripted"]
+
+    @classmethod
+    def from_env(cls) -> "ScriptedLlm":
+        options = {}
+        if os.environ.get("WEATHER_AGENT_SCRIPT"):
+            options["script"] = load_script(os.environ["WEATHER_AGENT_SCRIPT"])
+        if os.environ.get("WEATHER_AGENT_LATENCY"):
+            options["latency"] = float(os.environ["WEATHER_AGENT_LATENCY"])
+        if os.environ.get("WEATHER_AGENT_PROMPT_TOKENS"):
+            options["prompt_tokens"] = int(os.environ["WEATHER_AGENT_PROMPT_TOKENS"])
+        if os.environ.get("WEATHER_AGENT_CANDIDATES_TOKENS"):
+            options["candidates_tokens"] = int(
+                os.environ["WEATHER_AGENT_CANDIDATES_TOKENS"]
+            )
+        return cls(**options)
+
+    def _next_response(self, llm_request: LlmRequest) -> LlmResponse:
+        step = sum(1 for content in llm_request.contents if content.role == "model")
+        response = self.script[step % len(self.script)].model_copy(deep=True)
+        if self.prompt_tokens is not None or self.candidates_tokens is not None:
+            usage = response.usage_metadata or types.GenerateContentResponseUsageMetadata()
+            if self.prompt_tokens is not None:
+                usage.prompt_token_count = self.prompt_tokens
+            if self.candidates_tokens is not None:
+                usage.candidates_token_count = self.candidates_tokens
+            usage.total_token_count = (usage.prompt_token_count or 0) + (
+                usage.candidates_token_count or 0
+            )
+            # the per-modality details would contradict the overridden counts
+            usage.prompt_tokens_details = None
+            usage.candidates_tokens_details = None
+            response.usage_metadata = usage
+        return response
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        response = self._next_response(llm_request)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        parts = response.content.parts if response.content else None
+        if stream and parts and all(p.text is not None for p in parts):
+            # like Gemini: partial text chunks, then the whole response
+            words = "".join(p.text for p in parts).split(" ")
+            for i in range(0, len(words), self.chunk_words):
+                chunk = " ".join(words[i : i + self.chunk_words])
+                if i + self.chunk_words < len(words):
+                    chunk += " "
+                yield LlmResponse(
+                    content=types.Content(role="model", parts=[types.Part(text=chunk)]),
+                    partial=True,
+                )
+        yield response
@@ -0,0 +1,250 @@
+"""Memoization of the results of ADK function tools.
+
+`memoize_tool` turns a tool function, sync or async, into a `FunctionTool` whose
+results are cached for `ttl` seconds, shared by every session of the process:
+
+- the key is the tool's arguments in canonical form (JSON with sorted keys),
+  plus the values of the `state_keys` the tool reads from `tool_context.state`,
+  so a result that depends on a user preference is not served to another user
+- the state the tool writes (`tool_context.state[...] = ...`) is recorded with
+  the result and written again on each hit, so the session state is the same as
+  if the tool had run
+- concurrent calls with the same key wait for the first one instead of running
+  the tool again (single flight), from any thread or event loop; if the first
+  call is cancelled (its turn ended), one of the waiting calls runs the tool
+  instead, and a waiting call cancelled does not affect the others
+- exceptions are not cached; a `cache_if` predicate can exclude results too
+
+Each call records its outcome ("hit", "miss" or "shared") and the cache
+statistics in the state delta of its function response event, under
+`temp:tool_cache:<tool>`: ADK does not keep `temp:` keys in the session state,
+but the event keeps them, so they are shown with the event in the inspector and
+exported with its `tool_response` span (the trace of the event). They are not
+added to the function response, which the model reads. They are also set as
+`gcp.vertex.agent.tool_cache.*` attributes of the `tool_call` span, for the
+exporters that keep it.
+
+    @memoize_tool(ttl=300, state_keys=("user_preference_temperature_unit",))
+    def get_weather(city: str, tool_context: ToolContext) -> dict:
+        ...
+
+The tool is declared to the model from the function, as a plain `FunctionTool`
+would be (a function wrapper would lose the docstring: ADK rebuilds the function
+from its code to drop `tool_context`). `get_weather.cache` holds the `ToolCache`.
+"""
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future
+import copy
+from dataclasses import asdict, dataclass
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from google.adk.tools import FunctionTool, ToolContext
+from opentelemetry import trace
+
+SPAN_ATTRIBUTE_PREFIX = "gcp.vertex.agent.tool_cache"
+STATE_KEY_PREFIX = "temp:tool_cache:"
+
+
+@dataclass
+class ToolCacheStats:
+    tool: str
+    entries: int
+    hits: int
+    misses: int
+    # calls that waited for an identical call in flight
+    shared: int
+    expired: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class _Entry:
+    __slots__ = ("result", "state_writes", "expires")
+
+    def __init__(self, result: Any, state_writes: Dict[str, Any], expires: float):
+        self.result = result
+        self.state_writes = state_writes
+        self.expires = expires
+
+
+class ToolCache:
+    """Results of one tool by key, expiring after `ttl` seconds, bounded in count."""
+
+    def __init__(
+        self,
+        tool: str,
+        ttl: float,
+        max_entries: int = 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tool = tool
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.expired = 0
+
+    def lookup(self, key: str) -> Tuple[Optional[_Entry], Optional[Future], bool]:
+        """Returns `(entry, future, owner)` for `key`.
+
+        `entry` is the cached result, if any. Otherwise `future` resolves to the
+        entry of the call computing it, which is this caller when `owner` is
+        True: it must then `complete`, `fail` or `abandon` the key. The future
+        resolves to None if the key is abandoned: look it up again.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry, None, False
+                del self._entries[key]
+                self.expired += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.shared += 1
+                return None, future, False
+            self.misses += 1
+            future = self._in_flight[key] = Future()
+            return None, future, True
+
+    def complete(self, key: str, entry: _Entry, store: bool) -> None:
+        with self._lock:
+            future = self._in_flight.pop(key)
+            if store:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(entry)
+
+    def fail(self, key: str, error: Exception) -> None:
+        with self._lock:
+            future = self._in_flight.pop(key)
+        future.set_exception(error)
+
+    def abandon(self, key: str) -> None:
+        """Forgets the call in flight for `key` without failing its waiters."""
+        with self._lock:
+            future = self._in_flight.pop(key)
+        future.set_result(None)
+
+    def new_entry(self, result: Any, state_writes: Dict[str, Any]) -> _Entry:
+        return _Entry(
+            copy.deepcopy(result), copy.deepcopy(state_writes), self._clock() + self.ttl
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> ToolCacheStats:
+        return ToolCacheStats(
+            tool=self.tool,
+            entries=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            shared=self.shared,
+            expired=self.expired,
+        )
+
+
+class MemoizedTool(FunctionTool):
+    """`FunctionTool` whose results are kept in a `ToolCache` (see the module doc)."""
+
+    def __init__(
+        self,
+        func: Callable,
+        ttl: float,
+        state_keys: Sequence[str] = (),
+        max_entries: int = 1024,
+        cache_if: Callable[[Any], bool] = lambda result: True,
+    ):
+        super().__init__(func)
+        self.cache = ToolCache(self.name, ttl, max_entries)
+        self.state_keys = tuple(state_keys)
+        self.cache_if = cache_if
+
+    def _key(self, args: Dict[str, Any], tool_context: ToolContext) -> str:
+        state = {k: tool_context.state.get(k) for k in self.state_keys}
+        return json.dumps(
+            [args, state], sort_keys=True, separators=(",", ":"), default=str
+        )
+
+    def _record(self, outcome: str, tool_context: ToolContext) -> None:
+        stats = {"outcome": outcome, **self.cache.stats().to_dict()}
+        del stats["tool"]
+        tool_context.actions.state_delta[STATE_KEY_PREFIX + self.name] = stats
+        span = trace.get_current_span()
+        for name, value in stats.items():
+            span.set_attribute(f"{SPAN_ATTRIBUTE_PREFIX}.{name}", value)
+
+    @staticmethod
+    def _replay(entry: _Entry, tool_context: ToolContext) -> Any:
+        for k, v in entry.state_writes.items():
+            tool_context.state[k] = copy.deepcopy(v)
+        # callers get their own copy of the cached result
+        return copy.deepcopy(entry.result)
+
+    async def run_async(self, *, args: Dict[str, Any], tool_context: ToolContext) -> Any:
+        key = self._key(args, tool_context)
+        while True:
+            entry, future, owner = self.cache.lookup(key)
+            if entry is not None:
+                self._record("hit", tool_context)
+                return self._replay(entry, tool_context)
+            if owner:
+                break
+            # shielded: cancelling this call must not cancel the shared future
+            entry = await asyncio.shield(asyncio.wrap_future(future))
+            if entry is not None:
+                result = self._replay(entry, tool_context)
+                self._record("shared", tool_context)
+                return result
+            # the call in flight was cancelled: look the key up again
+
+        delta = tool_context.actions.state_delta
+        before = dict(delta)
+        try:
+            result = await super().run_async(args=args, tool_context=tool_context)
+        except Exception as e:
+            self.cache.fail(key, e)
+            raise
+        except BaseException:
+            # cancelled: not an error of the tool, the waiters run it again
+            self.cache.abandon(key)
+            raise
+        state_writes = {
+            k: v for k, v in delta.items() if k not in before or before[k] is not v
+        }
+        self.cache.complete(
+            key, self.cache.new_entry(result, state_writes), self.cache_if(result)
+        )
+        self._record("miss", tool_context)
+        return result
+
+
+def memoize_tool(
+    ttl: float,
+    state_keys: Sequence[str] = (),
+    max_entries: int = 1024,
+    cache_if: Callable[[Any], bool] = lambda result: True,
+) -> Callable[[Callable], MemoizedTool]:
+    """Decorator turning a tool function into a `MemoizedTool`."""
+
+    def decorator(func: Callable) -> MemoizedTool:
+        return MemoizedTool(func, ttl, state_keys, max_entries, cache_if)
+
+    return decorator
@@ -0,0 +1,84 @@
+"""Export of a live ADK session to a session archive (see `gradio_agent_inspector.archive`).
+
+Each invocation (a user message and the agent events answering it) becomes a step
+of the archive, with the traces and graphs of its events. The state of each step
+is rebuilt from the `stateDelta` of the events so far (without the `temp:` keys,
+which ADK does not keep); the last step gets the state of the session.
+
+    client = adk_client(session_id)
+    export_session_archive(client, "session.ndjson.gz")
+
+The archive is then replayed with `SessionArchive` / `ArchiveReplay`, without the
+ADK API server.
+"""
+
+from itertools import groupby
+import os
+from typing import Dict, List, Union
+
+from gradio_agent_inspector.archive import ArchiveWriter
+
+from adk_gradio_example.adk_enrichment import enrich_session, enrich_session_sync
+from adk_gradio_example.adk_simple_client import ADKChatClient, AsyncADKChatClient
+
+
+def _steps(session: Dict) -> List[List[Dict]]:
+    events = session.get("events", [])
+    return [list(g) for _, g in groupby(events, key=lambda e: e.get("invocationId"))]
+
+
+def _apply_state_delta(state: Dict, events: List[Dict]) -> None:
+    for e in events:
+        for k, v in ((e.get("actions") or {}).get("stateDelta") or {}).items():
+            if not k.startswith("temp:"):
+                state[k] = v
+
+
+def _check_session(session: Union[Dict, str]) -> Dict:
+    if not isinstance(session, dict):
+        raise Exception(session)
+    return session
+
+
+def export_session_archive(
+    client: ADKChatClient, path: Union[str, os.PathLike]
+) -> int:
+    """Writes the session of `client` to a new archive at `path`; returns the number of steps."""
+    session = _check_session(client.get_events())
+    state: Dict = {}
+    steps = _steps(session)
+    with ArchiveWriter(path, session) as writer:
+        for i, events in enumerate(steps):
+            # one step at a time: its interned values stay in the trace store
+            # until they are written
+            step = {"events": [dict(e) for e in events]}
+            enrich_session_sync(client, step)
+            _apply_state_delta(state, events)
+            writer.append_step(
+                step["events"],
+                state=session.get("state", state) if i == len(steps) - 1 else dict(state),
+                resolve=client.trace_store.lookup,
+                lastUpdateTime=events[-1].get("timestamp"),
+            )
+    return len(steps)
+
+
+async def export_session_archive_async(
+    client: AsyncADKChatClient, path: Union[str, os.PathLike]
+) -> int:
+    """Async version of `export_session_archive`."""
+    session = _check_session(await client.get_events())
+    state: Dict = {}
+    steps = _steps(session)
+    with ArchiveWriter(path, session) as writer:
+        for i, events in enumerate(steps):
+            step = {"events": [dict(e) for e in events]}
+            await enrich_session(client, step)
+            _apply_state_delta(state, events)
+            writer.append_step(
+                step["events"],
+                state=session.get("state", state) if i == len(steps) - 1 else dict(state),
+                resolve=client.trace_store.lookup,
+                lastUpdateTime=events[-1].get("timestamp"),
+            )
+    return len(steps)
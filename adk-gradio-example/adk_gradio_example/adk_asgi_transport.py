@@ -0,0 +1,135 @@
+"""In-process transport to an ASGI app, for an ADK API server embedded in the same app.
+
+When Gradio is mounted on the FastAPI app of the ADK API server (see `main()` in
+`app.py`), the async chat client can call that app directly instead of going
+through a loopback socket: no TCP connection, no HTTP parsing on either side.
+
+`httpx.ASGITransport` waits for the app to finish before returning the response,
+which would hold back every event of `/run_sse` until the end of the turn; this
+transport returns as soon as the response starts and streams its body.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, MutableMapping, Optional, Tuple
+
+import httpx
+
+
+class _QueueByteStream(httpx.AsyncByteStream):
+    def __init__(
+        self, queue: asyncio.Queue, task: asyncio.Task, disconnected: asyncio.Event
+    ):
+        self._queue = queue
+        self._task = task
+        self._disconnected = disconnected
+        self._complete = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self._queue.get()
+            if chunk is None:
+                self._complete = True
+                break
+            yield chunk
+
+    async def aclose(self) -> None:
+        # like a closed connection: the app sees a disconnect, and is cancelled
+        # if the body was not read to the end
+        self._disconnected.set()
+        if not self._complete and not self._task.done():
+            self._task.cancel()
+
+
+class StreamingASGITransport(httpx.AsyncBaseTransport):
+    """Sends the requests of an `httpx.AsyncClient` to an ASGI app in the same process.
+
+    The app runs in a task of the current event loop; the response is returned
+    once its headers are sent and its body is streamed. An exception raised by
+    the app before it starts the response is raised by the request.
+    """
+
+    def __init__(self, app: Any, client: Tuple[str, int] = ("127.0.0.1", 123)):
+        self.app = app
+        self.client = client
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "headers": [(k.lower(), v) for (k, v) in request.headers.raw],
+            "scheme": request.url.scheme,
+            "path": request.url.path,
+            "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query,
+            "server": (request.url.host, request.url.port),
+            "client": self.client,
+            "root_path": "",
+        }
+
+        request_body = request.stream.__aiter__()
+        request_complete = False
+        disconnected = asyncio.Event()
+        started = asyncio.Event()
+        queue: asyncio.Queue = asyncio.Queue()
+        start: Dict[str, Any] = {}
+        errors: List[BaseException] = []
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal request_complete
+            if request_complete:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            try:
+                body = await request_body.__anext__()
+            except StopAsyncIteration:
+                request_complete = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.request", "body": body, "more_body": True}
+
+        async def send(message: MutableMapping[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                start["status"] = message["status"]
+                start["headers"] = message.get("headers", [])
+                started.set()
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                if body and request.method != "HEAD":
+                    queue.put_nowait(body)
+                if not message.get("more_body", False):
+                    queue.put_nowait(None)
+
+        async def run() -> None:
+            try:
+                await self.app(scope, receive, send)
+            except BaseException as e:
+                errors.append(e)
+                if not isinstance(e, Exception):
+                    raise
+            finally:
+                started.set()
+                queue.put_nowait(None)
+
+        task = asyncio.get_running_loop().create_task(run())
+        await started.wait()
+        if "status" not in start:
+            await task
+            if errors:
+                raise errors[0]
+            raise RuntimeError("The ASGI app returned without sending a response")
+
+        return httpx.Response(
+            start["status"],
+            headers=start["headers"],
+            stream=_QueueByteStream(queue, task, disconnected),
+        )
+
+
+def in_process_client(app: Any, timeout: Optional[httpx.Timeout] = None) -> httpx.AsyncClient:
+    """Returns an `httpx.AsyncClient` whose requests are handled by `app` in-process."""
+    return httpx.AsyncClient(
+        transport=StreamingASGITransport(app),
+        timeout=timeout,
+        headers={"Content-Type": "application/json"},
+    )
@@ -0,0 +1,253 @@
+"""Pool of ADK API servers the chat sessions are spread over.
+
+With the default in-memory session service, an ADK session only exists on the API
+server that created it, so sessions are routed as follows:
+
+- a new session is started on the healthy server with the fewest outstanding
+  requests (sent by this process and not completed yet; ties go to the server
+  that was given the fewest sessions)
+- an existing session stays on its server: the session registries bind each
+  Gradio session to the URL of the server holding its ADK session
+- every server is checked with `GET /list-apps` every `interval` seconds; after
+  `fall` failed checks in a row it is ejected: it gets no new sessions, and the
+  sessions it holds are dropped by the registries (their next message starts a
+  new session on another server). It is readmitted after `rise` successful
+  checks in a row.
+
+If every server is ejected, new sessions are still spread over all of them, so
+the app recovers as soon as one comes back.
+
+The pool can be configured with environment variables (read when the pool is
+first used) or with `configure_backends`:
+
+- ADK_API_SERVERS: comma-separated URLs of the ADK API servers (default
+  ADK_API_SERVER_URL, or http://localhost:8000)
+- ADK_HEALTH_INTERVAL: seconds between two checks of a server (default 5)
+- ADK_HEALTH_TIMEOUT: timeout of a check in seconds (default 2)
+- ADK_HEALTH_FALL: failed checks in a row before ejection (default 2)
+- ADK_HEALTH_RISE: successful checks in a row before readmission (default 2)
+
+Health checks only run when there is more than one server.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import httpx
+
+from adk_gradio_example.adk_http_pool import origin, outstanding_requests
+
+logger = logging.getLogger(__name__)
+
+
+def _env_urls() -> List[str]:
+    urls = os.environ.get("ADK_API_SERVERS") or os.environ.get(
+        "ADK_API_SERVER_URL", "http://localhost:8000"
+    )
+    return [url.strip().rstrip("/") for url in urls.split(",") if url.strip()]
+
+
+@dataclass
+class BackendStats:
+    url: str
+    healthy: bool
+    outstanding: int
+    sessions: int
+    checks: int
+    failed_checks: int
+    ejections: int
+    last_error: Optional[str]
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class _Backend:
+    def __init__(self, url: str):
+        self.url = url
+        self.origin = origin(url)
+        self.healthy = True
+        self.sessions = 0
+        self.checks = 0
+        self.failed_checks = 0
+        self.ejections = 0
+        self.failures_in_row = 0
+        self.successes_in_row = 0
+        self.last_error: Optional[str] = None
+
+
+class BackendPool:
+    """ADK API servers with session routing and active health checks; thread-safe."""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        interval: float = 5.0,
+        timeout: float = 2.0,
+        fall: int = 2,
+        rise: int = 2,
+        outstanding: Callable[[], Dict[str, int]] = outstanding_requests,
+    ):
+        if not urls:
+            raise ValueError("At least one ADK API server URL is required")
+        self._backends = [_Backend(url.strip().rstrip("/")) for url in urls]
+        self._by_url = {b.url: b for b in self._backends}
+        self.interval = interval
+        self.timeout = timeout
+        self.fall = fall
+        self.rise = rise
+        self._outstanding = outstanding
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, urls: Optional[Sequence[str]] = None) -> "BackendPool":
+        return cls(
+            urls or _env_urls(),
+            interval=float(os.environ.get("ADK_HEALTH_INTERVAL", "5")),
+            timeout=float(os.environ.get("ADK_HEALTH_TIMEOUT", "2")),
+            fall=int(os.environ.get("ADK_HEALTH_FALL", "2")),
+            rise=int(os.environ.get("ADK_HEALTH_RISE", "2")),
+        )
+
+    @property
+    def urls(self) -> List[str]:
+        return [b.url for b in self._backends]
+
+    def pick(self) -> str:
+        """Returns the URL of the server to start a new session on."""
+        outstanding = self._outstanding()
+        with self._lock:
+            candidates = [b for b in self._backends if b.healthy] or self._backends
+            backend = min(
+                candidates, key=lambda b: (outstanding.get(b.origin, 0), b.sessions)
+            )
+            backend.sessions += 1
+            return backend.url
+
+    def is_healthy(self, url: str) -> bool:
+        """False if `url` is an ejected server; servers outside the pool are assumed healthy."""
+        backend = self._by_url.get(url)
+        return backend is None or backend.healthy
+
+    def record_check(self, url: str, error: Optional[str] = None) -> None:
+        """Records the result of a health check of `url` (`error` is None on success)."""
+        backend = self._by_url[url]
+        with self._lock:
+            backend.checks += 1
+            if error is None:
+                backend.failures_in_row = 0
+                backend.successes_in_row += 1
+                if not backend.healthy and backend.successes_in_row >= self.rise:
+                    backend.healthy = True
+                    logger.warning("ADK API server %s is back, readmitted", url)
+                return
+            backend.failed_checks += 1
+            backend.successes_in_row = 0
+            backend.failures_in_row += 1
+            backend.last_error = error
+            if backend.healthy and backend.failures_in_row >= self.fall:
+                backend.healthy = False
+                backend.ejections += 1
+                logger.warning("ADK API server %s ejected: %s", url, error)
+
+    def _check_one(self, http: httpx.Client, url: str) -> None:
+        try:
+            response = http.get(f"{url}/list-apps")
+            error = None if response.is_success else f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+        self.record_check(url, error)
+
+    def check(self) -> None:
+        """Checks every server once, concurrently."""
+        with httpx.Client(timeout=self.timeout) as http, ThreadPoolExecutor(
+            max_workers=len(self._backends)
+        ) as executor:
+            list(executor.map(lambda url: self._check_one(http, url), self.urls))
+
+    def start(self) -> None:
+        """Starts the health checks in a daemon thread (if there is more than one server)."""
+        if len(self._backends) < 2 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="adk-health-checks", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.check()
+            except Exception:
+                logger.exception("ADK API server health checks failed")
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join()
+
+    def stats(self) -> List[BackendStats]:
+        outstanding = self._outstanding()
+        with self._lock:
+            return [
+                BackendStats(
+                    url=b.url,
+                    healthy=b.healthy,
+                    outstanding=outstanding.get(b.origin, 0),
+                    sessions=b.sessions,
+                    checks=b.checks,
+                    failed_checks=b.failed_checks,
+                    ejections=b.ejections,
+                    last_error=b.last_error,
+                )
+                for b in self._backends
+            ]
+
+
+_pool: Optional[BackendPool] = None
+_pool_lock = threading.Lock()
+
+
+def backend_pool() -> BackendPool:
+    """Returns the process-wide pool, created from the environment on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BackendPool.from_env()
+                _pool.start()
+    return _pool
+
+
+def configure_backends(urls: Optional[Sequence[str]] = None, **options) -> BackendPool:
+    """Replaces the process-wide pool; options default to the environment."""
+    global _pool
+    pool = BackendPool.from_env(urls)
+    for key, value in options.items():
+        if not hasattr(pool, key):
+            raise TypeError(f"Unknown backend pool option: {key}")
+        setattr(pool, key, value)
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    if previous is not None:
+        previous.stop()
+    pool.start()
+    return pool
+
+
+def is_backend_healthy(url: str) -> bool:
+    return backend_pool().is_healthy(url)
+
+
+def backend_stats() -> List[BackendStats]:
+    return backend_pool().stats()
@@ -0,0 +1,235 @@
+"""Process-wide LRU cache of traces and graphs, bounded in bytes.
+
+Every chat client stores the traces and graphs it fetched in the same cache, so the
+memory they use is capped for the whole process instead of growing with each
+session (a trace holds the whole conversation sent to the model, so the traces of a
+session grow quadratically with its number of turns).
+
+Entries are accounted with their serialized (JSON) size, which is the size of the
+HTTP response they were parsed from; the Python objects themselves take a few times
+more. The budget is set with the ADK_CACHE_MAX_BYTES environment variable (default
+64 MiB) or with `configure_cache`. It also covers the bytes held outside the
+entries on their behalf (`charge`): the values interned by the `TraceStore`.
+"""
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from dataclasses import asdict, dataclass
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+DEFAULT_MAX_BYTES = int(os.environ.get("ADK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+_MISSING = object()
+
+
+def json_size(value: Any) -> int:
+    """Size of `value` once serialized as compact JSON."""
+    try:
+        return len(json.dumps(value, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return len(repr(value))
+
+
+@dataclass
+class CacheStats:
+    max_bytes: int
+    bytes: int
+    # part of `bytes` held outside the entries (see `ByteLRUCache.charge`)
+    charged_bytes: int
+    entries: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class ByteLRUCache:
+    """Thread-safe LRU cache whose total size, in bytes, stays below `max_bytes`.
+
+    A value larger than the whole budget is not stored. Functions registered with
+    `add_removal_listener` are called with `(key, value)` for every entry removed:
+    evicted to make room, replaced, popped or cleared. They are called with the
+    cache lock held (a reentrant one: they may call `charge`, e.g. to free the
+    bytes of values only the removed entry used).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        sizeof: Callable[[Any], int] = json_size,
+    ):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[Hashable, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._charged = 0
+        self._listeners: List[Callable[[Hashable, Any], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def add_removal_listener(self, listener: Callable[[Hashable, Any], None]) -> None:
+        self._listeners.append(listener)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        """Stores `value`; `size` (bytes) is computed with `sizeof` when not given."""
+        size = self.sizeof(value) if size is None else size
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                # for the listeners, stored and removed at once
+                self._removed(key, value)
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict_over_budget()
+
+    def resize(self, max_bytes: int) -> None:
+        """Changes the budget, evicting the least recently used entries if needed."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict_over_budget()
+
+    def charge(self, nbytes: int) -> None:
+        """Counts `nbytes` (negative to free them) held outside the entries in the budget."""
+        with self._lock:
+            self._charged += nbytes
+            if nbytes > 0:
+                self._evict_over_budget()
+
+    def _evict_over_budget(self) -> None:
+        # the listeners may free charged bytes: the total is read at each step
+        while self._bytes + self._charged > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._remove(key)
+        return default if entry is None else entry[0]
+
+    def _remove(self, key: Hashable) -> Optional[Tuple[Any, int]]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+            self._removed(key, entry[0])
+        return entry
+
+    def _removed(self, key: Hashable, value: Any) -> None:
+        for listener in self._listeners:
+            listener(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes + self._charged
+
+    def view(self, namespace: str) -> "CacheView":
+        return CacheView(self, namespace)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                max_bytes=self.max_bytes,
+                bytes=self._bytes + self._charged,
+                charged_bytes=self._charged,
+                entries=len(self._entries),
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+
+
+class CacheView(MutableMapping):
+    """Dict-like view of the entries of a `ByteLRUCache` stored under `namespace`.
+
+    `view[key]` is stored as `cache[(namespace, key)]`.
+    """
+
+    def __init__(self, cache: ByteLRUCache, namespace: str):
+        self.cache = cache
+        self.namespace = namespace
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        return self.cache.get((self.namespace, key), default)
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.cache.get((self.namespace, key), _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None) -> None:
+        self.cache.put((self.namespace, key), value, size)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self.put(key, value)
+
+    def __delitem__(self, key: Hashable) -> None:
+        if self.cache.pop((self.namespace, key), _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return (self.namespace, key) in self.cache
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return (k for ns, k in self.cache.keys() if ns == self.namespace)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+_cache: Optional[ByteLRUCache] = None
+_cache_lock = threading.Lock()
+
+
+def shared_cache() -> ByteLRUCache:
+    """Returns the process-wide cache used by the chat clients."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ByteLRUCache()
+    return _cache
+
+
+def configure_cache(max_bytes: int) -> ByteLRUCache:
+    """Changes the budget of the shared cache, evicting entries if needed."""
+    cache = shared_cache()
+    cache.resize(max_bytes)
+    return cache
+
+
+def cache_stats() -> CacheStats:
+    return shared_cache().stats()
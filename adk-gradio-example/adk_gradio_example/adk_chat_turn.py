@@ -0,0 +1,78 @@
+"""Chat history and AgentInspector updates of a chat turn, shared by the handlers.
+
+The chat handlers of `app.py` (and their sync versions in the benchmarks) turn
+the events of a streamed agent turn into chat messages and into patches of the
+AgentInspector value, kept in an `InspectorSession` per Gradio session.
+"""
+
+from typing import Dict, Optional
+
+import gradio as gr
+from gradio_agent_inspector import InspectorPatch, InspectorSession
+
+
+def patch_with_new_events(inspector: InspectorSession, res: Dict) -> InspectorPatch:
+    """The patch showing `res`, a result of the client's `get_new_events`."""
+    fields = {k: v for k, v in res.items() if k not in ("events", "incremental")}
+    if res["incremental"]:
+        return inspector.upsert_events(res["events"], **fields)
+    return inspector.update({**fields, "events": res["events"]})
+
+
+def selected_event_to_enrich(
+    inspector: InspectorSession, event_id: str
+) -> Optional[Dict]:
+    """The selected event, copied, if its trace or graph has not been sent yet."""
+    for e in (inspector.value or {}).get("events", []):
+        if e.get("id") == event_id:
+            if "trace" in e and "graph" in e:
+                return None
+            return {"events": [dict(e)]}
+    return None
+
+
+def append_stream_event(
+    history: list, event: Dict, streamed: Optional[gr.ChatMessage]
+) -> Optional[gr.ChatMessage]:
+    """Adds an event of a streamed turn to the chat history.
+
+    Partial text events are accumulated in one message, `streamed`, whose content
+    is replaced by the final text when the non-partial event arrives. Returns the
+    message being streamed, if any.
+    """
+    for part in (event.get("content") or {}).get("parts") or []:
+        if "text" in part:
+            if event.get("partial"):
+                if streamed is None:
+                    streamed = gr.ChatMessage(role="assistant", content="", metadata={})
+                    history.append(streamed)
+                streamed.content += part["text"]
+            elif streamed is not None:
+                streamed.content = part["text"]
+                streamed = None
+            else:
+                history.append(
+                    gr.ChatMessage(role="assistant", content=part["text"], metadata={})
+                )
+        elif "functionCall" in part:
+            history.append(
+                gr.ChatMessage(
+                    role="assistant",
+                    content=part["functionCall"]["name"],
+                    metadata={"title": "Function calls"},
+                )
+            )
+    return streamed
+
+
+def append_error(history: list, error: str) -> None:
+    """Tells the user, in the chat, that the turn failed with `error`."""
+    history.append(gr.ChatMessage(role="assistant", content=f"⚠️ {error}"))
+
+
+def stream_event_patch(inspector: InspectorSession, event: Dict, session_id: str):
+    """The patch adding an event of a streamed turn (`gr.skip()` if partial)."""
+    # partial events are not stored in the session: only complete events are shown
+    if event.get("partial"):
+        return gr.skip()
+    return inspector.upsert_events([event], id=session_id)
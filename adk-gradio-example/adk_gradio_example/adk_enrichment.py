@@ -0,0 +1,192 @@
+"""Attach traces and graphs to the events of a session before it is sent to the inspector.
+
+Only the events missing from the client caches are fetched, concurrently and with a
+bounded number of requests in flight; the results are then merged into the session
+payload in a single pass. The fetches already started by the client prefetcher (see
+`adk_prefetch`) are waited for rather than made again. A value evicted from the
+cache before it is merged, with the interned values it references, is fetched
+again in a second round.
+
+The last rounds of the process (events, values fetched or cached, errors, wall
+time) are kept for the stats of the app: see `recent_rounds`.
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+import logging
+import os
+import time
+from typing import Any, Dict, List, Tuple, Union
+
+from gradio_agent_inspector.interning import event_refs
+
+from adk_gradio_example.adk_simple_client import ADKChatClient, AsyncADKChatClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("ADK_ENRICHMENT_CONCURRENCY", "8"))
+RECENT_ROUNDS = 20
+
+_FAILED = object()
+
+
+@dataclass
+class EnrichmentRound:
+    events: int
+    fetched: int
+    cached: int
+    errors: int
+    wall_ms: float
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+_recent_rounds: "deque[EnrichmentRound]" = deque(maxlen=RECENT_ROUNDS)
+
+
+def recent_rounds() -> List[EnrichmentRound]:
+    """The last `RECENT_ROUNDS` enrichment rounds of the process, oldest first."""
+    return list(_recent_rounds)
+
+
+def _missing_fetches(
+    client: Union[ADKChatClient, AsyncADKChatClient], events: List[Dict]
+) -> List[Tuple[str, str]]:
+    missing = []
+    for e in events:
+        if client.has_trace(e) and e["id"] not in client.trace_cache:
+            missing.append(("trace", e["id"]))
+        if e["id"] not in client.graph_cache:
+            missing.append(("graph", e["id"]))
+    return missing
+
+
+def _resolvable(
+    client: Union[ADKChatClient, AsyncADKChatClient], kind: str, value: Any
+) -> bool:
+    """False if an interned value referenced by `value` has been dropped."""
+    lookup = client.trace_store.lookup
+    return all(lookup(h) is not None for h in event_refs({kind: value}))
+
+
+def _merge(
+    client: Union[ADKChatClient, AsyncADKChatClient],
+    events: List[Dict],
+    fetched: Dict[Tuple[str, str], Any],
+) -> int:
+    """Attaches the traces and graphs to `events`; returns the number of values
+    left out because they were evicted with the values they reference."""
+    stale = 0
+    for e in events:
+        for kind, cache in (("trace", client.trace_cache), ("graph", client.graph_cache)):
+            if kind == "trace" and not client.has_trace(e):
+                e["trace"] = {}
+                continue
+            # values fetched in this round are used directly, unless the cache
+            # has already evicted them and released their references
+            value = fetched.get((kind, e["id"]), _FAILED)
+            if (
+                isinstance(value, dict)
+                and e["id"] not in cache
+                and not _resolvable(client, kind, value)
+            ):
+                stale += 1
+                continue
+            if value is _FAILED:
+                value = cache.get(e["id"], _FAILED)
+            if value is None:
+                # not found on the ADK API server (e.g. the trace of an event
+                # from before a restart): shown without it, not fetched again
+                value = {}
+            # failed otherwise (e.g. network or server error): fetched next time
+            if isinstance(value, dict):
+                e[kind] = value
+    return stale
+
+
+def _finish(
+    client: Union[ADKChatClient, AsyncADKChatClient],
+    events: List[Dict],
+    results: Dict[Tuple[str, str], Any],
+    start: float,
+) -> EnrichmentRound:
+    """`results` maps each `(kind, event id)` fetched to its last result, so a
+    value fetched again by the second round is counted once."""
+    errors = sum(1 for v in results.values() if v is _FAILED)
+    enrichment_round = EnrichmentRound(
+        events=len(events),
+        fetched=len(results) - errors,
+        cached=sum(1 + client.has_trace(e) for e in events) - len(results),
+        errors=errors,
+        wall_ms=round((time.perf_counter() - start) * 1000, 2),
+    )
+    logger.info("Enrichment round: %s", enrichment_round)
+    _recent_rounds.append(enrichment_round)
+    return enrichment_round
+
+
+async def enrich_session(
+    client: AsyncADKChatClient,
+    session: Dict,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> EnrichmentRound:
+    """Fetches the missing traces and graphs of `session` and attaches them to its events."""
+    start = time.perf_counter()
+    events = session.get("events", [])
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(kind: str, event_id: str) -> Any:
+        async with semaphore:
+            try:
+                if kind == "trace":
+                    return await client.get_trace(event_id)
+                return await client.get_graph(event_id)
+            except Exception as e:
+                logger.warning("Could not fetch the %s of event %s: %s", kind, event_id, e)
+                return _FAILED
+
+    results: Dict[Tuple[str, str], Any] = {}
+    for _ in range(2):
+        await client.prefetcher.join(_missing_fetches(client, events))
+        missing = _missing_fetches(client, events)
+        fetched = await asyncio.gather(*(fetch(kind, i) for kind, i in missing))
+        results.update(zip(missing, fetched))
+        if not _merge(client, events, dict(zip(missing, fetched))):
+            break
+    return _finish(client, events, results, start)
+
+
+def enrich_session_sync(
+    client: ADKChatClient,
+    session: Dict,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> EnrichmentRound:
+    """Thread-pool version of `enrich_session` for the sync client."""
+    start = time.perf_counter()
+    events = session.get("events", [])
+
+    def fetch(item: Tuple[str, str]) -> Any:
+        kind, event_id = item
+        try:
+            if kind == "trace":
+                return client.get_trace(event_id)
+            return client.get_graph(event_id)
+        except Exception as e:
+            logger.warning("Could not fetch the %s of event %s: %s", kind, event_id, e)
+            return _FAILED
+
+    results: Dict[Tuple[str, str], Any] = {}
+    for _ in range(2):
+        client.prefetcher.join(_missing_fetches(client, events))
+        missing = _missing_fetches(client, events)
+        fetched = []
+        if missing:
+            with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+                fetched = list(pool.map(fetch, missing))
+        results.update(zip(missing, fetched))
+        if not _merge(client, events, dict(zip(missing, fetched))):
+            break
+    return _finish(client, events, results, start)
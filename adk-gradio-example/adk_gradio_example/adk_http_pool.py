@@ -0,0 +1,494 @@
+"""Process-wide, connection-pooled HTTP clients used to talk to the ADK API server.
+
+Every `ADKChatClient` shares the same `httpx.Client` (and every
+`AsyncADKChatClient` the same `httpx.AsyncClient`), so TCP (and TLS) connections
+are kept alive and reused across calls and across Gradio sessions instead of being
+opened for every request.
+
+The pool can be tuned with environment variables (read when the pool is first
+created) or with `configure_http_pool`:
+
+- ADK_HTTP_MAX_CONNECTIONS: maximum number of open connections (default 100)
+- ADK_HTTP_MAX_KEEPALIVE: maximum number of idle keep-alive connections (default 20)
+- ADK_HTTP_KEEPALIVE_EXPIRY: seconds an idle connection is kept open (default 4)
+- ADK_HTTP_HTTP2: "1" to negotiate HTTP/2 when available (default "1")
+- ADK_HTTP_TIMEOUT: default read/write/pool timeout in seconds (default 60)
+- ADK_HTTP_CONNECT_TIMEOUT: connect timeout in seconds (default 5)
+
+When the ADK API server runs in the same app, `use_in_process_app` makes the async
+client call it in-process (see `adk_asgi_transport`) instead of over HTTP.
+"""
+
+import asyncio
+import atexit
+from dataclasses import asdict, dataclass
+import importlib.util
+import os
+import socket
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, Union
+
+import httpx
+
+from adk_gradio_example.adk_asgi_transport import in_process_client
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+@dataclass
+class PoolConfig:
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    # stay below uvicorn's 5s keep-alive timeout (used by `adk api_server`), or
+    # the pool may reuse a connection the server is closing
+    keepalive_expiry: float = 4.0
+    http2: bool = True
+    timeout: float = 60.0
+    connect_timeout: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        return cls(
+            max_connections=_env_int("ADK_HTTP_MAX_CONNECTIONS", cls.max_connections),
+            max_keepalive_connections=_env_int(
+                "ADK_HTTP_MAX_KEEPALIVE", cls.max_keepalive_connections
+            ),
+            keepalive_expiry=_env_float(
+                "ADK_HTTP_KEEPALIVE_EXPIRY", cls.keepalive_expiry
+            ),
+            http2=os.environ.get("ADK_HTTP_HTTP2", "1") == "1",
+            timeout=_env_float("ADK_HTTP_TIMEOUT", cls.timeout),
+            connect_timeout=_env_float(
+                "ADK_HTTP_CONNECT_TIMEOUT", cls.connect_timeout
+            ),
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def timeouts(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+    def http2_enabled(self) -> bool:
+        # HTTP/2 needs the optional `h2` package (pip install "httpx[http2]").
+        # It is negotiated through ALPN, so plain http:// URLs keep using HTTP/1.1.
+        return self.http2 and importlib.util.find_spec("h2") is not None
+
+
+@dataclass
+class PoolStats:
+    max_connections: int
+    connections: int
+    in_use: int
+    idle: int
+    in_flight: int
+    requests: int
+    waits: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def origin(url: Union[str, httpx.URL]) -> str:
+    """`scheme://host:port` of `url`, the key of the per-server request counts."""
+    url = httpx.URL(url)
+    port = url.port or (443 if url.scheme == "https" else 80)
+    return f"{url.scheme}://{url.host}:{port}"
+
+
+class _TrackedByteStream(httpx.SyncByteStream):
+    """Response stream that notifies the transport once the body is released."""
+
+    def __init__(self, stream: httpx.SyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._stream.close()
+        finally:
+            self._on_close()
+
+
+class _TrackedAsyncByteStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+def _pool_timeout(request: httpx.Request) -> Optional[float]:
+    return request.extensions.get("timeout", {}).get("pool")
+
+
+def _slot_limit(limits: httpx.Limits, http2: bool) -> Optional[int]:
+    # an HTTP/2 connection multiplexes many requests: httpcore enforces the limit
+    return None if http2 or not limits.max_connections else limits.max_connections
+
+
+class _PoolCounters:
+    """In-flight request and pool wait counters shared by the sync and async transports.
+
+    Over HTTP/1.1, requests take a slot from a semaphore sized like the pool
+    before reaching httpcore, so at most `max_connections` requests are ever
+    queued inside the pool (httpcore matches every queued request against every
+    connection each time a connection is released). A request that has to wait
+    for a slot is counted as a wait; it waits at most the pool timeout of the
+    request, then raises `httpx.PoolTimeout`, as httpcore would.
+
+    The requests not released yet, including those waiting for a slot, are also
+    counted per server (see `outstanding_requests`).
+    """
+
+    def _init_counters(self, limits: httpx.Limits) -> None:
+        self.max_connections = limits.max_connections
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests = 0
+        self.waits = 0
+        self.outstanding: Dict[str, int] = {}
+
+    def _count_outstanding(self, request: httpx.Request, delta: int) -> None:
+        key = origin(request.url)
+        with self._lock:
+            count = self.outstanding.get(key, 0) + delta
+            if count:
+                self.outstanding[key] = count
+            else:
+                del self.outstanding[key]
+
+    def _count_request(self, waited: bool) -> None:
+        with self._lock:
+            self.requests += 1
+            self.waits += int(waited)
+            self.in_flight += 1
+
+    def _count_release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> PoolStats:
+        connections = list(getattr(self._pool, "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        with self._lock:
+            return PoolStats(
+                max_connections=self.max_connections or 0,
+                connections=len(connections),
+                in_use=len(connections) - idle,
+                idle=idle,
+                in_flight=self.in_flight,
+                requests=self.requests,
+                waits=self.waits,
+            )
+
+
+class InstrumentedHTTPTransport(_PoolCounters, httpx.HTTPTransport):
+    """`httpx.HTTPTransport` that counts in-flight requests and pool waits."""
+
+    def __init__(self, *, limits: httpx.Limits, http2: bool = False, **kwargs):
+        super().__init__(limits=limits, http2=http2, **kwargs)
+        self._init_counters(limits)
+        slots = _slot_limit(limits, http2)
+        self._slots = threading.BoundedSemaphore(slots) if slots else None
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._count_outstanding(request, 1)
+        waited = False
+        try:
+            if self._slots is not None and not self._slots.acquire(blocking=False):
+                waited = True
+                if not self._slots.acquire(timeout=_pool_timeout(request)):
+                    raise httpx.PoolTimeout(
+                        "Timed out waiting for a connection", request=request
+                    )
+        except BaseException:
+            self._count_outstanding(request, -1)
+            raise
+        self._count_request(waited)
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self._release(request)
+            raise
+        response.stream = _TrackedByteStream(
+            response.stream, lambda: self._release(request)
+        )
+        return response
+
+    def _release(self, request: httpx.Request) -> None:
+        self._count_release()
+        self._count_outstanding(request, -1)
+        if self._slots is not None:
+            self._slots.release()
+
+
+class InstrumentedAsyncHTTPTransport(_PoolCounters, httpx.AsyncHTTPTransport):
+    """`httpx.AsyncHTTPTransport` that counts in-flight requests and pool waits."""
+
+    def __init__(self, *, limits: httpx.Limits, http2: bool = False, **kwargs):
+        super().__init__(limits=limits, http2=http2, **kwargs)
+        self._init_counters(limits)
+        slots = _slot_limit(limits, http2)
+        self._slots = asyncio.Semaphore(slots) if slots else None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._count_outstanding(request, 1)
+        waited = False
+        try:
+            if self._slots is not None:
+                waited = self._slots.locked()
+                try:
+                    await asyncio.wait_for(
+                        self._slots.acquire(), _pool_timeout(request)
+                    )
+                except asyncio.TimeoutError:
+                    raise httpx.PoolTimeout(
+                        "Timed out waiting for a connection", request=request
+                    ) from None
+        except BaseException:
+            self._count_outstanding(request, -1)
+            raise
+        self._count_request(waited)
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._release(request)
+            raise
+        response.stream = _TrackedAsyncByteStream(
+            response.stream, lambda: self._release(request)
+        )
+        return response
+
+    def close_sockets(self) -> None:
+        """Shuts the connections of the pool down when its event loop cannot run `aclose`.
+
+        asyncio only exposes a view of the socket of a transport: it is shut down
+        (the server sees the connection closed), and its file descriptor is
+        released with the transport.
+        """
+        for connection in list(getattr(self._pool, "connections", [])):
+            protocol = getattr(connection, "_connection", None)
+            stream = getattr(protocol, "_network_stream", None)
+            sock = stream.get_extra_info("socket") if stream is not None else None
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # already closed by the server
+                pass
+
+    def _release(self, request: httpx.Request) -> None:
+        self._count_release()
+        self._count_outstanding(request, -1)
+        if self._slots is not None:
+            self._slots.release()
+
+
+_lock = threading.Lock()
+_config: Optional[PoolConfig] = None
+_client: Optional[httpx.Client] = None
+_transport: Optional[InstrumentedHTTPTransport] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_async_transport: Optional[InstrumentedAsyncHTTPTransport] = None
+_async_loop: Optional[asyncio.AbstractEventLoop] = None
+# task closing the async client when cancelled (see `_close_when_cancelled`)
+_async_closer: Optional[asyncio.Task] = None
+_asgi_app = None
+
+
+def _get_config() -> PoolConfig:
+    global _config
+    if _config is None:
+        _config = PoolConfig.from_env()
+    return _config
+
+
+def configure_http_pool(config: Optional[PoolConfig] = None, **overrides) -> PoolConfig:
+    """Set the pool configuration; the shared clients are rebuilt on next use."""
+    global _config
+    config = config or _config or PoolConfig.from_env()
+    for key, value in overrides.items():
+        if not hasattr(config, key):
+            raise TypeError(f"Unknown pool option: {key}")
+        setattr(config, key, value)
+    close_http_client()
+    _drop_async_http_client()
+    with _lock:
+        _config = config
+    return config
+
+
+def get_http_client() -> httpx.Client:
+    """Returns the shared, connection-pooled `httpx.Client`."""
+    global _client, _transport
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            config = _get_config()
+            _transport = InstrumentedHTTPTransport(
+                limits=config.limits(), http2=config.http2_enabled()
+            )
+            _client = httpx.Client(
+                transport=_transport,
+                timeout=config.timeouts(),
+                headers={"Content-Type": "application/json"},
+            )
+        return _client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Returns the shared, connection-pooled `httpx.AsyncClient`.
+
+    Async connections belong to the event loop that opened them, so the client is
+    rebuilt if it is requested from a different running loop. A client is closed
+    on its loop: when it is replaced, or when the loop shuts down (`asyncio.run`
+    cancels the tasks left, including the one closing the client).
+    """
+    global _async_client, _async_transport, _async_loop, _async_closer
+    loop = asyncio.get_running_loop()
+    previous = None
+    with _lock:
+        if _async_client is None or _async_loop is not loop:
+            if _async_client is not None:
+                previous = (_async_closer, _async_transport, _async_loop)
+            config = _get_config()
+            if _asgi_app is not None:
+                _async_transport = None
+                _async_client = in_process_client(_asgi_app, config.timeouts())
+            else:
+                _async_transport = InstrumentedAsyncHTTPTransport(
+                    limits=config.limits(), http2=config.http2_enabled()
+                )
+                _async_client = httpx.AsyncClient(
+                    transport=_async_transport,
+                    timeout=config.timeouts(),
+                    headers={"Content-Type": "application/json"},
+                )
+            _async_loop = loop
+            _async_closer = loop.create_task(_close_when_cancelled(_async_client))
+        client = _async_client
+    if previous is not None:
+        _close_async_client(*previous)
+    return client
+
+
+def use_in_process_app(app) -> None:
+    """Send the requests of the shared async client to the ASGI `app` in-process.
+
+    `app` is the FastAPI app of an ADK API server served by this process (e.g.
+    from `get_fast_api_app`); pass None to go back to HTTP. The sync client is
+    not affected: httpx has no in-process transport for sync clients.
+    """
+    global _asgi_app
+    _drop_async_http_client()
+    with _lock:
+        _asgi_app = app
+
+
+def _drop_async_http_client() -> None:
+    global _async_client, _async_transport, _async_loop, _async_closer
+    with _lock:
+        closer, transport, loop = _async_closer, _async_transport, _async_loop
+        _async_client, _async_transport, _async_loop, _async_closer = (
+            None,
+            None,
+            None,
+            None,
+        )
+    if closer is not None:
+        _close_async_client(closer, transport, loop)
+
+
+async def _close_when_cancelled(client: httpx.AsyncClient) -> None:
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
+
+
+def _close_async_client(
+    closer: asyncio.Task,
+    transport: Optional[InstrumentedAsyncHTTPTransport],
+    loop: asyncio.AbstractEventLoop,
+) -> None:
+    """Closes the async client of `closer` on `loop`, its own loop, from any thread.
+
+    If that loop is closed without having cancelled `closer`, the connections of
+    the pool are shut down directly.
+    """
+    if closer.done():
+        # closed when its loop shut down
+        return
+    if loop.is_running() and not loop.is_closed():
+        loop.call_soon_threadsafe(closer.cancel)
+    elif transport is not None:
+        transport.close_sockets()
+
+
+def close_http_client() -> None:
+    global _client, _transport
+    with _lock:
+        client, _client, _transport = _client, None, None
+    if client is not None:
+        client.close()
+
+
+def pool_stats() -> Optional[PoolStats]:
+    """Returns connection pool statistics, or None if the pool was never used."""
+    transport = _transport
+    return transport.stats() if transport is not None else None
+
+
+def async_pool_stats() -> Optional[PoolStats]:
+    """Returns async connection pool statistics, or None if the pool was never used."""
+    transport = _async_transport
+    return transport.stats() if transport is not None else None
+
+
+def outstanding_requests() -> Dict[str, int]:
+    """Requests sent and not released yet by the shared clients, per server origin."""
+    counts: Dict[str, int] = {}
+    for transport in (_transport, _async_transport):
+        if transport is None:
+            continue
+        with transport._lock:
+            for key, count in transport.outstanding.items():
+                counts[key] = counts.get(key, 0) + count
+    return counts
+
+
+atexit.register(close_http_client)
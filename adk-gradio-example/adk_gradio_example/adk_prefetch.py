@@ -0,0 +1,196 @@
+"""Background prefetch of the traces and graphs of the events of a turn.
+
+As soon as a client knows the events of a turn (the end of `stream_message`, the
+response of `send_message`, new events from `get_new_events`), its prefetcher
+starts fetching their traces and graphs in the background, into the client
+caches. Opening an event in the inspector is then usually a cache hit, or waits
+for the fetch in flight instead of starting another one (see `join`).
+
+- each (kind, event id) is fetched once: those already cached or in flight are
+  skipped
+- at most `max_concurrency` fetches run at once: per client for the async
+  prefetcher, per process for the sync one (a shared thread pool)
+- `cancel` drops the fetches not done yet; the clients call it from
+  `end_session`, so a closed session stops loading the ADK API server
+
+The default concurrency is set with ADK_PREFETCH_CONCURRENCY (default 4, 0
+disables the prefetch).
+"""
+
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from dataclasses import asdict, dataclass
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("ADK_PREFETCH_CONCURRENCY", "4"))
+
+KINDS = ("trace", "graph")
+
+
+@dataclass
+class PrefetchStats:
+    scheduled: int
+    completed: int
+    failed: int
+    cancelled: int
+    in_flight: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class _PrefetcherBase:
+    """Bookkeeping shared by the sync and async prefetchers."""
+
+    def __init__(self, client: Any, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._pending: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def _cache(self, kind: str):
+        return self.client.trace_cache if kind == "trace" else self.client.graph_cache
+
+    def _to_fetch(self, events: Iterable[Dict]) -> List[Tuple[str, str]]:
+        if self.max_concurrency <= 0:
+            return []
+        keys = []
+        for e in events:
+            # partial events of a stream are not stored in the session
+            if not isinstance(e, dict) or "id" not in e or e.get("partial"):
+                continue
+            for kind in KINDS:
+                if kind == "trace" and not self.client.has_trace(e):
+                    continue
+                key = (kind, e["id"])
+                if key not in self._pending and e["id"] not in self._cache(kind):
+                    keys.append(key)
+        return keys
+
+    def _fetcher(self, kind: str):
+        return self.client.get_trace if kind == "trace" else self.client.get_graph
+
+    def _done(self, key: Tuple[str, str], future: Any) -> None:
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+            if future.cancelled():
+                self.cancelled += 1
+            elif future.exception() is not None:
+                self.failed += 1
+                logger.debug("Prefetch of %s %s failed: %s", *key, future.exception())
+            else:
+                self.completed += 1
+
+    def _in_flight(self, keys: Optional[Iterable[Tuple[str, str]]]) -> List[Any]:
+        with self._lock:
+            if keys is None:
+                return list(self._pending.values())
+            return [self._pending[k] for k in keys if k in self._pending]
+
+    def stats(self) -> PrefetchStats:
+        return PrefetchStats(
+            scheduled=self.scheduled,
+            completed=self.completed,
+            failed=self.failed,
+            cancelled=self.cancelled,
+            in_flight=len(self._pending),
+        )
+
+
+class AsyncPrefetcher(_PrefetcherBase):
+    """Prefetcher of an `AsyncADKChatClient`, running its fetches as tasks of the event loop."""
+
+    def __init__(self, client: Any, max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        super().__init__(client, max_concurrency)
+        self._semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    async def _fetch(self, kind: str, event_id: str) -> Any:
+        async with self._semaphore:
+            return await self._fetcher(kind)(event_id)
+
+    def prefetch(self, events: Iterable[Dict]) -> int:
+        """Starts fetching what is missing for `events`; returns the number of fetches started."""
+        keys = self._to_fetch(events)
+        if not keys:
+            return 0
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            for key in keys:
+                task = loop.create_task(self._fetch(*key))
+                self._pending[key] = task
+                task.add_done_callback(lambda t, key=key: self._done(key, t))
+            self.scheduled += len(keys)
+        return len(keys)
+
+    async def join(self, keys: Optional[Iterable[Tuple[str, str]]] = None) -> None:
+        """Waits for the fetches in flight of `keys` (all of them by default)."""
+        tasks = self._in_flight(keys)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def cancel(self) -> None:
+        for task in self._in_flight(None):
+            task.cancel()
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _shared_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(DEFAULT_MAX_CONCURRENCY, 1),
+                thread_name_prefix="adk-prefetch",
+            )
+        return _executor
+
+
+class Prefetcher(_PrefetcherBase):
+    """Prefetcher of an `ADKChatClient`, running its fetches in a thread pool shared by the clients.
+
+    `max_concurrency` only enables (> 0) or disables the prefetch: the fetches
+    in flight are bounded by the size of the shared pool.
+    """
+
+    def prefetch(self, events: Iterable[Dict]) -> int:
+        """Starts fetching what is missing for `events`; returns the number of fetches started."""
+        keys = self._to_fetch(events)
+        if not keys:
+            return 0
+        executor = _shared_executor()
+        with self._lock:
+            for key in keys:
+                future = executor.submit(self._fetcher(key[0]), key[1])
+                self._pending[key] = future
+            self.scheduled += len(keys)
+        # callbacks are added once registered: they may run right away
+        for key in keys:
+            future = self._pending.get(key)
+            if future is not None:
+                future.add_done_callback(lambda f, key=key: self._done(key, f))
+        return len(keys)
+
+    def join(self, keys: Optional[Iterable[Tuple[str, str]]] = None) -> None:
+        """Waits for the fetches in flight of `keys` (all of them by default)."""
+        futures: List[Future] = self._in_flight(keys)
+        if futures:
+            wait_futures(futures)
+
+    def cancel(self) -> None:
+        # fetches already running finish, the queued ones are dropped
+        for future in self._in_flight(None):
+            future.cancel()
@@ -0,0 +1,403 @@
+"""Registries of the ADK chat clients used by the Gradio sessions.
+
+A registry maps a Gradio `session_hash` to a started chat client. It keeps at most
+`capacity` clients in memory (least recently used first out) and remembers, for
+each Gradio session, the ADK session it is bound to (its id and the URL of the ADK
+API server holding it):
+
+- a client evicted for capacity is only dropped from memory and passed to
+  `on_evict` (e.g. to stop its background work); its ADK session is not ended,
+  so the next call for its Gradio session creates a new client bound to the same
+  ADK session, without starting a new one (the conversation is kept). The ADK
+  session of a Gradio session that does not come back is ended once it expires
+- a Gradio session idle for more than `idle_ttl` seconds expires: its client is
+  dropped and `end_session` is called, so the ADK session is deleted server-side
+- a session for which `validate(base_url)` returns False (its ADK API server is
+  down) is forgotten, and the next call starts a new one
+
+The API key of a Gradio session (`set_api_key`) is kept by the registry and given
+to each client created for it, so it survives evictions and rebinds. It stays in
+this process: it is never written to the `BindingStore`.
+
+The bindings are kept in a `BindingStore` (see `adk_state_store`): in this
+process by default, or in a store shared by the worker processes of the app. The
+last use of a session is written to the store at most once per 1% of `idle_ttl`
+(like the expiry sweep), and the async registry reads and writes a store that
+does I/O in a thread, off the event loop.
+
+`factory(key)` creates the client of a new session; `factory(key, base_url)` a
+client bound to an existing session held by the ADK API server at `base_url`.
+
+The defaults can be set with environment variables:
+
+- ADK_SESSION_CAPACITY: maximum number of clients kept in memory (default 500)
+- ADK_SESSION_IDLE_TTL: seconds before an idle session expires (default 3600, 0
+  disables expiry)
+"""
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from adk_gradio_example.adk_state_store import Binding, BindingStore, MemoryBindingStore
+
+DEFAULT_CAPACITY = int(os.environ.get("ADK_SESSION_CAPACITY", "500"))
+DEFAULT_IDLE_TTL = float(os.environ.get("ADK_SESSION_IDLE_TTL", "3600"))
+
+
+@dataclass
+class RegistryStats:
+    capacity: int
+    clients: int
+    bindings: int
+    hits: int
+    misses: int
+    rebinds: int
+    evictions: int
+    expirations: int
+    invalidations: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class _RegistryBase:
+    """Bookkeeping shared by the sync and async registries.
+
+    `_clients` is ordered from least to most recently used, so the LRU eviction
+    only looks at its front entries.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., Any],
+        capacity: int = DEFAULT_CAPACITY,
+        idle_ttl: Optional[float] = DEFAULT_IDLE_TTL,
+        on_evict: Optional[Callable[[str, Any], None]] = None,
+        validate: Optional[Callable[[str], bool]] = None,
+        bindings: Optional[BindingStore] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.factory = factory
+        self.capacity = capacity
+        self.idle_ttl = idle_ttl or None
+        self.on_evict = on_evict
+        self.validate = validate
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._clients: "OrderedDict[str, Any]" = OrderedDict()
+        self._bindings = bindings if bindings is not None else MemoryBindingStore()
+        self.hits = 0
+        self.misses = 0
+        self.rebinds = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._next_sweep = 0.0
+        # key -> (session id, time) of the last binding written by this process
+        self._touched: Dict[str, Tuple[str, float]] = {}
+        # key -> custom API key of the Gradio session, kept until it is discarded
+        self._api_keys: Dict[str, str] = {}
+
+    def use_bindings(self, bindings: BindingStore) -> None:
+        """Keeps the bindings in `bindings` from now on (the current ones are dropped)."""
+        with self._lock:
+            self._bindings = bindings
+
+    def set_api_key(self, key: str, api_key: Optional[str]) -> None:
+        """Sends `api_key` with the requests of the Gradio session `key` from now on.
+
+        With None, the ADK API server uses its own key again.
+        """
+        with self._lock:
+            if api_key:
+                self._api_keys[key] = api_key
+            else:
+                self._api_keys.pop(key, None)
+            client = self._clients.get(key)
+        if client is not None:
+            client.set_custom_api_key(api_key or None)
+
+    def _create(self, key: str, *args: Any) -> Any:
+        client = self.factory(key, *args)
+        api_key = self._api_keys.get(key)
+        if api_key:
+            client.set_custom_api_key(api_key)
+        return client
+
+    def _touch(self, key: str, client: Any) -> None:
+        if not client.session_id:
+            return
+        now = self._clock()
+        touched = self._touched.get(key)
+        if (
+            touched is not None
+            and touched[0] == client.session_id
+            and (self.idle_ttl is None or now < touched[1] + self.idle_ttl / 100)
+        ):
+            # sessions expire up to 1% of `idle_ttl` late, as with the sweep
+            return
+        self._bindings.set(key, Binding(client.session_id, client.base_url, now))
+        self._touched[key] = (client.session_id, now)
+
+    def _forget(self, key: str) -> None:
+        self._clients.pop(key, None)
+        self._touched.pop(key, None)
+
+    def _bound_client(self, key: str, session_id: str, base_url: str) -> Any:
+        client = self._create(key, base_url)
+        client.session_id = session_id
+        return client
+
+    def _lookup(self, key: str) -> Tuple[Any, Optional[Tuple[str, str]]]:
+        """Returns the cached client (or None) and, if there is none, the binding of `key`."""
+        binding = self._bindings.get(key)
+        if (
+            binding is not None
+            and self.validate is not None
+            and not self.validate(binding[1])
+        ):
+            # the ADK session cannot be reached any more: forget it
+            self._forget(key)
+            self._bindings.pop(key)
+            self.invalidations += 1
+            binding = None
+        client = self._clients.get(key)
+        if (
+            client is not None
+            and client.session_id
+            and (binding is None or binding.session_id != client.session_id)
+        ):
+            # rebound or ended by another process sharing the bindings
+            self._forget(key)
+            client = None
+        if client is not None:
+            self._clients.move_to_end(key)
+            self._touch(key, client)
+            self.hits += 1
+            return client, None
+        self.misses += 1
+        return None, binding[:2] if binding else None
+
+    def _new_client(self, key: str, binding: Optional[Tuple[str, str]]) -> Any:
+        if binding:
+            self.rebinds += 1
+            return self._bound_client(key, *binding)
+        return self._create(key)
+
+    def _expire_and_lookup(
+        self, key: str
+    ) -> Tuple[List[Tuple[str, Any]], Any, Optional[Tuple[str, str]]]:
+        with self._lock:
+            expired = self._pop_expired()
+            return (expired, *self._lookup(key))
+
+    def _store(self, key: str, client: Any) -> List[Tuple[str, Any]]:
+        """Registers `client` and returns the clients evicted to stay within capacity.
+
+        The binding of `client` is not written: see `_touch`.
+        """
+        self._clients[key] = client
+        self._clients.move_to_end(key)
+        evicted = []
+        while len(self._clients) > self.capacity:
+            evicted_key, evicted_client = self._clients.popitem(last=False)
+            self._touched.pop(evicted_key, None)
+            evicted.append((evicted_key, evicted_client))
+            self.evictions += 1
+        return evicted
+
+    def _locked_touch(self, key: str, client: Any) -> None:
+        with self._lock:
+            self._touch(key, client)
+
+    def _pop_expired(self, force: bool = False) -> List[Tuple[str, Any]]:
+        """Removes the expired sessions; returns a client to end for each of them."""
+        now = self._clock()
+        if self.idle_ttl is None or (now < self._next_sweep and not force):
+            return []
+        # sessions expire up to 1% of `idle_ttl` late, but a shared store is not
+        # written on every call
+        self._next_sweep = now + self.idle_ttl / 100
+        expired = []
+        for key, (session_id, base_url, _) in self._bindings.pop_expired(
+            now - self.idle_ttl
+        ):
+            client = self._clients.pop(key, None)
+            self._touched.pop(key, None)
+            if client is None:
+                # evicted earlier: a throwaway client is enough to end the session
+                client = self._bound_client(key, session_id, base_url)
+            expired.append((key, client))
+            self.expirations += 1
+        return expired
+
+    def _pop(self, key: str) -> Optional[Any]:
+        client = self._clients.pop(key, None)
+        self._touched.pop(key, None)
+        self._api_keys.pop(key, None)
+        binding = self._bindings.pop(key)
+        if client is None and binding is not None:
+            client = self._bound_client(key, *binding[:2])
+        return client
+
+    def _notify_evicted(self, evicted: List[Tuple[str, Any]]) -> None:
+        if self.on_evict is not None:
+            for key, client in evicted:
+                self.on_evict(key, client)
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._clients
+
+    def stats(self) -> RegistryStats:
+        with self._lock:
+            return RegistryStats(
+                capacity=self.capacity,
+                clients=len(self._clients),
+                bindings=len(self._bindings),
+                hits=self.hits,
+                misses=self.misses,
+                rebinds=self.rebinds,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                invalidations=self.invalidations,
+            )
+
+
+class SessionRegistry(_RegistryBase):
+    """Registry of `ADKChatClient`s; thread-safe."""
+
+    def get(self, key: str) -> Any:
+        """Returns the client of the Gradio session `key`, started or rebound if needed."""
+        expired, client, binding = self._expire_and_lookup(key)
+        self._end(expired)
+        if client is not None:
+            return client
+
+        client = self._new_client(key, binding)
+        if not binding and not client.start_session():
+            # not registered, so the next call tries again
+            return client
+        with self._lock:
+            current = self._clients.get(key)
+            if current is None:
+                evicted = self._store(key, client)
+                self._touch(key, client)
+        if current is not None:
+            # registered by a concurrent call meanwhile
+            if not binding:
+                client.end_session()
+            return current
+        self._notify_evicted(evicted)
+        return client
+
+    def discard(self, key: str) -> None:
+        """Forgets the Gradio session `key` and ends its ADK session."""
+        with self._lock:
+            client = self._pop(key)
+        if client is not None:
+            self._end([(key, client)])
+
+    def sweep(self) -> int:
+        """Ends the expired sessions now; returns how many there were."""
+        with self._lock:
+            expired = self._pop_expired(force=True)
+        self._end(expired)
+        return len(expired)
+
+    @staticmethod
+    def _end(clients: List[Tuple[str, Any]]) -> None:
+        for _, client in clients:
+            client.end_session()
+
+
+class AsyncSessionRegistry(_RegistryBase):
+    """Registry of `AsyncADKChatClient`s, to be used from a single event loop.
+
+    A new client is registered before its session is started, so concurrent
+    calls for the same Gradio session await the same `start_session` instead of
+    opening a second ADK session. Expired sessions are ended in background tasks.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._starts: Dict[str, asyncio.Future] = {}
+        self._cleanups: set = set()
+
+    async def _blocking(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # a shared store does I/O: not on the event loop
+        if self._bindings.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get(self, key: str) -> Any:
+        """Returns the client of the Gradio session `key`, started or rebound if needed."""
+        expired, client, binding = await self._blocking(self._expire_and_lookup, key)
+        evicted = []
+        if client is None:
+            with self._lock:
+                # registered by a concurrent call meanwhile, or a new one
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._new_client(key, binding)
+                    if not binding:
+                        self._starts[key] = asyncio.ensure_future(
+                            client.start_session()
+                        )
+                    evicted = self._store(key, client)
+                    for evicted_key, _ in evicted:
+                        self._starts.pop(evicted_key, None)
+            if binding:
+                await self._blocking(self._locked_touch, key, client)
+        self._end(expired)
+        self._notify_evicted(evicted)
+
+        start = self._starts.get(key)
+        if start is not None:
+            started = await start
+            # by the first caller done waiting, unless discarded meanwhile
+            if self._starts.get(key) is start:
+                del self._starts[key]
+                if started:
+                    await self._blocking(self._locked_touch, key, client)
+                else:
+                    with self._lock:
+                        if self._clients.get(key) is client:
+                            self._forget(key)
+        return client
+
+    def _locked_pop(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._pop(key)
+
+    def _locked_sweep(self) -> List[Tuple[str, Any]]:
+        with self._lock:
+            return self._pop_expired(force=True)
+
+    async def discard(self, key: str) -> None:
+        """Forgets the Gradio session `key` and ends its ADK session."""
+        start = self._starts.pop(key, None)
+        client = await self._blocking(self._locked_pop, key)
+        if start is not None:
+            await start
+        if client is not None:
+            await client.end_session()
+
+    async def sweep(self) -> int:
+        """Ends the expired sessions now; returns how many there were."""
+        expired = await self._blocking(self._locked_sweep)
+        await asyncio.gather(*(client.end_session() for _, client in expired))
+        return len(expired)
+
+    def _end(self, clients: List[Tuple[str, Any]]) -> None:
+        for _, client in clients:
+            task = asyncio.ensure_future(client.end_session())
+            self._cleanups.add(task)
+            task.add_done_callback(self._cleanups.discard)
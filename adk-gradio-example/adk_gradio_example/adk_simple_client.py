@@ -1,38 +1,326 @@
-from functools import lru_cache
+import asyncio
+from collections import deque
+from dataclasses import asdict, dataclass
 import json
-import os
-from typing import Dict, Optional
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Union
 from dotenv import load_dotenv
 import httpx
 from google.genai import types
 
+from adk_gradio_example.adk_backends import (
+    backend_pool,
+    configure_backends,
+    is_backend_healthy,
+)
+from adk_gradio_example.adk_cache import ByteLRUCache
+from adk_gradio_example.adk_http_pool import get_async_http_client, get_http_client
+from adk_gradio_example.adk_prefetch import AsyncPrefetcher, Prefetcher
+from adk_gradio_example.adk_trace_store import TraceStore, shared_trace_store
+from adk_gradio_example.adk_state_store import (
+    StateStore,
+    configure_state_store,
+    state_store,
+)
+from adk_gradio_example.adk_session_registry import (
+    AsyncSessionRegistry,
+    SessionRegistry,
+)
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+NO_SESSION_ERROR = "Error: No active session. Please start a session first."
+
+_MISSING = object()
+
+# base URLs of the ADK API servers without the events route of adk_sqlite_sessions
+_servers_without_events_route: set = set()
+
+RECENT_TURNS = 20
+
+
+@dataclass
+class TurnTiming:
+    """Latencies of a streamed agent turn, measured from the `/run_sse` request."""
+
+    ttft_ms: Optional[float]
+    """Time to the first event with content (text or function call)."""
+    ttlt_ms: float
+    """Time to the last event."""
+    events: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+_recent_turn_timings: "deque[TurnTiming]" = deque(maxlen=RECENT_TURNS)
+
+
+def recent_turn_timings() -> List[TurnTiming]:
+    """The timings of the last `RECENT_TURNS` streamed turns of the process, oldest first."""
+    return list(_recent_turn_timings)
+
 
-class ADKChatClient:
-    def __init__(self, user_session_id: str = None, base_url: str = None):
-        """Initialize the ADK chat client"""
+class _TurnClock:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.events = 0
+
+    def tick(self, event: Dict) -> None:
+        now = time.perf_counter()
+        self.events += 1
+        self.last = now
+        if self.first is None and (event.get("content") or {}).get("parts"):
+            self.first = now
+
+    def timing(self) -> TurnTiming:
+        def ms(t: Optional[float]) -> Optional[float]:
+            return None if t is None else round((t - self.start) * 1000, 1)
+
+        end = self.last if self.last is not None else time.perf_counter()
+        timing = TurnTiming(ttft_ms=ms(self.first), ttlt_ms=ms(end), events=self.events)
+        logger.info("Streamed turn: %s", timing)
+        _recent_turn_timings.append(timing)
+        return timing
+
+
+class _ADKChatClientBase:
+    """State, URLs and payload handling shared by the sync and async clients."""
+
+    def __init__(
+        self,
+        user_session_id: str = None,
+        base_url: str = None,
+        http_client: Optional[Union[httpx.Client, httpx.AsyncClient]] = None,
+        timeout: Optional[float] = None,
+        cache: Optional[ByteLRUCache] = None,
+        trace_store: Optional[TraceStore] = None,
+        shared_state: Optional[StateStore] = None,
+    ):
+        """Initialize the ADK chat client
+
+        All clients share the process-wide connection pool from `adk_http_pool`
+        unless a dedicated `http_client` is given. `timeout` (seconds) overrides
+        the pool default for every call made by this client; each method also
+        accepts its own `timeout`. Traces and graphs are kept in `cache` (by
+        default the process-wide cache from `adk_cache`, bounded in bytes).
+
+        The LLM requests of the traces returned by `get_trace` are interned in
+        `trace_store`: their contents and config are references to values shared
+        by all the traces (see `adk_trace_store`). So are the graphs returned by
+        `get_graph`: each is a reference to a graph stored once by content hash.
+        Clients sharing a custom `cache` must share the same `trace_store`.
+
+        On a cache miss, the responses are looked up in the second-level cache of
+        `shared_state` (by default the process-wide store from `adk_state_store`,
+        shared by the worker processes) before calling the ADK API server.
+
+        Once the events of a turn are known, `prefetcher` fetches their traces
+        and graphs in the background (see `adk_prefetch`); `end_session` cancels
+        the fetches not done yet.
+        """
         self.user_session_id = user_session_id
         self.base_url = base_url
+        self._http = http_client
+        self.timeout = timeout
         self.app_name = "weather_agent"
         self.user_id = "user"
         self.session_id = None
-        self.trace_cache = {}
-        self.graph_cache = {}
+        if trace_store is None:
+            trace_store = (
+                shared_trace_store() if cache is None else TraceStore(cache)
+            )
+        self.trace_store = trace_store
+        cache = trace_store.cache
+        # event ids are unique across sessions, so the clients share the entries
+        self.trace_cache = cache.view("trace")
+        self.graph_cache = cache.view("graph")
+        self.shared_state = shared_state if shared_state is not None else state_store()
         self.custom_api_key: Optional[str] = None
+        self.last_turn_timing: Optional[TurnTiming] = None
+        self.prefetcher = self._new_prefetcher()
+        self.reset_event_cursor()
+
+    def reset_event_cursor(self) -> None:
+        """Forget which events were seen: the next `get_new_events` returns a full snapshot"""
+        self.last_event_timestamp: Optional[float] = None
+        # ids of the seen events sharing `last_event_timestamp` (events of one
+        # invocation can have the same timestamp)
+        self._last_event_ids: set = set()
+
+    def _take_new_events(self, session: Dict) -> Dict:
+        events = session.get("events", [])
+        incremental = self.last_event_timestamp is not None
+        if incremental:
+            events = [
+                e
+                for e in events
+                if e["timestamp"] > self.last_event_timestamp
+                or (
+                    e["timestamp"] == self.last_event_timestamp
+                    and e["id"] not in self._last_event_ids
+                )
+            ]
+        for e in events:
+            if (
+                self.last_event_timestamp is None
+                or e["timestamp"] > self.last_event_timestamp
+            ):
+                self.last_event_timestamp = e["timestamp"]
+                self._last_event_ids = set()
+            if e["timestamp"] == self.last_event_timestamp:
+                self._last_event_ids.add(e["id"])
+        if not incremental and self.last_event_timestamp is None:
+            # empty session: later events are all new
+            self.last_event_timestamp = float("-inf")
+        if incremental:
+            # a full snapshot is the history of the session: its events are
+            # loaded when opened, not all at once
+            self.prefetcher.prefetch(events)
+        return {**session, "events": events, "incremental": incremental}
+
+    def _default_http_client(self):
+        raise NotImplementedError
+
+    def _new_prefetcher(self):
+        raise NotImplementedError
+
+    @property
+    def http(self):
+        return self._http or self._default_http_client()
+
+    def _timeout(self, timeout: Optional[float]) -> Union[float, httpx.Timeout]:
+        if timeout is not None:
+            return timeout
+        if self.timeout is not None:
+            return self.timeout
+        return self.http.timeout
+
+    def _sessions_url(self) -> str:
+        return f"{self.base_url}/apps/{self.app_name}/users/{self.user_id}/sessions"
+
+    def _session_url(self) -> str:
+        return f"{self._sessions_url()}/{self.session_id}"
+
+    def _run_payload(self, text_message: str, streaming: bool = False) -> Dict:
+        message = {"parts": [{"text": text_message}], "role": "user"}
+        return {
+            "app_name": self.app_name,
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+            "new_message": message,
+            "streaming": streaming,
+        }
+
+    def _run_headers(self) -> Dict:
+        # the key of this session is sent with the request rather than set in
+        # os.environ, which is shared by all sessions (see weather_agent/credentials.py)
+        headers = {"Content-Type": "application/json"}
+        if self.custom_api_key:
+            headers["X-Goog-Api-Key"] = self.custom_api_key
+        return headers
+
+    @staticmethod
+    def _parse_sse_line(line: str) -> Optional[Dict]:
+        if not line.startswith("data:"):
+            return None
+        event = json.loads(line[len("data:") :])
+        if "error" in event:
+            raise Exception(f"Error: {event['error']}")
+        return event
+
+    def _use_events_route(self) -> bool:
+        return (
+            self.last_event_timestamp is not None
+            and self.base_url not in _servers_without_events_route
+        )
+
+    def _events_after_params(self) -> Dict:
+        return {"after_timestamp": self.last_event_timestamp}
+
+    def _events_route_missing(self, response: httpx.Response) -> bool:
+        """True if `response` is a 404 for the route itself, not for the session."""
+        if response.status_code != 404:
+            return False
+        try:
+            missing = response.json().get("detail") == "Not Found"
+        except ValueError:
+            missing = True
+        if missing:
+            _servers_without_events_route.add(self.base_url)
+        return missing
+
+    def _events_params(self) -> Dict:
+        return {
+            "app_name": self.app_name,
+            "user_id": self.user_id,
+            "session_id": self.session_id,
+        }
+
+    @staticmethod
+    def _parse_trace(json_response: Dict) -> Dict:
+        # OpenTelemetry ids, in their usual hex form: the 128-bit trace_id does
+        # not fit the 64-bit integers of orjson, used by Gradio to send values
+        for key, digits in (("trace_id", 32), ("span_id", 16)):
+            if isinstance(json_response.get(key), int):
+                json_response[key] = format(json_response[key], f"0{digits}x")
+        if "gcp.vertex.agent.llm_request" in json_response:
+            json_response["gcp.vertex.agent.llm_request"] = json.loads(
+                json_response["gcp.vertex.agent.llm_request"]
+            )
+        if "gcp.vertex.agent.llm_response" in json_response:
+            json_response["gcp.vertex.agent.llm_response"] = json.loads(
+                json_response["gcp.vertex.agent.llm_response"]
+            )
+        return json_response
+
+    @staticmethod
+    def has_trace(event: Dict) -> bool:
+        """False for the events without a trace: the ADK API server only keeps
+        the spans of the LLM calls and tool responses of the agents."""
+        return event.get("author") != "user"
+
+    def _cache_trace(self, event_id: str, content: bytes) -> Dict:
+        trace = self.trace_store.intern(self._parse_trace(json.loads(content)))
+        self.trace_cache[event_id] = trace
+        return trace
+
+    def _cache_graph(self, event_id: str, content: bytes) -> Dict:
+        # a reference to the graph, stored once in the trace store for all events
+        graph = self.trace_store.intern_graph(json.loads(content))
+        self.graph_cache[event_id] = graph
+        return graph
+
+    def set_custom_api_key(self, custom_api_key):
+        self.custom_api_key = custom_api_key
+
+
+class ADKChatClient(_ADKChatClientBase):
+    def _default_http_client(self) -> httpx.Client:
+        return get_http_client()
 
-    def start_session(self) -> bool:
+    def _new_prefetcher(self) -> Prefetcher:
+        return Prefetcher(self)
+
+    def start_session(self, timeout: Optional[float] = None) -> bool:
         try:
             headers = {"Content-Type": "application/json"}
 
-            response = httpx.post(
-                f"{self.base_url}/apps/{self.app_name}/users/{self.user_id}/sessions",
+            response = self.http.post(
+                self._sessions_url(),
                 headers=headers,
+                timeout=self._timeout(timeout),
             )
 
             if response.status_code == 200:
                 json_response = response.json()
                 self.session_id = json_response.get("id")
+                self.reset_event_cursor()
                 return True
             else:
                 print(
@@ -44,53 +332,79 @@ class ADKChatClient:
             print(f"Error starting session: {str(e)}")
             return False
 
-    def send_message(self, text_message: str) -> Optional[str]:
+    def send_message(
+        self, text_message: str, timeout: Optional[float] = None
+    ) -> Optional[str]:
         """Send a message to the ADK agent and get response"""
         if not self.session_id:
-            return "Error: No active session. Please start a session first."
+            return NO_SESSION_ERROR
 
-        headers = {"Content-Type": "application/json"}
-        message = {"parts": [{"text": text_message}], "role": "user"}
+        payload = self._run_payload(text_message)
 
-        payload = {
-            "app_name": self.app_name,
-            "user_id": self.user_id,
-            "session_id": self.session_id,
-            "new_message": message,
-            "streaming": False,
-        }
-
-        prev_api_key = (
-            os.environ["GOOGLE_API_KEY"] if "GOOGLE_API_KEY" in os.environ else None
+        response = self.http.post(
+            f"{self.base_url}/run",
+            headers=self._run_headers(),
+            json=payload,
+            timeout=self._timeout(timeout),
         )
-        if self.custom_api_key:
-            os.environ["GOOGLE_API_KEY"] = self.custom_api_key
-        response = httpx.post(f"{self.base_url}/run", headers=headers, json=payload)
-        if self.custom_api_key:
-            os.environ["GOOGLE_API_KEY"] = prev_api_key
 
         if response.status_code == 200:
             json_response = response.json()
+            self.prefetcher.prefetch(json_response)
             return json_response
         else:
             raise Exception(f"Error: {response.status_code} - {response.text}")
 
-    def get_events(self) -> Dict:
+    def stream_message(
+        self, text_message: str, timeout: Optional[float] = None
+    ) -> Iterator[Dict]:
+        """Send a message to the ADK agent and yield its events as they are produced
+
+        Uses the `/run_sse` endpoint with token streaming: text is first yielded
+        in events marked `"partial": True`, each holding the next chunk, then in
+        a final event holding the whole text. The timing of the turn is stored in
+        `last_turn_timing` once the stream ends.
+        """
         if not self.session_id:
-            return "Error: No active session. Please start a session first."
+            raise Exception(NO_SESSION_ERROR)
 
-        headers = {"Content-Type": "application/json"}
+        payload = self._run_payload(text_message, streaming=True)
 
-        params = {
-            "app_name": self.app_name,
-            "user_id": self.user_id,
-            "session_id": self.session_id,
-        }
+        clock = _TurnClock()
+        events = []
+        try:
+            with self.http.stream(
+                "POST",
+                f"{self.base_url}/run_sse",
+                headers=self._run_headers(),
+                json=payload,
+                timeout=self._timeout(timeout),
+            ) as response:
+                if response.status_code != 200:
+                    response.read()
+                    raise Exception(f"Error: {response.status_code} - {response.text}")
+                for line in response.iter_lines():
+                    event = self._parse_sse_line(line)
+                    if event is not None:
+                        clock.tick(event)
+                        events.append(event)
+                        yield event
+            # the turn is complete: its traces have been recorded
+            self.prefetcher.prefetch(events)
+        finally:
+            self.last_turn_timing = clock.timing()
+
+    def get_events(self, timeout: Optional[float] = None) -> Dict:
+        if not self.session_id:
+            return NO_SESSION_ERROR
 
-        response = httpx.get(
-            f"{self.base_url}/apps/{self.app_name}/users/{self.user_id}/sessions/{self.session_id}",
+        headers = {"Content-Type": "application/json"}
+
+        response = self.http.get(
+            self._session_url(),
             headers=headers,
-            params=params,
+            params=self._events_params(),
+            timeout=self._timeout(timeout),
         )
         if response.status_code == 200:
             json_response = response.json()
@@ -98,77 +412,367 @@ class ADKChatClient:
         else:
             raise Exception(f"Error: {response.status_code} - {response.text}")
 
-    def get_trace(self, event_id) -> Optional[Dict]:
-        if event_id in self.trace_cache:
-            return self.trace_cache[event_id]
+    def get_new_events(self, timeout: Optional[float] = None) -> Dict:
+        """Returns the session with only the events not returned by a previous call.
+
+        The result has `"incremental": True`, except for the first call (or the
+        first call after `reset_event_cursor`) which returns every event. Later
+        calls only fetch the new events from servers with the events route of
+        `adk_sqlite_sessions`, and the whole session from the others.
+        """
+        if not self.session_id:
+            return NO_SESSION_ERROR
+        if self._use_events_route():
+            # only the events since the last call, read from an index by
+            # servers using adk_sqlite_sessions
+            response = self.http.get(
+                f"{self._session_url()}/events",
+                params=self._events_after_params(),
+                timeout=self._timeout(timeout),
+            )
+            if response.status_code == 200:
+                return self._take_new_events(response.json())
+            if not self._events_route_missing(response):
+                raise Exception(f"Error: {response.status_code} - {response.text}")
+        return self._take_new_events(self.get_events(timeout=timeout))
+
+    def get_trace(self, event_id, timeout: Optional[float] = None) -> Optional[Dict]:
+        cached = self.trace_cache.get(event_id, _MISSING)
+        if cached is not _MISSING:
+            return cached
         else:
             if not self.session_id:
-                return "Error: No active session. Please start a session first."
+                return NO_SESSION_ERROR
+
+            content = self.shared_state.get_cached("trace", event_id)
+            if content is not None:
+                return self._cache_trace(event_id, content)
 
             headers = {"Content-Type": "application/json"}
 
-            response = httpx.get(
+            response = self.http.get(
                 f"{self.base_url}/debug/trace/{event_id}",
                 headers=headers,
+                timeout=self._timeout(timeout),
             )
             if response.status_code == 200:
-                json_response = response.json()
-
-                if "gcp.vertex.agent.llm_request" in json_response:
-                    json_response["gcp.vertex.agent.llm_request"] = json.loads(
-                        json_response["gcp.vertex.agent.llm_request"]
-                    )
-                if "gcp.vertex.agent.llm_response" in json_response:
-                    json_response["gcp.vertex.agent.llm_response"] = json.loads(
-                        json_response["gcp.vertex.agent.llm_response"]
-                    )
-
-                self.trace_cache[event_id] = json_response
-                return json_response
+                self.shared_state.put_cached("trace", event_id, response.content)
+                return self._cache_trace(event_id, response.content)
             else:
-                self.trace_cache[event_id] = None
+                # only a missing value is cached: other errors are retried
+                if response.status_code == 404:
+                    self.trace_cache[event_id] = None
                 raise Exception(f"Error: {response.status_code} - {response.text}")
 
-    def get_graph(self, event_id) -> Optional[Dict]:
-        if event_id in self.graph_cache:
-            return self.graph_cache[event_id]
+    def get_graph(self, event_id, timeout: Optional[float] = None) -> Optional[Dict]:
+        cached = self.graph_cache.get(event_id, _MISSING)
+        if cached is not _MISSING:
+            return cached
         else:
             if not self.session_id:
-                return "Error: No active session. Please start a session first."
+                return NO_SESSION_ERROR
+
+            content = self.shared_state.get_cached("graph", event_id)
+            if content is not None:
+                return self._cache_graph(event_id, content)
+
+            headers = {"Content-Type": "application/json"}
+            response = self.http.get(
+                f"{self._session_url()}/events/{event_id}/graph",
+                headers=headers,
+                timeout=self._timeout(timeout),
+            )
+            if response.status_code == 200:
+                self.shared_state.put_cached("graph", event_id, response.content)
+                return self._cache_graph(event_id, response.content)
+            else:
+                # only a missing value is cached: other errors are retried
+                if response.status_code == 404:
+                    self.graph_cache[event_id] = None
+                raise Exception(f"Error: {response.status_code} - {response.text}")
 
+    def end_session(self, timeout: Optional[float] = None):
+        """End the current chat session"""
+        self.prefetcher.cancel()
+        if self.session_id:
+            try:
+                headers = {}
+                self.http.delete(
+                    self._session_url(),
+                    headers=headers,
+                    timeout=self._timeout(timeout),
+                )
+                self.session_id = None
+            except:
+                pass
+
+
+class AsyncADKChatClient(_ADKChatClientBase):
+    """Same API as `ADKChatClient`, with every network call awaitable."""
+
+    def _default_http_client(self) -> httpx.AsyncClient:
+        return get_async_http_client()
+
+    def _new_prefetcher(self) -> AsyncPrefetcher:
+        return AsyncPrefetcher(self)
+
+    async def _shared_state(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # a shared store does I/O: not on the event loop
+        if self.shared_state.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def start_session(self, timeout: Optional[float] = None) -> bool:
+        try:
             headers = {"Content-Type": "application/json"}
-            response = httpx.get(
-                f"{self.base_url}/apps/{self.app_name}/users/{self.user_id}/sessions/{self.session_id}/events/{event_id}/graph",
+
+            response = await self.http.post(
+                self._sessions_url(),
                 headers=headers,
-                # params=params,
+                timeout=self._timeout(timeout),
             )
+
             if response.status_code == 200:
                 json_response = response.json()
-                self.graph_cache[event_id] = json_response
-                return json_response
+                self.session_id = json_response.get("id")
+                self.reset_event_cursor()
+                return True
+            else:
+                print(
+                    f"Failed to start session: {response.status_code} - {response.text}"
+                )
+                return False
+
+        except Exception as e:
+            print(f"Error starting session: {str(e)}")
+            return False
+
+    async def send_message(
+        self, text_message: str, timeout: Optional[float] = None
+    ) -> Optional[str]:
+        """Send a message to the ADK agent and get response"""
+        if not self.session_id:
+            return NO_SESSION_ERROR
+
+        payload = self._run_payload(text_message)
+
+        response = await self.http.post(
+            f"{self.base_url}/run",
+            headers=self._run_headers(),
+            json=payload,
+            timeout=self._timeout(timeout),
+        )
+
+        if response.status_code == 200:
+            json_response = response.json()
+            self.prefetcher.prefetch(json_response)
+            return json_response
+        else:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+
+    async def stream_message(
+        self, text_message: str, timeout: Optional[float] = None
+    ) -> AsyncIterator[Dict]:
+        """Send a message to the ADK agent and yield its events as they are produced"""
+        if not self.session_id:
+            raise Exception(NO_SESSION_ERROR)
+
+        payload = self._run_payload(text_message, streaming=True)
+
+        clock = _TurnClock()
+        events = []
+        try:
+            async with self.http.stream(
+                "POST",
+                f"{self.base_url}/run_sse",
+                headers=self._run_headers(),
+                json=payload,
+                timeout=self._timeout(timeout),
+            ) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise Exception(f"Error: {response.status_code} - {response.text}")
+                async for line in response.aiter_lines():
+                    event = self._parse_sse_line(line)
+                    if event is not None:
+                        clock.tick(event)
+                        events.append(event)
+                        yield event
+            # the turn is complete: its traces have been recorded
+            self.prefetcher.prefetch(events)
+        finally:
+            self.last_turn_timing = clock.timing()
+
+    async def get_events(self, timeout: Optional[float] = None) -> Dict:
+        if not self.session_id:
+            return NO_SESSION_ERROR
+
+        headers = {"Content-Type": "application/json"}
+
+        response = await self.http.get(
+            self._session_url(),
+            headers=headers,
+            params=self._events_params(),
+            timeout=self._timeout(timeout),
+        )
+        if response.status_code == 200:
+            json_response = response.json()
+            return json_response
+        else:
+            raise Exception(f"Error: {response.status_code} - {response.text}")
+
+    async def get_new_events(self, timeout: Optional[float] = None) -> Dict:
+        """Returns the session with only the events not returned by a previous call.
+
+        The result has `"incremental": True`, except for the first call (or the
+        first call after `reset_event_cursor`) which returns every event. Later
+        calls only fetch the new events from servers with the events route of
+        `adk_sqlite_sessions`, and the whole session from the others.
+        """
+        if not self.session_id:
+            return NO_SESSION_ERROR
+        if self._use_events_route():
+            response = await self.http.get(
+                f"{self._session_url()}/events",
+                params=self._events_after_params(),
+                timeout=self._timeout(timeout),
+            )
+            if response.status_code == 200:
+                return self._take_new_events(response.json())
+            if not self._events_route_missing(response):
+                raise Exception(f"Error: {response.status_code} - {response.text}")
+        return self._take_new_events(await self.get_events(timeout=timeout))
+
+    async def get_trace(
+        self, event_id, timeout: Optional[float] = None
+    ) -> Optional[Dict]:
+        cached = self.trace_cache.get(event_id, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        else:
+            if not self.session_id:
+                return NO_SESSION_ERROR
+
+            content = await self._shared_state(
+                self.shared_state.get_cached, "trace", event_id
+            )
+            if content is not None:
+                return self._cache_trace(event_id, content)
+
+            headers = {"Content-Type": "application/json"}
+
+            response = await self.http.get(
+                f"{self.base_url}/debug/trace/{event_id}",
+                headers=headers,
+                timeout=self._timeout(timeout),
+            )
+            if response.status_code == 200:
+                await self._shared_state(
+                    self.shared_state.put_cached, "trace", event_id, response.content
+                )
+                return self._cache_trace(event_id, response.content)
             else:
-                self.trace_cache[event_id] = None
+                # only a missing value is cached: other errors are retried
+                if response.status_code == 404:
+                    self.trace_cache[event_id] = None
                 raise Exception(f"Error: {response.status_code} - {response.text}")
 
-    def set_custom_api_key(self, custom_api_key):
-        self.custom_api_key = custom_api_key
+    async def get_graph(
+        self, event_id, timeout: Optional[float] = None
+    ) -> Optional[Dict]:
+        cached = self.graph_cache.get(event_id, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        else:
+            if not self.session_id:
+                return NO_SESSION_ERROR
+
+            content = await self._shared_state(
+                self.shared_state.get_cached, "graph", event_id
+            )
+            if content is not None:
+                return self._cache_graph(event_id, content)
 
-    def end_session(self):
+            headers = {"Content-Type": "application/json"}
+            response = await self.http.get(
+                f"{self._session_url()}/events/{event_id}/graph",
+                headers=headers,
+                timeout=self._timeout(timeout),
+            )
+            if response.status_code == 200:
+                await self._shared_state(
+                    self.shared_state.put_cached, "graph", event_id, response.content
+                )
+                return self._cache_graph(event_id, response.content)
+            else:
+                # only a missing value is cached: other errors are retried
+                if response.status_code == 404:
+                    self.graph_cache[event_id] = None
+                raise Exception(f"Error: {response.status_code} - {response.text}")
+
+    async def end_session(self, timeout: Optional[float] = None):
         """End the current chat session"""
+        self.prefetcher.cancel()
         if self.session_id:
             try:
                 headers = {}
-                httpx.delete(
-                    f"{self.base_url}/apps/{self.app_name}/users/{self.user_id}/sessions/{self.session_id}",
+                await self.http.delete(
+                    self._session_url(),
                     headers=headers,
+                    timeout=self._timeout(timeout),
                 )
                 self.session_id = None
             except:
                 pass
 
 
-@lru_cache(maxsize=100)
-def adk_client(session_id: str):
-    client = ADKChatClient(user_session_id=session_id, base_url="http://localhost:8000")
-    client.start_session()
-    return client
+def set_api_server_url(url: str) -> None:
+    """Uses the single ADK API server at `url` for the sessions started from now on."""
+    set_api_server_urls([url])
+
+
+def set_api_server_urls(urls: List[str]) -> None:
+    """Spreads the sessions started from now on over several ADK API servers (see `adk_backends`)."""
+    configure_backends(urls)
+
+
+def _new_client(session_id: str, base_url: Optional[str] = None) -> ADKChatClient:
+    return ADKChatClient(
+        user_session_id=session_id, base_url=base_url or backend_pool().pick()
+    )
+
+
+def _new_async_client(
+    session_id: str, base_url: Optional[str] = None
+) -> AsyncADKChatClient:
+    return AsyncADKChatClient(
+        user_session_id=session_id, base_url=base_url or backend_pool().pick()
+    )
+
+
+client_registry = SessionRegistry(
+    _new_client, validate=is_backend_healthy, bindings=state_store().bindings
+)
+async_client_registry = AsyncSessionRegistry(
+    _new_async_client, validate=is_backend_healthy, bindings=state_store().bindings
+)
+
+
+def set_state_store(url: str) -> None:
+    """Shares the session bindings and cached responses through the store at `url`.
+
+    Sessions bound before the call are forgotten (see `adk_state_store`).
+    """
+    store = configure_state_store(url)
+    client_registry.use_bindings(store.bindings)
+    async_client_registry.use_bindings(store.bindings)
+
+
+def adk_client(session_id: str) -> ADKChatClient:
+    """Returns the started client of a Gradio session (see `SessionRegistry`)."""
+    return client_registry.get(session_id)
+
+
+async def async_adk_client(session_id: str) -> AsyncADKChatClient:
+    """Async counterpart of `adk_client`."""
+    return await async_client_registry.get(session_id)
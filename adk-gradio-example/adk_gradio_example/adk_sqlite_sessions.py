@@ -0,0 +1,598 @@
+"""SQLite session service for the ADK API server embedded in the app.
+
+`get_fast_api_app` keeps the sessions in memory by default, so they are lost on
+restart, and the only way to read new events is to read the whole session. The
+`SQLiteSessionService` stores them in a SQLite database (WAL mode):
+
+- sessions, and the app and user states, in their own tables
+- events in a table indexed by (session, timestamp) and (session, author,
+  timestamp), so "the events after X" or "the events of an author" are range
+  scans instead of a read of the whole session
+- appended events are written in batches: they are queued and written in one
+  transaction every `batch_interval` seconds (or `batch_size` events), and the
+  queue is written before any read, so readers always see them. Events appended
+  within the last `batch_interval` are lost if the process crashes.
+
+`create_adk_api_app` builds the ADK API server with ADK's `get_fast_api_app` and
+makes it use a given session service (ADK 1.1.1's `get_fast_api_app` only builds
+its own: in memory, SQLAlchemy or Vertex AI). It has every route of
+`get_fast_api_app` except the dev UI (as with `web=False`), plus a route
+returning the events after a timestamp:
+
+    GET /apps/{app_name}/users/{user_id}/sessions/{session_id}/events
+        ?after_timestamp=<seconds>&author=<author>
+
+which returns the session like `GET .../sessions/{session_id}`, with only the
+events at or after `after_timestamp` (and of `author`, if given). The graph route
+of an event reads that event alone, by id, instead of the whole session.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import uuid
+
+from fastapi import FastAPI, HTTPException
+from google.adk.cli import agent_graph
+from google.adk.cli.fast_api import GetEventGraphResult, get_fast_api_app
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+from google.adk.sessions.state import State
+import graphviz
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    author TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS events_by_id
+    ON events (app_name, user_id, session_id, id);
+CREATE INDEX IF NOT EXISTS events_by_time
+    ON events (app_name, user_id, session_id, timestamp, seq);
+CREATE INDEX IF NOT EXISTS events_by_author
+    ON events (app_name, user_id, session_id, author, timestamp, seq);
+"""
+
+# (app_name, user_id, session_id)
+_SessionKey = Tuple[str, str, str]
+
+
+def _split_state_delta(
+    delta: Dict[str, Any],
+) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Splits a state delta into its app, user and session parts (temp: keys dropped)."""
+    app, user, session = {}, {}, {}
+    for key, value in delta.items():
+        if key.startswith(State.APP_PREFIX):
+            app[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session[key] = value
+    return app, user, session
+
+
+class SQLiteSessionService(BaseSessionService):
+    """ADK session service storing sessions and events in a SQLite database.
+
+    All database calls run in one thread, in the order they are made.
+    """
+
+    def __init__(self, path: str, batch_interval: float = 0.05, batch_size: int = 64):
+        self.path = path
+        self.batch_interval = batch_interval
+        self.batch_size = batch_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="adk-sessions"
+        )
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[_SessionKey, Event]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: set = set()
+        self._executor.submit(self._connect).result()
+
+    def _connect(self) -> None:
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, fn, *args
+        )
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    # --- writes
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (
+            session_id.strip()
+            if session_id and session_id.strip()
+            else str(uuid.uuid4())
+        )
+        await self.flush()
+        return await self._run(
+            self._create_session, app_name, user_id, session_id, state or {}
+        )
+
+    def _create_session(
+        self, app_name: str, user_id: str, session_id: str, state: Dict[str, Any]
+    ) -> Session:
+        app_delta, user_delta, session_state = _split_state_delta(state)
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO sessions VALUES (?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, json.dumps(session_state), now),
+            )
+            self._update_shared_states(conn, app_name, user_id, app_delta, user_delta)
+        session = Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=session_state,
+            last_update_time=now,
+        )
+        return self._merge_state(session)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        await super().append_event(session=session, event=event)
+        if event.partial:
+            return event
+        session.last_update_time = event.timestamp
+        self._pending.append(((session.app_name, session.user_id, session.id), event))
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.batch_interval, self._flush_later
+            )
+        return event
+
+    def _flush_later(self) -> None:
+        self._flush_handle = None
+        task = asyncio.ensure_future(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self) -> None:
+        """Writes the queued events now."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        await self._run(self._write_events, pending)
+
+    def _write_events(self, pending: List[Tuple[_SessionKey, Event]]) -> None:
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO events "
+                "(app_name, user_id, session_id, id, author, timestamp, event) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        *key,
+                        event.id,
+                        event.author,
+                        event.timestamp,
+                        event.model_dump_json(exclude_none=True, by_alias=True),
+                    )
+                    for key, event in pending
+                ],
+            )
+            for (app_name, user_id, session_id), event in pending:
+                delta = event.actions.state_delta if event.actions else None
+                if delta:
+                    app_delta, user_delta, session_delta = _split_state_delta(delta)
+                    self._update_shared_states(
+                        conn, app_name, user_id, app_delta, user_delta
+                    )
+                    if session_delta:
+                        self._update_state(
+                            conn,
+                            "sessions",
+                            "app_name = ? AND user_id = ? AND id = ?",
+                            (app_name, user_id, session_id),
+                            session_delta,
+                        )
+                conn.execute(
+                    "UPDATE sessions SET update_time = ? "
+                    "WHERE app_name = ? AND user_id = ? AND id = ?",
+                    (event.timestamp, app_name, user_id, session_id),
+                )
+
+    def _update_shared_states(
+        self,
+        conn: sqlite3.Connection,
+        app_name: str,
+        user_id: str,
+        app_delta: Dict[str, Any],
+        user_delta: Dict[str, Any],
+    ) -> None:
+        if app_delta:
+            conn.execute(
+                "INSERT OR IGNORE INTO app_states VALUES (?, '{}')", (app_name,)
+            )
+            self._update_state(
+                conn, "app_states", "app_name = ?", (app_name,), app_delta
+            )
+        if user_delta:
+            conn.execute(
+                "INSERT OR IGNORE INTO user_states VALUES (?, ?, '{}')",
+                (app_name, user_id),
+            )
+            self._update_state(
+                conn,
+                "user_states",
+                "app_name = ? AND user_id = ?",
+                (app_name, user_id),
+                user_delta,
+            )
+
+    @staticmethod
+    def _update_state(
+        conn: sqlite3.Connection,
+        table: str,
+        where: str,
+        key: Tuple,
+        delta: Dict[str, Any],
+    ) -> None:
+        row = conn.execute(f"SELECT state FROM {table} WHERE {where}", key).fetchone()
+        if row is None:
+            return
+        state = json.loads(row[0])
+        state.update(delta)
+        conn.execute(
+            f"UPDATE {table} SET state = ? WHERE {where}", (json.dumps(state), *key)
+        )
+
+    async def delete_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        await self.flush()
+        await self._run(self._delete_session, app_name, user_id, session_id)
+
+    def _delete_session(self, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        with self._transaction() as conn:
+            conn.execute(
+                "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                key,
+            )
+            conn.execute(
+                "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                key,
+            )
+
+    # --- reads
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        await self.flush()
+        return await self._run(
+            self._get_session,
+            app_name,
+            user_id,
+            session_id,
+            config.after_timestamp if config else None,
+            config.num_recent_events if config else None,
+            None,
+        )
+
+    async def get_events_after(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after_timestamp: Optional[float] = None,
+        author: Optional[str] = None,
+    ) -> Optional[Session]:
+        """Returns the session with its events at or after `after_timestamp` (of `author`)."""
+        await self.flush()
+        return await self._run(
+            self._get_session,
+            app_name,
+            user_id,
+            session_id,
+            after_timestamp,
+            None,
+            author,
+        )
+
+    async def get_event(
+        self, *, app_name: str, user_id: str, session_id: str, event_id: str
+    ) -> Optional[Event]:
+        """Returns the event `event_id` of the session, read through its index."""
+        await self.flush()
+        return await self._run(self._get_event, app_name, user_id, session_id, event_id)
+
+    def _get_event(
+        self, app_name: str, user_id: str, session_id: str, event_id: str
+    ) -> Optional[Event]:
+        row = self._conn.execute(
+            "SELECT event FROM events "
+            "WHERE app_name = ? AND user_id = ? AND session_id = ? AND id = ?",
+            (app_name, user_id, session_id, event_id),
+        ).fetchone()
+        return Event.model_validate_json(row[0]) if row else None
+
+    def _get_session(
+        self,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after_timestamp: Optional[float],
+        num_recent_events: Optional[int],
+        author: Optional[str],
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        row = self._conn.execute(
+            "SELECT state, update_time FROM sessions "
+            "WHERE app_name = ? AND user_id = ? AND id = ?",
+            key,
+        ).fetchone()
+        if row is None:
+            return None
+
+        where = "app_name = ? AND user_id = ? AND session_id = ?"
+        params: List[Any] = list(key)
+        if author is not None:
+            where += " AND author = ?"
+            params.append(author)
+        if after_timestamp is not None:
+            where += " AND timestamp >= ?"
+            params.append(after_timestamp)
+        if num_recent_events:
+            query = (
+                f"SELECT event FROM (SELECT event, timestamp, seq FROM events "
+                f"WHERE {where} ORDER BY timestamp DESC, seq DESC LIMIT ?) "
+                f"ORDER BY timestamp, seq"
+            )
+            params.append(num_recent_events)
+        else:
+            query = f"SELECT event FROM events WHERE {where} ORDER BY timestamp, seq"
+        events = [
+            Event.model_validate_json(data)
+            for (data,) in self._conn.execute(query, params)
+        ]
+        session = Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=json.loads(row[0]),
+            events=events,
+            last_update_time=row[1],
+        )
+        return self._merge_state(session)
+
+    def _merge_state(self, session: Session) -> Session:
+        row = self._conn.execute(
+            "SELECT state FROM app_states WHERE app_name = ?", (session.app_name,)
+        ).fetchone()
+        if row:
+            for key, value in json.loads(row[0]).items():
+                session.state[State.APP_PREFIX + key] = value
+        row = self._conn.execute(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?",
+            (session.app_name, session.user_id),
+        ).fetchone()
+        if row:
+            for key, value in json.loads(row[0]).items():
+                session.state[State.USER_PREFIX + key] = value
+        return session
+
+    async def list_sessions(
+        self, *, app_name: str, user_id: str
+    ) -> ListSessionsResponse:
+        await self.flush()
+        return await self._run(self._list_sessions, app_name, user_id)
+
+    def _list_sessions(self, app_name: str, user_id: str) -> ListSessionsResponse:
+        rows = self._conn.execute(
+            "SELECT id, update_time FROM sessions WHERE app_name = ? AND user_id = ?",
+            (app_name, user_id),
+        ).fetchall()
+        return ListSessionsResponse(
+            sessions=[
+                Session(
+                    app_name=app_name,
+                    user_id=user_id,
+                    id=session_id,
+                    state={},
+                    last_update_time=update_time,
+                )
+                for session_id, update_time in rows
+            ]
+        )
+
+    def close(self) -> None:
+        """Writes the queued events and closes the database."""
+
+        def close():
+            if self._pending:
+                pending, self._pending = self._pending, []
+                self._write_events(pending)
+            self._conn.close()
+
+        self._executor.submit(close).result()
+        self._executor.shutdown()
+
+
+def add_events_route(app: FastAPI, session_service: BaseSessionService) -> None:
+    """Adds the `GET .../sessions/{session_id}/events` route (see the module docstring)."""
+
+    @app.get(
+        "/apps/{app_name}/users/{user_id}/sessions/{session_id}/events",
+        response_model_exclude_none=True,
+    )
+    async def get_events_after(
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after_timestamp: Optional[float] = None,
+        author: Optional[str] = None,
+    ) -> Session:
+        if isinstance(session_service, SQLiteSessionService):
+            session = await session_service.get_events_after(
+                app_name=app_name,
+                user_id=user_id,
+                session_id=session_id,
+                after_timestamp=after_timestamp,
+                author=author,
+            )
+        else:
+            session = await session_service.get_session(
+                app_name=app_name,
+                user_id=user_id,
+                session_id=session_id,
+                config=GetSessionConfig(after_timestamp=after_timestamp),
+            )
+            if session is not None and author is not None:
+                session.events = [e for e in session.events if e.author == author]
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return session
+
+
+_GRAPH_ROUTE = (
+    "/apps/{app_name}/users/{user_id}/sessions/{session_id}/events/{event_id}/graph"
+)
+
+
+def _closure_cell(app: FastAPI, name: str):
+    """The cell of the local variable `name` of `get_fast_api_app`, shared by its routes."""
+    for route in app.routes:
+        endpoint = getattr(route, "endpoint", None)
+        code = getattr(endpoint, "__code__", None)
+        if code is not None and name in code.co_freevars:
+            return endpoint.__closure__[code.co_freevars.index(name)]
+    raise RuntimeError(
+        f"get_fast_api_app has no {name!r}: unsupported google-adk version"
+    )
+
+
+def create_adk_api_app(
+    session_service: BaseSessionService,
+    agents_dir: str,
+    allow_origins: Optional[List[str]] = None,
+) -> FastAPI:
+    """The ADK API server of the agents in `agents_dir`, keeping its sessions in `session_service`.
+
+    The app is built by ADK's `get_fast_api_app` (without the dev UI), whose
+    routes and runners all read the session service from one local variable:
+    it is set to `session_service` (ADK 1.1.1 has no parameter for it). The
+    event graph route is replaced by one reading the event alone from a
+    `SQLiteSessionService`, and the events route is added (see the module
+    docstring).
+    """
+    app = get_fast_api_app(
+        agents_dir=agents_dir, allow_origins=allow_origins, web=False
+    )
+    _closure_cell(app, "session_service").cell_contents = session_service
+    agent_loader = _closure_cell(app, "agent_loader").cell_contents
+
+    add_events_route(app, session_service)
+
+    app.router.routes = [
+        route
+        for route in app.router.routes
+        if getattr(route, "path", None) != _GRAPH_ROUTE
+    ]
+
+    @app.get(_GRAPH_ROUTE, response_model_exclude_none=True)
+    async def get_event_graph(
+        app_name: str, user_id: str, session_id: str, event_id: str
+    ):
+        if isinstance(session_service, SQLiteSessionService):
+            # one row of the events_by_id index, not the whole session
+            event = await session_service.get_event(
+                app_name=app_name,
+                user_id=user_id,
+                session_id=session_id,
+                event_id=event_id,
+            )
+        else:
+            session = await session_service.get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+            events = session.events if session else []
+            event = next((e for e in events if e.id == event_id), None)
+        if not event:
+            return {}
+        calls = event.get_function_calls()
+        responses = event.get_function_responses()
+        if calls:
+            highlights = [(event.author, c.name) for c in calls]
+        elif responses:
+            highlights = [(r.name, event.author) for r in responses]
+        else:
+            highlights = [(event.author, "")]
+        dot_graph = await agent_graph.get_agent_graph(
+            agent_loader.load_agent(app_name), highlights
+        )
+        if isinstance(dot_graph, graphviz.Digraph):
+            return GetEventGraphResult(dot_src=dot_graph.source)
+        return {}
+
+    return app
@@ -0,0 +1,364 @@
+"""Client state shared by the worker processes of the app.
+
+The session registries and the trace and graph cache live in the memory of each
+process. When the app runs several workers, a state store shares across them:
+
+- the session bindings of the registries (Gradio session -> ADK session id, ADK
+  API server URL, last use), so a Gradio session served by another worker
+  continues the same conversation instead of starting a new one
+- a second-level cache of the trace and graph responses, looked up before
+  calling the ADK API server when the process cache (`adk_cache`) misses
+
+Two stores are available, selected with a URL:
+
+- "memory" (default): the bindings stay in this process, and there is no
+  second-level cache
+- "sqlite:///path/to/state.db": a SQLite database in WAL mode, shared by every
+  process on the host; its cache is bounded by ADK_STATE_CACHE_MAX_BYTES (default
+  256 MiB of compressed responses, least recently used first out)
+
+The store is set with the ADK_STATE_STORE environment variable (read when it is
+first used) or with `configure_state_store`.
+"""
+
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import zlib
+
+DEFAULT_STATE_STORE = os.environ.get("ADK_STATE_STORE", "memory")
+DEFAULT_CACHE_MAX_BYTES = int(
+    os.environ.get("ADK_STATE_CACHE_MAX_BYTES", str(256 * 1024 * 1024))
+)
+
+
+class Binding(NamedTuple):
+    session_id: str
+    base_url: str
+    # wall-clock time, comparable across processes
+    last_used: float
+
+
+class BindingStore:
+    """Session bindings of the registries, keyed by Gradio `session_hash`."""
+
+    # whether the methods do I/O (the async registry calls them in a thread)
+    blocking = False
+
+    def get(self, key: str) -> Optional[Binding]:
+        raise NotImplementedError
+
+    def set(self, key: str, binding: Binding) -> None:
+        raise NotImplementedError
+
+    def pop(self, key: str) -> Optional[Binding]:
+        raise NotImplementedError
+
+    def pop_expired(self, deadline: float) -> List[Tuple[str, Binding]]:
+        """Removes and returns the bindings last used at or before `deadline`.
+
+        A binding is returned to a single caller, even across processes, so each
+        expired session is ended once.
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryBindingStore(BindingStore):
+    """Bindings of this process, ordered from least to most recently used."""
+
+    def __init__(self):
+        self._bindings: "OrderedDict[str, Binding]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Binding]:
+        return self._bindings.get(key)
+
+    def set(self, key: str, binding: Binding) -> None:
+        with self._lock:
+            self._bindings[key] = binding
+            self._bindings.move_to_end(key)
+
+    def pop(self, key: str) -> Optional[Binding]:
+        with self._lock:
+            return self._bindings.pop(key, None)
+
+    def pop_expired(self, deadline: float) -> List[Tuple[str, Binding]]:
+        expired = []
+        with self._lock:
+            while self._bindings:
+                key, binding = next(iter(self._bindings.items()))
+                if binding.last_used > deadline:
+                    break
+                del self._bindings[key]
+                expired.append((key, binding))
+        return expired
+
+    def __len__(self) -> int:
+        return len(self._bindings)
+
+
+@dataclass
+class StateStoreStats:
+    url: str
+    bindings: int
+    cache_bytes: Optional[int] = None
+    cache_entries: Optional[int] = None
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class StateStore:
+    """The "memory" store: bindings of this process only, no second-level cache."""
+
+    url = "memory"
+    # whether the cache methods do I/O (the async client calls them in a thread)
+    blocking = False
+
+    def __init__(self):
+        self.bindings: BindingStore = MemoryBindingStore()
+
+    def get_cached(self, namespace: str, key: str) -> Optional[bytes]:
+        """Returns the response stored under `(namespace, key)`, if any."""
+        return None
+
+    def put_cached(self, namespace: str, key: str, content: bytes) -> None:
+        pass
+
+    def stats(self) -> StateStoreStats:
+        return StateStoreStats(url=self.url, bindings=len(self.bindings))
+
+    def close(self) -> None:
+        pass
+
+
+class _SQLiteConnections:
+    """One connection per thread to the database at `path`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit: every statement is its own transaction
+            conn = sqlite3.connect(
+                self.path, isolation_level=None, check_same_thread=False, timeout=30
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
+
+
+class SQLiteBindingStore(BindingStore):
+    blocking = True
+
+    def __init__(self, connections: _SQLiteConnections):
+        self._connections = connections
+
+    def get(self, key: str) -> Optional[Binding]:
+        row = (
+            self._connections.get()
+            .execute(
+                "SELECT session_id, base_url, last_used FROM bindings WHERE key = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+        return Binding(*row) if row else None
+
+    def set(self, key: str, binding: Binding) -> None:
+        self._connections.get().execute(
+            "INSERT OR REPLACE INTO bindings VALUES (?, ?, ?, ?)", (key, *binding)
+        )
+
+    def pop(self, key: str) -> Optional[Binding]:
+        row = (
+            self._connections.get()
+            .execute(
+                "DELETE FROM bindings WHERE key = ? "
+                "RETURNING session_id, base_url, last_used",
+                (key,),
+            )
+            .fetchone()
+        )
+        return Binding(*row) if row else None
+
+    def pop_expired(self, deadline: float) -> List[Tuple[str, Binding]]:
+        rows = (
+            self._connections.get()
+            .execute(
+                "DELETE FROM bindings WHERE last_used <= ? "
+                "RETURNING key, session_id, base_url, last_used",
+                (deadline,),
+            )
+            .fetchall()
+        )
+        return [(key, Binding(*binding)) for key, *binding in rows]
+
+    def __len__(self) -> int:
+        conn = self._connections.get()
+        return conn.execute("SELECT COUNT(*) FROM bindings").fetchone()[0]
+
+
+class SQLiteStateStore(StateStore):
+    """Bindings and zlib-compressed responses in a SQLite database shared by processes."""
+
+    # evict from the cache every so many writes (the size is a table scan)
+    EVICT_EVERY = 32
+    # a read moves an entry to the recent end at most this often (it is a write)
+    TOUCH_INTERVAL = 60.0
+    blocking = True
+
+    def __init__(self, path: str, cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.url = f"sqlite:///{path}"
+        self.cache_max_bytes = cache_max_bytes
+        self._connections = _SQLiteConnections(path)
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        conn = self._connections.get()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bindings (
+                key TEXT PRIMARY KEY,
+                session_id TEXT NOT NULL,
+                base_url TEXT NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS bindings_last_used ON bindings (last_used);
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                content BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used);
+            """
+        )
+        self.bindings = SQLiteBindingStore(self._connections)
+
+    def get_cached(self, namespace: str, key: str) -> Optional[bytes]:
+        conn = self._connections.get()
+        row = conn.execute(
+            "SELECT content, last_used FROM cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        if row[1] < now - self.TOUCH_INTERVAL:
+            conn.execute(
+                "UPDATE cache SET last_used = ? WHERE namespace = ? AND key = ?",
+                (now, namespace, key),
+            )
+        return zlib.decompress(row[0])
+
+    def put_cached(self, namespace: str, key: str, content: bytes) -> None:
+        compressed = zlib.compress(content, 1)
+        if len(compressed) > self.cache_max_bytes:
+            return
+        conn = self._connections.get()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, compressed, len(compressed), time.time()),
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict_over_budget(conn)
+
+    def _evict_over_budget(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.cache_max_bytes:
+            return
+        # drop the least recently used entries, down to 90% of the budget
+        excess = total - int(self.cache_max_bytes * 0.9)
+        conn.execute(
+            """
+            DELETE FROM cache WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(size) OVER (ORDER BY last_used, rowid) - size
+                        AS freed_before
+                    FROM cache
+                ) WHERE freed_before < ?
+            )
+            """,
+            (excess,),
+        )
+
+    def stats(self) -> StateStoreStats:
+        size, entries = (
+            self._connections.get()
+            .execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM cache")
+            .fetchone()
+        )
+        return StateStoreStats(
+            url=self.url,
+            bindings=len(self.bindings),
+            cache_bytes=size,
+            cache_entries=entries,
+            cache_hits=self.hits,
+            cache_misses=self.misses,
+        )
+
+    def close(self) -> None:
+        self._connections.close()
+
+
+def open_state_store(url: str) -> StateStore:
+    """Returns the store for `url`: "memory" or "sqlite:///path/to/state.db"."""
+    if url == "memory":
+        return StateStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteStateStore(url[len("sqlite:///") :])
+    raise ValueError(f"Unknown state store: {url!r} (use memory or sqlite:///path)")
+
+
+_store: Optional[StateStore] = None
+_store_lock = threading.Lock()
+
+
+def state_store() -> StateStore:
+    """Returns the process-wide store, opened from ADK_STATE_STORE on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = open_state_store(DEFAULT_STATE_STORE)
+    return _store
+
+
+def configure_state_store(url: str) -> StateStore:
+    """Replaces the process-wide store."""
+    global _store
+    store = open_state_store(url)
+    with _store_lock:
+        previous, _store = _store, store
+    if previous is not None:
+        previous.close()
+    return store
@@ -0,0 +1,144 @@
+"""Content-addressed storage of the parts repeated across traces and graphs.
+
+Every LLM request of a session embeds the whole conversation so far, so keeping
+each trace as is stores the first messages of a session once per turn; and the
+graphs of the events of an agent are the same few graphs, differing by the
+highlighted node. The `TraceStore` replaces the contents and config of each
+request, and each graph, with references to values stored once (see
+`gradio_agent_inspector.interning`), and counts the references held by the traces
+and graphs in the cache: a value is dropped when the last cached trace or graph
+referencing it leaves the cache (evicted, replaced or deleted). The interned values
+are charged to the budget of the cache, with the entries referencing them.
+
+The inspector receives the referenced values once per browser session, through the
+`resolve` argument of `InspectorSession.update` / `upsert_events`.
+"""
+
+from dataclasses import asdict, dataclass
+import threading
+from typing import Any, Dict, Hashable, List, Optional
+
+from gradio_agent_inspector import intern_graph, intern_request
+from gradio_agent_inspector.interning import (
+    LLM_REQUEST_KEY,
+    REF_KEY,
+    is_ref,
+    request_refs,
+)
+
+from adk_gradio_example.adk_cache import ByteLRUCache, json_size, shared_cache
+
+
+@dataclass
+class TraceStoreStats:
+    values: int
+    bytes: int
+    references: int
+    # bytes the referencing requests would take with the values inlined
+    referenced_bytes: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class TraceStore:
+    """Interned values of the traces and graphs stored in `cache` (namespaces
+    "trace" and "graph").
+
+    Use one store per cache: its removal listener releases the references of the
+    traces and graphs leaving the cache.
+    """
+
+    def __init__(self, cache: ByteLRUCache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        # hash -> [value, size, reference count]
+        self._values: Dict[str, List] = {}
+        cache.add_removal_listener(self._on_remove)
+
+    # the cache is charged outside of `_lock`: charging may evict entries, whose
+    # references are then released by `_on_remove`
+
+    def _add(self, h: str, value: Any) -> None:
+        size = 0
+        with self._lock:
+            entry = self._values.get(h)
+            if entry is None:
+                size = json_size(value)
+                self._values[h] = [value, size, 1]
+            else:
+                entry[2] += 1
+        if size:
+            self.cache.charge(size)
+
+    def _release(self, hashes) -> None:
+        freed = 0
+        with self._lock:
+            for h in hashes:
+                entry = self._values.get(h)
+                if entry is None:
+                    continue
+                entry[2] -= 1
+                if entry[2] <= 0:
+                    freed += entry[1]
+                    del self._values[h]
+        if freed:
+            self.cache.charge(-freed)
+
+    def intern(self, trace: Dict) -> Dict:
+        """Returns `trace` with the contents and config of its LLM request interned."""
+        llm_request = trace.get(LLM_REQUEST_KEY)
+        if not isinstance(llm_request, dict):
+            return trace
+        return {**trace, LLM_REQUEST_KEY: intern_request(llm_request, self._add)}
+
+    def intern_graph(self, graph: Any) -> Any:
+        """Returns a reference to `graph`, stored once whatever the event."""
+        if not isinstance(graph, dict):
+            return graph
+        return intern_graph(graph, self._add)
+
+    def release(self, trace: Optional[Dict]) -> None:
+        """Releases the references held by an interned trace."""
+        if not trace:
+            return
+        self._release(request_refs(trace.get(LLM_REQUEST_KEY)))
+
+    def release_graph(self, graph: Any) -> None:
+        """Releases the reference of an interned graph."""
+        if is_ref(graph):
+            self._release([graph[REF_KEY]])
+
+    def lookup(self, h: str) -> Any:
+        entry = self._values.get(h)
+        return entry[0] if entry is not None else None
+
+    def _on_remove(self, key: Hashable, value: Any) -> None:
+        if isinstance(key, tuple) and key[0] == "trace":
+            self.release(value)
+        elif isinstance(key, tuple) and key[0] == "graph":
+            self.release_graph(value)
+
+    def stats(self) -> TraceStoreStats:
+        with self._lock:
+            entries = list(self._values.values())
+        return TraceStoreStats(
+            values=len(entries),
+            bytes=sum(size for _, size, _ in entries),
+            references=sum(refs for _, _, refs in entries),
+            referenced_bytes=sum(size * refs for _, size, refs in entries),
+        )
+
+
+_store: Optional[TraceStore] = None
+_store_lock = threading.Lock()
+
+
+def shared_trace_store() -> TraceStore:
+    """Returns the store of the process-wide cache from `adk_cache`."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TraceStore(shared_cache())
+    return _store
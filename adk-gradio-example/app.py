@@ -1,15 +1,46 @@
-import json
 from pathlib import Path
-from typing import Iterator, List, Tuple
+from typing import AsyncIterator, List, Tuple
 import uuid
 import gradio as gr
-from gradio_agent_inspector import AgentInspector
+from gradio_agent_inspector import AgentInspector, InspectorPatch, InspectorSession
 import os
 from google.adk.cli.fast_api import get_fast_api_app
+from fastapi import FastAPI
 import uvicorn
 import argparse
-
-from adk_gradio_example.adk_simple_client import adk_client
+import multiprocessing
+import sys
+
+from adk_gradio_example.adk_simple_client import (
+    async_adk_client,
+    async_client_registry,
+    client_registry,
+    recent_turn_timings,
+    set_api_server_url,
+    set_api_server_urls,
+    set_state_store,
+)
+from adk_gradio_example.adk_state_store import state_store
+from adk_gradio_example.adk_backends import backend_stats
+from adk_gradio_example.adk_http_pool import (
+    async_pool_stats,
+    pool_stats,
+    use_in_process_app,
+)
+from adk_gradio_example.adk_cache import cache_stats
+from adk_gradio_example.adk_trace_store import shared_trace_store
+from adk_gradio_example.adk_sqlite_sessions import (
+    SQLiteSessionService,
+    create_adk_api_app,
+)
+from adk_gradio_example.adk_enrichment import enrich_session, recent_rounds
+from adk_gradio_example.adk_chat_turn import (
+    append_error,
+    append_stream_event,
+    patch_with_new_events,
+    selected_event_to_enrich,
+    stream_event_patch,
+)
 import google.adk.cli.utils.envs as adk_envs
 from google.adk.cli.utils.envs import _walk_to_root_until_found
 
@@ -43,82 +74,154 @@ def new_load_dotenv_for_agent(
 adk_envs.load_dotenv_for_agent = new_load_dotenv_for_agent
 
 
-def update_events_adk_inspector(request: gr.Request):
-    session_id = request.session_hash if request else str(uuid.uuid4())
-    res = adk_client(session_id).get_events()
-    return json.dumps(res, indent=2)
+# The inspector is sent the events of the session without their traces and
+# graphs: those of an event are fetched when it is opened in the inspector (its
+# select event), and sent as a patch of that event. Each Gradio session keeps, in
+# a gr.State, an InspectorSession mirroring what its AgentInspector displays, so
+# only the operations turning the displayed session into the new one are sent.
+# The LLM requests of the traces reference values shared across turns (see
+# adk_trace_store), which each InspectorSession sends to its browser only once.
 
 
-def update_trace_and_graph_adk_inspector(request: gr.Request):
-    session_id = request.session_hash if request else str(uuid.uuid4())
-    res = adk_client(session_id).get_events()
-    if "events" in res:
-        for e in res["events"]:
-            try:
-                trace = adk_client(session_id).get_trace(e["id"])
-                if trace:
-                    e["trace"] = trace
-
-                graph = adk_client(session_id).get_graph(e["id"])
-                if graph:
-                    e["graph"] = graph
-            except Exception as e:
-                print(e)
-    return json.dumps(res, indent=2)
-
-
-def chat_with_adk_agent(
-    user_message: str, history: List[Tuple[str, str]], request: gr.Request
-) -> Iterator[List]:
-    """Handle chat interaction with the ADK agent"""
-    if not user_message.strip():
-        yield history
-
+async def _new_events_patch_async(
+    client, history: list, inspector: InspectorSession
+) -> InspectorPatch:
+    try:
+        res = await client.get_new_events()
+    except Exception as e:
+        logger.exception("Could not fetch the events of session %s", client.session_id)
+        append_error(history, f"Could not update the inspector: {e}")
+        return gr.skip()
+    if not isinstance(res, dict):
+        logger.error("Could not fetch the events: %s", res)
+        append_error(history, res)
+        return inspector.reset()
+    return patch_with_new_events(inspector, res)
+
+
+async def load_event_details_async(
+    inspector: InspectorSession, evt: gr.SelectData, request: gr.Request
+):
+    """Adds the trace and graph of the event opened in the inspector"""
+    res = selected_event_to_enrich(inspector, evt.value)
+    if res is None:
+        return gr.skip(), inspector
     session_id = request.session_hash if request else str(uuid.uuid4())
-    if not adk_client(session_id).session_id:
-        history.append(
-            gr.ChatMessage(
-                role="assistant",
-                content=f"Please setup the agent connection first using the Setup tab.",
+    client = await async_adk_client(session_id)
+    await enrich_session(client, res)
+    patch = inspector.upsert_events(res["events"], resolve=client.trace_store.lookup)
+    return patch, inspector
+
+
+async def _stream_agent_response_async(
+    client, user_message: str, history: list, inspector: InspectorSession
+) -> AsyncIterator[Tuple]:
+    if not user_message.strip() or not client.session_id:
+        if user_message.strip():
+            history.append(
+                gr.ChatMessage(
+                    role="assistant",
+                    content="Please setup the agent connection first using the Setup tab.",
+                )
             )
-        )
-        yield history
+        yield history, gr.skip(), inspector
+        return
 
-    # Get response from ADK agent
+    streamed = None
     try:
-        response = adk_client(session_id).send_message(user_message)
-
-        # Update history
-        for r in response:
-            parts_0 = r.get("content").get("parts")[0]
-            if "text" in parts_0:
-                assistant_chat_response = gr.ChatMessage(
-                    role="assistant", content=parts_0["text"], metadata={}
-                )
-                history.append(assistant_chat_response)
-            elif "functionCall" in parts_0:
-                assistant_chat_response = gr.ChatMessage(
-                    role="assistant",
-                    content=parts_0["functionCall"]["name"],
-                    metadata={"title": "Function calls"},
-                )
-                history.append(assistant_chat_response)
+        async for event in client.stream_message(user_message):
+            streamed = append_stream_event(history, event, streamed)
+            patch = stream_event_patch(inspector, event, client.session_id)
+            yield history, patch, inspector
     except Exception as e:
-        print(e)
-    finally:
-        yield history
+        logger.exception("Streamed turn of session %s failed", client.session_id)
+        append_error(history, f"The agent could not answer: {e}")
+        yield history, gr.skip(), inspector
+
+
+async def chat_turn_async(
+    user_message: str,
+    history: List[Tuple[str, str]],
+    inspector: InspectorSession,
+    request: gr.Request,
+) -> AsyncIterator[Tuple]:
+    """Runs a whole chat turn as one event: user message, agent response, inspector
+
+    The traces and graphs of the events are not fetched: `load_event_details_async`
+    adds them to the events opened in the inspector.
+    """
+    session_id = request.session_hash if request else str(uuid.uuid4())
+    client = await async_adk_client(session_id)
+    if user_message.strip():
+        history.append(gr.ChatMessage(role="user", content=user_message))
+    # clears the input and shows the user message before the agent answers
+    yield "", history, gr.skip(), inspector
+
+    async for history, patch, inspector in _stream_agent_response_async(
+        client, user_message, history, inspector
+    ):
+        yield gr.skip(), history, patch, inspector
+    if not user_message.strip() or not client.session_id:
+        return
+    patch = await _new_events_patch_async(client, history, inspector)
+    yield gr.skip(), history, patch, inspector
+
+
+async def update_api_keys_async(google_api_key: str, request: gr.Request):
+    if len(google_api_key) > 0:
+        session_id = request.session_hash if request else str(uuid.uuid4())
+        # kept by the registry for the clients later created for this session
+        await async_adk_client(session_id)
+        async_client_registry.set_api_key(session_id, google_api_key)
 
 
-def append_user_message(msg: str, history: list) -> tuple[str, list]:
-    """Adds user message to chat history"""
-    history.append(gr.ChatMessage(role="user", content=msg))
-    return "", history
+def get_pool_stats() -> dict:
+    stats = {"sync": pool_stats(), "async": async_pool_stats()}
+    return {k: v.to_dict() for k, v in stats.items() if v}
 
 
-def update_api_keys(google_api_key: str, request: gr.Request):
-    if len(google_api_key) > 0:
-        session_id = request.session_hash if request else str(uuid.uuid4())
-        adk_client(session_id).set_custom_api_key(google_api_key)
+def get_backend_stats() -> list:
+    return [b.to_dict() for b in backend_stats()]
+
+
+def get_session_stats() -> dict:
+    return {
+        "sync": client_registry.stats().to_dict(),
+        "async": async_client_registry.stats().to_dict(),
+    }
+
+
+def get_cache_stats() -> dict:
+    return {
+        "cache": cache_stats().to_dict(),
+        "trace_store": shared_trace_store().stats().to_dict(),
+        "state_store": state_store().stats().to_dict(),
+    }
+
+
+def get_latency_stats() -> dict:
+    return {
+        "turns": [t.to_dict() for t in recent_turn_timings()],
+        "enrichment_rounds": [r.to_dict() for r in recent_rounds()],
+    }
+
+
+def release_evicted_client(session_hash: str, client) -> None:
+    """Stops the background fetches of a client evicted from the registry.
+
+    Its ADK session is kept: the next turn of the tab rebinds a new client to it.
+    """
+    client.prefetcher.cancel()
+    logger.info("ADK client of Gradio session %s evicted", session_hash)
+
+
+async_client_registry.on_evict = release_evicted_client
+
+
+async def end_adk_session(request: gr.Request):
+    """Deletes the ADK session of a closed browser tab."""
+    if request and request.session_hash:
+        await async_client_registry.discard(request.session_hash)
 
 
 with gr.Blocks(title="Gradio Agent Inspector + ADK") as demo:
@@ -153,27 +256,18 @@ Github repo :
             with gr.Column(scale=2):
                 agent_inspector = AgentInspector()
 
-            msg_store = gr.State("")
+            inspector_session = gr.State(InspectorSession())
+            # one event per turn: user message, streamed response, inspector refresh
             msg_input.submit(
-                lambda msg: (msg, msg, ""),  # Store message and clear input
-                inputs=[msg_input],
-                outputs=[msg_store, msg_input, msg_input],
-            ).then(
-                append_user_message,
-                inputs=[msg_store, chatbot],
-                outputs=[msg_input, chatbot],
-            ).then(
-                chat_with_adk_agent,  # Generate and stream response
-                inputs=[msg_store, chatbot],
-                outputs=chatbot,
-            ).then(
-                update_events_adk_inspector,
-                inputs=[],
-                outputs=agent_inspector,
-            ).then(
-                update_trace_and_graph_adk_inspector,
-                inputs=[],
-                outputs=agent_inspector,
+                chat_turn_async,
+                inputs=[msg_input, chatbot, inspector_session],
+                outputs=[msg_input, chatbot, agent_inspector, inspector_session],
+            )
+            # trace and graph of the event opened in the inspector
+            agent_inspector.select(
+                load_event_details_async,
+                inputs=[inspector_session],
+                outputs=[agent_inspector, inspector_session],
             )
     with gr.Tab("🔧 Configuration & Setup"):
         gr.Markdown("## 🔑 API Keys Configuration")
@@ -186,7 +280,78 @@ Github repo :
             )
         with gr.Row():
             save_keys_btn = gr.Button("💾 Save API Keys", variant="secondary")
-        save_keys_btn.click(update_api_keys, inputs=[api_key_input], outputs=[])
+        save_keys_btn.click(
+            update_api_keys_async, inputs=[api_key_input], outputs=[]
+        )
+
+        gr.Markdown("## 📊 ADK API server connection pool")
+        pool_stats_json = gr.JSON(value={})
+        refresh_pool_stats_btn = gr.Button("🔄 Refresh", variant="secondary")
+        refresh_pool_stats_btn.click(get_pool_stats, outputs=[pool_stats_json])
+
+        gr.Markdown("## 🖥️ ADK API servers")
+        backend_stats_json = gr.JSON(value=[])
+        refresh_backend_stats_btn = gr.Button("🔄 Refresh", variant="secondary")
+        refresh_backend_stats_btn.click(
+            get_backend_stats, outputs=[backend_stats_json]
+        )
+
+        gr.Markdown("## 👥 Chat sessions")
+        session_stats_json = gr.JSON(value={})
+        refresh_session_stats_btn = gr.Button("🔄 Refresh", variant="secondary")
+        refresh_session_stats_btn.click(
+            get_session_stats, outputs=[session_stats_json]
+        )
+
+        gr.Markdown("## 🗃️ Trace and graph cache")
+        cache_stats_json = gr.JSON(value={})
+        refresh_cache_stats_btn = gr.Button("🔄 Refresh", variant="secondary")
+        refresh_cache_stats_btn.click(get_cache_stats, outputs=[cache_stats_json])
+
+        gr.Markdown("## ⏱️ Latencies")
+        latency_stats_json = gr.JSON(value={})
+        refresh_latency_stats_btn = gr.Button("🔄 Refresh", variant="secondary")
+        refresh_latency_stats_btn.click(
+            get_latency_stats, outputs=[latency_stats_json]
+        )
+
+    demo.unload(end_adk_session)
+
+
+def create_app() -> FastAPI:
+    """App of one worker process (see `--workers`), configured by the environment.
+
+    `main()` sets ADK_STATE_STORE and ADK_API_SERVERS before starting the workers.
+    """
+    return gr.mount_gradio_app(FastAPI(), demo, path="/")
+
+
+def serve_workers(workers: int, port: int) -> None:
+    """Runs `workers` processes serving the app, on `port`, `port + 1`, ...
+
+    Each worker has its own port: Gradio's queue and `gr.State` live in the
+    process serving the page, so a browser tab must stay on one worker (see the
+    sticky proxy in the README).
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=uvicorn.run,
+            args=("app:create_app",),
+            kwargs={"factory": True, "host": "0.0.0.0", "port": port + i},
+            name=f"app-worker-{i}",
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
 
 
 def main():
@@ -195,10 +360,69 @@ def main():
         "--external-adk-api-server", default=True, action=argparse.BooleanOptionalAction
     )
     parser.add_argument("--adk-api-server-port", default=8000, type=int)
+    parser.add_argument(
+        "--adk-api-servers",
+        default=None,
+        help="with --external-adk-api-server, comma-separated URLs of the ADK API "
+        "servers to spread the sessions over (default: ADK_API_SERVERS)",
+    )
+    parser.add_argument(
+        "--session-db",
+        default=os.environ.get("ADK_SESSION_DB", "adk_sessions.db"),
+        help="with --no-external-adk-api-server, SQLite database of the ADK "
+        "sessions (kept across restarts), or memory",
+    )
+    parser.add_argument(
+        "--state-store",
+        default=os.environ.get("ADK_STATE_STORE", "memory"),
+        help="where the session bindings and cached traces and graphs are kept: "
+        "memory, or sqlite:///path/to/state.db to share them across processes",
+    )
+    parser.add_argument(
+        "--workers",
+        default=1,
+        type=int,
+        help="with --external-adk-api-server, number of worker processes serving "
+        "the app; needs a shared --state-store",
+    )
+    parser.add_argument(
+        "--port",
+        default=int(os.environ.get("GRADIO_SERVER_PORT", "7860")),
+        type=int,
+        help="with --workers, port of the first worker (the others get the next ones)",
+    )
+    parser.add_argument(
+        "--in-process-adk-api",
+        default=True,
+        action=argparse.BooleanOptionalAction,
+        help="with --no-external-adk-api-server, call the embedded ADK API server "
+        "in-process instead of over loopback HTTP (async handlers only)",
+    )
     args = parser.parse_args()
+    if args.workers > 1 and not args.external_adk_api_server:
+        parser.error(
+            "--workers needs --external-adk-api-server: the sessions of the "
+            "embedded ADK API server are not shared by the worker processes"
+        )
+    if args.workers > 1 and args.state_store == "memory":
+        parser.error("--workers needs a shared --state-store (sqlite:///...)")
 
-    print(f"{args.external_adk_api_server=} {args.adk_api_server_port=}")
+    print(
+        f"{args.external_adk_api_server=} {args.adk_api_server_port=} "
+        f"{args.in_process_adk_api=} {args.state_store=} {args.workers=}"
+    )
+    if args.external_adk_api_server and args.workers > 1:
+        # read by each worker when it imports this module
+        os.environ["ADK_STATE_STORE"] = args.state_store
+        if args.adk_api_servers:
+            os.environ["ADK_API_SERVERS"] = args.adk_api_servers
+        serve_workers(args.workers, args.port)
+        return
+
+    set_state_store(args.state_store)
     if args.external_adk_api_server:
+        if args.adk_api_servers:
+            set_api_server_urls(args.adk_api_servers.split(","))
         demo.launch()
     else:
         dir_path = (
@@ -206,7 +430,23 @@ def main():
             / "adk_gradio_example"
             / "adk_agents"
         )
-        app = get_fast_api_app(agents_dir=str(dir_path), web=False)
+        if args.session_db == "memory":
+            app = get_fast_api_app(agents_dir=str(dir_path), web=False)
+        else:
+            app = create_adk_api_app(
+                SQLiteSessionService(args.session_db),
+                agents_dir=str(dir_path),
+            )
+        # same module object as the one imported by the ADK agent loader, which
+        # puts agents_dir on sys.path (see weather_agent/credentials.py)
+        if str(dir_path) not in sys.path:
+            sys.path.insert(0, str(dir_path))
+        from weather_agent.credentials import ApiKeyMiddleware
+
+        app.add_middleware(ApiKeyMiddleware)
+        set_api_server_url(f"http://localhost:{args.adk_api_server_port}")
+        if args.in_process_adk_api:
+            use_in_process_app(app)
         app = gr.mount_gradio_app(app, demo, path="/gradio")
         uvicorn.run(app, host="0.0.0.0", port=args.adk_api_server_port, reload=False)
 
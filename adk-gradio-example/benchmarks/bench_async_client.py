@@ -0,0 +1,134 @@
+"""Concurrent-session throughput of the sync vs async chat handlers.
+
+Runs a chat turn of `app.py` (`chat_turn_async`, or its sync version from
+`sync_handlers`: streamed response and new events) for
+many simulated Gradio sessions against a local fake ADK server, then fetches the
+traces and graphs of all the events of the turn, as opening each of them in the
+inspector would. The sync path runs on a thread pool sized like Gradio's worker
+pool, the async path on a single event loop.
+
+    cd adk-gradio-example
+    python -m benchmarks.bench_async_client --sessions 200 --turns 3
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+from gradio_agent_inspector import InspectorSession, InspectorPatch
+
+from benchmarks.fake_adk_server import FakeADKConfig, FakeADKServer
+from benchmarks.stats import latency_summary
+
+
+def _summary(name: str, wall: float, turn_latencies: List[float], turns: int) -> Dict:
+    return {
+        "path": name,
+        "wall_s": round(wall, 3),
+        "turns": turns,
+        "turns_per_s": round(turns / wall, 1),
+        **latency_summary(turn_latencies),
+    }
+
+
+def _events_to_enrich(inspector: InspectorSession) -> Dict:
+    # copies, so that the events held by the InspectorSession stay unchanged
+    events = inspector.value["events"] if inspector.value else []
+    return {
+        "events": [dict(e) for e in events if "trace" not in e or "graph" not in e]
+    }
+
+
+def _trace_and_graph_patch(client, inspector: InspectorSession) -> InspectorPatch:
+    from adk_gradio_example.adk_enrichment import enrich_session_sync
+
+    res = _events_to_enrich(inspector)
+    enrich_session_sync(client, res)
+    return inspector.upsert_events(res["events"], resolve=client.trace_store.lookup)
+
+
+async def _trace_and_graph_patch_async(
+    client, inspector: InspectorSession
+) -> InspectorPatch:
+    from adk_gradio_example.adk_enrichment import enrich_session
+
+    res = _events_to_enrich(inspector)
+    await enrich_session(client, res)
+    return inspector.upsert_events(res["events"], resolve=client.trace_store.lookup)
+
+
+def run_sync(sync_handlers, sessions: int, turns: int, threads: int) -> Dict:
+    latencies: List[float] = []
+
+    def session_worker(i: int) -> None:
+        request = SimpleNamespace(session_hash=f"sync-{i}")
+        history = []
+        inspector = InspectorSession()
+        for t in range(turns):
+            start = time.perf_counter()
+            for _ in sync_handlers.chat_turn(
+                f"weather {t}", history, inspector, request
+            ):
+                pass
+            client = sync_handlers.adk_client(request.session_hash)
+            _trace_and_graph_patch(client, inspector)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(session_worker, range(sessions)))
+    return _summary("sync", time.perf_counter() - start, latencies, sessions * turns)
+
+
+async def run_async(app, sessions: int, turns: int) -> Dict:
+    latencies: List[float] = []
+
+    async def session_worker(i: int) -> None:
+        request = SimpleNamespace(session_hash=f"async-{i}")
+        history = []
+        inspector = InspectorSession()
+        for t in range(turns):
+            start = time.perf_counter()
+            async for _ in app.chat_turn_async(
+                f"weather {t}", history, inspector, request
+            ):
+                pass
+            client = await app.async_adk_client(request.session_hash)
+            await _trace_and_graph_patch_async(client, inspector)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session_worker(i) for i in range(sessions)))
+    return _summary("async", time.perf_counter() - start, latencies, sessions * turns)
+
+
+def main():
+    parser = argparse.ArgumentParser("bench_async_client")
+    parser.add_argument("--sessions", default=100, type=int)
+    parser.add_argument("--turns", default=3, type=int)
+    parser.add_argument("--run-latency", default=0.2, type=float)
+    parser.add_argument(
+        "--threads", default=40, type=int, help="sync worker threads (Gradio default: 40)"
+    )
+    args = parser.parse_args()
+
+    config = FakeADKConfig(run_latency=args.run_latency)
+    with FakeADKServer(config) as server:
+        os.environ["ADK_API_SERVER_URL"] = server.base_url
+        import app
+        from benchmarks import sync_handlers
+
+        results = [
+            run_sync(sync_handlers, args.sessions, args.turns, args.threads),
+            asyncio.run(run_async(app, args.sessions, args.turns)),
+        ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Sessions spread over several fake ADK API servers, with one going down and back.
+
+Runs concurrent chat sessions through the app's async client registry against
+`--servers` fake ADK API servers, in three phases:
+
+1. all servers up: new sessions are spread over the servers
+2. the first server is stopped: once the health checks eject it, its sessions
+   are restarted on the other servers, and no new session goes to it
+3. the server is restarted on the same port: once readmitted, it gets new
+   sessions again
+
+Prints, per phase, how many sessions each server holds, the failed turns, and the
+pool statistics.
+
+    cd adk-gradio-example
+    python -m benchmarks.bench_backends --servers 3 --sessions 30
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+import json
+import time
+from typing import Dict, List
+
+from adk_gradio_example.adk_backends import BackendPool, configure_backends
+from adk_gradio_example.adk_simple_client import (
+    async_adk_client,
+    async_client_registry,
+)
+
+from benchmarks.fake_adk_server import FakeADKConfig, FakeADKServer
+
+
+async def _turn(key: str, message: str) -> str:
+    """Sends one message; returns the URL of the server that handled it, or "" on error."""
+    client = await async_adk_client(key)
+    try:
+        async for _ in client.stream_message(message):
+            pass
+    except Exception:
+        return ""
+    return client.base_url
+
+
+async def _phase(name: str, keys: List[str], turns: int, pool: BackendPool) -> Dict:
+    failures = 0
+    servers: Counter = Counter()
+    for t in range(turns):
+        urls = await asyncio.gather(*(_turn(key, f"weather {t}") for key in keys))
+        failures += sum(1 for url in urls if not url)
+        if t == turns - 1:
+            servers.update(url for url in urls if url)
+    return {
+        "phase": name,
+        "sessions_per_server": {url: servers.get(url, 0) for url in pool.urls},
+        "failed_turns": failures,
+        "pool": [b.to_dict() for b in pool.stats()],
+    }
+
+
+def _wait_for(predicate, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("health checks did not converge")
+        time.sleep(0.05)
+
+
+async def run(args) -> List[Dict]:
+    config = FakeADKConfig(run_latency=args.run_latency)
+    servers = [FakeADKServer(config).start() for _ in range(args.servers)]
+    pool = configure_backends(
+        [s.base_url for s in servers], interval=args.health_interval, fall=2, rise=2
+    )
+    keys = [f"session-{i}" for i in range(args.sessions)]
+    results = []
+    try:
+        results.append(await _phase("all up", keys, args.turns, pool))
+
+        down = servers[0]
+        down.stop()
+        await asyncio.to_thread(
+            _wait_for, lambda: not pool.is_healthy(down.base_url), 30
+        )
+        results.append(await _phase("first server down", keys, args.turns, pool))
+
+        servers[0] = FakeADKServer(config, port=down.port).start()
+        await asyncio.to_thread(_wait_for, lambda: pool.is_healthy(down.base_url), 30)
+        # new Gradio sessions
+        keys = [f"session-{i}" for i in range(args.sessions, 2 * args.sessions)]
+        results.append(await _phase("first server back", keys, args.turns, pool))
+        results.append({"registry": async_client_registry.stats().to_dict()})
+    finally:
+        pool.stop()
+        for server in servers:
+            server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--servers", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=30)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--run-latency", type=float, default=0.05)
+    parser.add_argument("--health-interval", type=float, default=0.5)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Per-turn latency of the async client over loopback HTTP vs in-process ASGI calls.
+
+Both modes run the fake ADK API server in the same process and on the same event
+loop as the client, as `app.py --no-external-adk-api-server` does with the real
+one; only the way the client reaches it changes:
+
+- loopback: HTTP requests to uvicorn on 127.0.0.1
+- in-process: `StreamingASGITransport`, calling the FastAPI app directly
+
+A turn is what the Gradio handlers do for one message: stream the agent response
+from `/run_sse`, fetch the new events, then fetch their traces and graphs.
+
+    cd adk-gradio-example
+    python -m benchmarks.bench_in_process --turns 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import httpx
+import uvicorn
+
+from adk_gradio_example.adk_asgi_transport import in_process_client
+from adk_gradio_example.adk_cache import ByteLRUCache
+from adk_gradio_example.adk_enrichment import enrich_session
+from adk_gradio_example.adk_simple_client import AsyncADKChatClient
+
+from benchmarks.fake_adk_server import FakeADKConfig, _free_port, create_fake_adk_app
+from benchmarks.stats import latency_summary
+
+
+async def _run_turns(http_client: httpx.AsyncClient, base_url: str, turns: int) -> List[float]:
+    client = AsyncADKChatClient(
+        user_session_id="bench",
+        base_url=base_url,
+        http_client=http_client,
+        cache=ByteLRUCache(),
+    )
+    await client.start_session()
+    latencies = []
+    for t in range(turns):
+        start = time.perf_counter()
+        async for _ in client.stream_message(f"weather {t}"):
+            pass
+        session = await client.get_new_events()
+        await enrich_session(client, session)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _summary(mode: str, latencies: List[float], warmup: int) -> Dict:
+    latencies = latencies[warmup:]
+    return {"mode": mode, "turns": len(latencies), **latency_summary(latencies)}
+
+
+async def run(turns: int, warmup: int, config: FakeADKConfig) -> List[Dict]:
+    app = create_fake_adk_app(config)
+
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        async with httpx.AsyncClient(
+            headers={"Content-Type": "application/json"}
+        ) as http_client:
+            loopback = await _run_turns(
+                http_client, f"http://127.0.0.1:{port}", turns + warmup
+            )
+    finally:
+        server.should_exit = True
+        await serve
+
+    async with in_process_client(app) as http_client:
+        in_process = await _run_turns(http_client, "http://adk", turns + warmup)
+
+    return [
+        _summary("loopback", loopback, warmup),
+        _summary("in-process", in_process, warmup),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument(
+        "--run-latency",
+        type=float,
+        default=0.0,
+        help="seconds spent by the fake agent per turn (0 to measure the overhead only)",
+    )
+    args = parser.parse_args()
+
+    config = FakeADKConfig(run_latency=args.run_latency, debug_latency=0.0)
+    results = asyncio.run(run(args.turns, args.warmup, config))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""End-to-end benchmark of the chat -> events -> trace/graph pipeline of `app.py`.
+
+Starts the fake ADK API server (see `fake_adk_server`: deterministic agent with
+tool calls, configurable latency, no LLM or network) in a separate process, and
+drives `--sessions` simulated Gradio sessions of `--turns` turns each through the
+handler the chat tab runs for every message, `chat_turn_async`: it shows the
+user message, streams the agent response, then adds the new events to the
+inspector. Each turn then opens its last event in the inspector, which fetches
+its trace and graph (`load_event_details_async`).
+
+The sync path runs the same turn with the sync client (`sync_handlers`), on a
+thread pool sized like Gradio's, the async one on one event loop. Each path runs
+twice: once timed, once under `tracemalloc` to measure the peak memory (tracing
+slows Python down, so it is kept out of the timed run).
+
+The JSON output has, per path, the turn latency p50/p95/p99, the time to the first
+streamed event (TTFT), the throughput and the peak traced memory, and the peak
+RSS of the process. With `--baseline`, the relative change of each metric from a
+previous output is added.
+
+    cd adk-gradio-example
+    python -m benchmarks.bench_suite --sessions 50 --turns 5 --output bench.json
+    python -m benchmarks.bench_suite --sessions 50 --turns 5 --baseline bench.json
+"""
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+import gradio as gr
+from gradio_agent_inspector import InspectorSession
+
+from benchmarks.fake_adk_server import FakeADKConfig, FakeADKServer
+from benchmarks.stats import latency_summary
+
+
+def _last_event(inspector: InspectorSession) -> gr.SelectData:
+    events = (inspector.value or {}).get("events", [])
+    return gr.SelectData(None, {"index": len(events) - 1, "value": events[-1]["id"]})
+
+
+class _Recorder:
+    def __init__(self):
+        self.turns: List[float] = []
+        self.ttft: List[float] = []
+
+    def record(self, start: float, client) -> None:
+        self.turns.append(time.perf_counter() - start)
+        timing = client.last_turn_timing
+        if timing is not None and timing.ttft_ms is not None:
+            self.ttft.append(timing.ttft_ms / 1000)
+
+
+def run_sync(
+    sync_handlers, prefix: str, sessions: int, turns: int, threads: int
+) -> _Recorder:
+    recorder = _Recorder()
+
+    def session_worker(i: int) -> None:
+        request = SimpleNamespace(session_hash=f"{prefix}-{i}")
+        history: list = []
+        inspector = InspectorSession()
+        for t in range(turns):
+            start = time.perf_counter()
+            message = f"weather {t}"
+            for _ in sync_handlers.chat_turn(message, history, inspector, request):
+                pass
+            sync_handlers.load_event_details(inspector, _last_event(inspector), request)
+            recorder.record(start, sync_handlers.adk_client(request.session_hash))
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(session_worker, range(sessions)))
+    return recorder
+
+
+async def run_async(app, prefix: str, sessions: int, turns: int) -> _Recorder:
+    recorder = _Recorder()
+
+    async def session_worker(i: int) -> None:
+        request = SimpleNamespace(session_hash=f"{prefix}-{i}")
+        history: list = []
+        inspector = InspectorSession()
+        for t in range(turns):
+            start = time.perf_counter()
+            message = f"weather {t}"
+            async for _ in app.chat_turn_async(message, history, inspector, request):
+                pass
+            await app.load_event_details_async(
+                inspector, _last_event(inspector), request
+            )
+            recorder.record(start, await app.async_adk_client(request.session_hash))
+
+    await asyncio.gather(*(session_worker(i) for i in range(sessions)))
+    return recorder
+
+
+def _measure(path: str, run: Callable[[str], _Recorder]) -> Dict:
+    start = time.perf_counter()
+    recorder = run(f"{path}-timed")
+    wall = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        run(f"{path}-traced")
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "path": path,
+        "turns": len(recorder.turns),
+        "wall_s": round(wall, 3),
+        "turns_per_s": round(len(recorder.turns) / wall, 1),
+        **latency_summary(recorder.turns),
+        **latency_summary(recorder.ttft, prefix="ttft"),
+        "peak_traced_mib": round(peak / 2**20, 2),
+    }
+
+
+def _peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _compare(results: Dict, baseline: Dict) -> Dict:
+    """Relative change of each numeric metric, per path, from `baseline`."""
+    previous = {r["path"]: r for r in baseline.get("paths", [])}
+    changes = {}
+    for result in results["paths"]:
+        before = previous.get(result["path"])
+        if before is None:
+            continue
+        changes[result["path"]] = {
+            key: round(value / before[key] - 1, 3)
+            for key, value in result.items()
+            if isinstance(value, (int, float))
+            and isinstance(before.get(key), (int, float))
+            and before[key]
+        }
+    return changes
+
+
+def run(args, baseline: Optional[Dict] = None) -> Dict:
+    config = FakeADKConfig(
+        run_latency=args.run_latency,
+        debug_latency=args.debug_latency,
+        tool_calls=args.tool_calls,
+        seed=args.seed,
+    )
+    with FakeADKServer(config) as server:
+        import app
+        from benchmarks import sync_handlers
+
+        app.set_api_server_url(server.base_url)
+        paths = []
+        if args.paths in ("sync", "both"):
+            paths.append(
+                _measure(
+                    "sync",
+                    lambda prefix: run_sync(
+                        sync_handlers, prefix, args.sessions, args.turns, args.threads
+                    ),
+                )
+            )
+        if args.paths in ("async", "both"):
+            paths.append(
+                _measure(
+                    "async",
+                    lambda prefix: asyncio.run(
+                        run_async(app, prefix, args.sessions, args.turns)
+                    ),
+                )
+            )
+
+    results = {
+        "config": {
+            "sessions": args.sessions,
+            "turns": args.turns,
+            "threads": args.threads,
+            **asdict(config),
+        },
+        "python": platform.python_version(),
+        "paths": paths,
+        "peak_rss_mib": _peak_rss_mib(),
+    }
+    if baseline is not None:
+        results["change_from_baseline"] = _compare(results, baseline)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--paths", choices=["sync", "async", "both"], default="both")
+    parser.add_argument(
+        "--threads", type=int, default=40, help="sync worker threads (Gradio default: 40)"
+    )
+    parser.add_argument(
+        "--run-latency",
+        type=float,
+        default=0.2,
+        help="seconds spent by the fake agent per turn",
+    )
+    parser.add_argument(
+        "--debug-latency",
+        type=float,
+        default=0.005,
+        help="seconds spent by the fake server per trace or graph lookup",
+    )
+    parser.add_argument("--tool-calls", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write the JSON results to")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare to")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    results = run(args, baseline)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
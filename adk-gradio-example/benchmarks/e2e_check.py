@@ -0,0 +1,127 @@
+"""End-to-end check of the values sent to the AgentInspector, with the real ADK API server.
+
+Builds the embedded ADK API server of `app.py` (SQLite sessions, the weather agent
+with its scripted model: no network or API key) and calls it in-process, then
+runs a few chat turns through `chat_turn_async` and opens every event in the
+inspector (`load_event_details_async`). Each value sent to the AgentInspector is
+encoded the way Gradio's queue sends it to the browser
+(`orjson.dumps(..., default=str)`), so the real traces are exercised: their
+128-bit `trace_id`, the events without a trace (user messages), the tool
+responses. The session is then exported to a session archive
+(`export_session_archive_async`) and replayed in the AgentInspector
+(`ArchiveReplay`), step by step.
+
+    cd adk-gradio-example
+    python -m benchmarks.e2e_check
+"""
+
+import argparse
+import asyncio
+import os
+from pathlib import Path
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import gradio as gr
+import orjson
+
+ROOT = Path(__file__).resolve().parent.parent
+AGENTS_DIR = ROOT / "adk_gradio_example" / "adk_agents"
+
+
+def build_adk_api_app(session_db: str):
+    """The embedded ADK API server of `app.py`, called in-process by the async clients."""
+    from adk_gradio_example.adk_http_pool import use_in_process_app
+    from adk_gradio_example.adk_simple_client import set_api_server_url
+    from adk_gradio_example.adk_sqlite_sessions import (
+        SQLiteSessionService,
+        create_adk_api_app,
+    )
+
+    app = create_adk_api_app(SQLiteSessionService(session_db), agents_dir=str(AGENTS_DIR))
+    if str(AGENTS_DIR) not in sys.path:
+        sys.path.insert(0, str(AGENTS_DIR))
+    set_api_server_url("http://localhost:8000")
+    use_in_process_app(app)
+    return app
+
+
+def _send(inspector_component, value) -> None:
+    # as the /queue/data stream of Gradio
+    if value is gr.skip() or isinstance(value, dict) and value.get("__type__"):
+        return
+    orjson.dumps(inspector_component.postprocess(value), default=str)
+
+
+async def check(turns: int, archive_path: str) -> dict:
+    import app
+    from gradio_agent_inspector import (
+        AgentInspector,
+        ArchiveReplay,
+        InspectorSession,
+        SessionArchive,
+    )
+
+    from adk_gradio_example.adk_archive import export_session_archive_async
+
+    component = AgentInspector(render=False)
+    request = SimpleNamespace(session_hash="e2e-check")
+    history: list = []
+    inspector = InspectorSession()
+    payloads = 0
+    for t in range(turns):
+        async for _, _, patch, _ in app.chat_turn_async(
+            f"what is the weather in New York ({t})", history, inspector, request
+        ):
+            _send(component, patch)
+            payloads += 1
+
+    events = inspector.value["events"]
+    for i, e in enumerate(events):
+        select = gr.SelectData(None, {"index": i, "value": e["id"]})
+        patch, inspector = await app.load_event_details_async(inspector, select, request)
+        _send(component, patch)
+        payloads += 1
+
+    events = inspector.value["events"]
+    traced = [e for e in events if e.get("trace")]
+    missing = [e["id"] for e in events if "trace" not in e or "graph" not in e]
+    if missing:
+        raise AssertionError(f"events still waiting for their trace or graph: {missing}")
+    if not any(isinstance(e["trace"].get("trace_id"), str) for e in traced):
+        raise AssertionError("no trace with its trace_id")
+
+    client = await app.async_adk_client(request.session_hash)
+    steps = await export_session_archive_async(client, archive_path)
+    replay = ArchiveReplay(SessionArchive(archive_path))
+    for _ in range(steps):
+        _send(component, replay.next())
+        payloads += 1
+    replayed = replay.inspector.value["events"]
+    if [e["id"] for e in replayed] != [e["id"] for e in events]:
+        raise AssertionError("the replayed archive does not hold the session events")
+    missing = [e["id"] for e in replayed if "trace" not in e or "graph" not in e]
+    if missing:
+        raise AssertionError(f"events archived without their trace or graph: {missing}")
+    return {
+        "events": len(events),
+        "traced": len(traced),
+        "archived_steps": steps,
+        "payloads": payloads,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--turns", type=int, default=2)
+    args = parser.parse_args()
+    os.environ.setdefault("WEATHER_AGENT_MODEL", "scripted")
+    with tempfile.TemporaryDirectory() as tmp:
+        build_adk_api_app(os.path.join(tmp, "sessions.db"))
+        archive_path = os.path.join(tmp, "session.ndjson.gz")
+        print(asyncio.run(check(args.turns, archive_path)))
+
+
+if __name__ == "__main__":
+    main()
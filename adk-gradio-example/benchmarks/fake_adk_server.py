@@ -0,0 +1,333 @@
+"""Local stand-in for the ADK API server, used by the benchmarks.
+
+It implements the endpoints `ADKChatClient` calls (sessions, `/run`, `/run_sse`,
+traces and event graphs) with the same JSON shapes as `adk api_server`, and sleeps for a
+configurable time instead of calling an LLM.
+
+The agent is deterministic: each turn makes `tool_calls` calls to `get_weather`,
+then answers with the weather report; ids come from a generator seeded with
+`seed`, so two servers with the same config return the same ids for the same
+sequence of requests (only the timestamps differ).
+"""
+
+import asyncio
+from dataclasses import dataclass
+import json
+import multiprocessing
+import random
+import socket
+import string
+import time
+from typing import Dict, List, Optional
+import uuid
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import uvicorn
+
+AGENT_NAME = "weather_agent_v1"
+
+GRAPH_DOT_SRC = (
+    "digraph {\n\tgraph [bgcolor=\"#333537\" rankdir=LR]\n"
+    "\tweather_agent_v1 [label=\"🤖 weather_agent_v1\" shape=ellipse]\n"
+    "\tget_weather [label=\"🔧 get_weather\" shape=box style=rounded]\n"
+    "\tweather_agent_v1 -> get_weather [arrowhead=none]\n}\n"
+)
+
+
+@dataclass
+class FakeADKConfig:
+    run_latency: float = 0.2
+    """Seconds spent in `/run`, standing in for the LLM and tool calls."""
+    debug_latency: float = 0.005
+    """Seconds spent in each trace and graph lookup."""
+    stream_chunks: int = 4
+    """Number of partial text events sent by `/run_sse` when streaming."""
+    tool_calls: int = 1
+    """Number of function call / response pairs per turn."""
+    seed: int = 0
+    """Seed of the event, invocation and call ids."""
+
+
+class RunRequest(BaseModel):
+    app_name: str
+    user_id: str
+    session_id: str
+    new_message: Dict
+    streaming: bool = False
+
+
+def _event_id(rng: random.Random) -> str:
+    # like `Event.new_id`
+    return "".join(rng.choices(string.ascii_letters + string.digits, k=8))
+
+
+def _make_event(
+    rng: random.Random, invocation_id: str, author: str, role: str, part: Dict
+) -> Dict:
+    return {
+        "content": {"parts": [part], "role": role},
+        "invocationId": invocation_id,
+        "author": author,
+        "actions": {"stateDelta": {}, "artifactDelta": {}, "requestedAuthConfigs": {}},
+        "id": _event_id(rng),
+        "timestamp": time.time(),
+    }
+
+
+def _agent_turn(user_text: str, rng: random.Random, tool_calls: int = 1) -> List[Dict]:
+    """Events of one turn: the user message, the tool calls and responses, the answer."""
+    invocation_id = f"e-{uuid.UUID(int=rng.getrandbits(128))}"
+    report = "The weather in New York is sunny with a temperature of 25°C."
+    events = [_make_event(rng, invocation_id, "user", "user", {"text": user_text})]
+    for _ in range(tool_calls):
+        call_id = f"adk-{uuid.UUID(int=rng.getrandbits(128))}"
+        events.append(
+            _make_event(
+                rng,
+                invocation_id,
+                AGENT_NAME,
+                "model",
+                {"functionCall": {"id": call_id, "args": {"city": "New York"}, "name": "get_weather"}},
+            )
+        )
+        events.append(
+            _make_event(
+                rng,
+                invocation_id,
+                AGENT_NAME,
+                "user",
+                {
+                    "functionResponse": {
+                        "id": call_id,
+                        "name": "get_weather",
+                        "response": {"status": "success", "report": report},
+                    }
+                },
+            )
+        )
+    events.append(
+        _make_event(rng, invocation_id, AGENT_NAME, "model", {"text": report + "\n"})
+    )
+    return events
+
+
+def _trace_for(session: Dict, event: Dict) -> Dict:
+    """Attributes of the span of `event`, as kept by ADK's `ApiServerSpanExporter`.
+
+    The ids are OpenTelemetry's: a 128-bit `trace_id` per invocation and a
+    64-bit `span_id`, as JSON integers.
+    """
+    trace = {
+        "gen_ai.system": "gcp.vertex.agent",
+        "gcp.vertex.agent.invocation_id": event["invocationId"],
+        "gcp.vertex.agent.event_id": event["id"],
+        "trace_id": uuid.UUID(event["invocationId"][len("e-") :]).int,
+        "span_id": uuid.uuid5(uuid.NAMESPACE_OID, event["id"]).int >> 64,
+    }
+    if event["content"]["parts"][0].get("functionResponse"):
+        # `tool_response` span: no LLM call, empty request and response
+        trace.update(
+            {
+                "gcp.vertex.agent.tool_response": json.dumps(event),
+                "gcp.vertex.agent.llm_request": "{}",
+                "gcp.vertex.agent.llm_response": "{}",
+            }
+        )
+        return trace
+    contents = [e["content"] for e in session["events"] if e["timestamp"] < event["timestamp"]]
+    trace.update(
+        {
+            "gen_ai.request.model": "fake-model",
+            "gcp.vertex.agent.session_id": session["id"],
+            "gcp.vertex.agent.llm_request": json.dumps(
+                {"model": "fake-model", "config": {}, "contents": contents}
+            ),
+            "gcp.vertex.agent.llm_response": json.dumps(
+                {"content": event["content"], "partial": False}
+            ),
+        }
+    )
+    return trace
+
+
+def create_fake_adk_app(config: Optional[FakeADKConfig] = None) -> FastAPI:
+    config = config or FakeADKConfig()
+    app = FastAPI()
+    sessions: Dict[str, Dict] = {}
+    events_by_id: Dict[str, tuple] = {}
+    rng = random.Random(config.seed)
+
+    @app.get("/list-apps")
+    async def list_apps():
+        return ["weather_agent"]
+
+    @app.post("/apps/{app_name}/users/{user_id}/sessions")
+    async def create_session(app_name: str, user_id: str):
+        session = {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "appName": app_name,
+            "userId": user_id,
+            "state": {},
+            "events": [],
+            "lastUpdateTime": time.time(),
+        }
+        sessions[session["id"]] = session
+        return session
+
+    @app.get("/apps/{app_name}/users/{user_id}/sessions/{session_id}")
+    async def get_session(app_name: str, user_id: str, session_id: str):
+        if session_id not in sessions:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return sessions[session_id]
+
+    @app.get("/apps/{app_name}/users/{user_id}/sessions/{session_id}/events")
+    async def get_events_after(
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after_timestamp: Optional[float] = None,
+        author: Optional[str] = None,
+    ):
+        # same as the route of adk_sqlite_sessions
+        if session_id not in sessions:
+            raise HTTPException(status_code=404, detail="Session not found")
+        session = sessions[session_id]
+        events = [
+            e
+            for e in session["events"]
+            if (after_timestamp is None or e["timestamp"] >= after_timestamp)
+            and (author is None or e["author"] == author)
+        ]
+        return {**session, "events": events}
+
+    @app.delete("/apps/{app_name}/users/{user_id}/sessions/{session_id}")
+    async def delete_session(app_name: str, user_id: str, session_id: str):
+        sessions.pop(session_id, None)
+
+    def get_run_session(req: RunRequest) -> Dict:
+        session = sessions.get(req.session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        return session
+
+    def append_event(session: Dict, event: Dict) -> None:
+        event["timestamp"] = time.time()
+        session["events"].append(event)
+        events_by_id[event["id"]] = (session, event)
+        session["lastUpdateTime"] = event["timestamp"]
+
+    @app.post("/run")
+    async def run(req: RunRequest):
+        session = get_run_session(req)
+        await asyncio.sleep(config.run_latency)
+        user_text = req.new_message["parts"][0].get("text", "")
+        events = _agent_turn(user_text, rng, config.tool_calls)
+        for e in events:
+            append_event(session, e)
+        session["state"]["last_response"] = events[-1]["content"]["parts"][0]["text"]
+        return events[1:]
+
+    @app.post("/run_sse")
+    async def run_sse(req: RunRequest):
+        session = get_run_session(req)
+        user_text = req.new_message["parts"][0].get("text", "")
+        user_event, *tool_events, answer = _agent_turn(
+            user_text, rng, config.tool_calls
+        )
+
+        async def event_generator():
+            # half of the latency before the tool calls, half spread over the text
+            append_event(session, user_event)
+            await asyncio.sleep(config.run_latency / 2)
+            for e in tool_events:
+                append_event(session, e)
+                yield f"data: {json.dumps(e)}\n\n"
+            text = answer["content"]["parts"][0]["text"]
+            if req.streaming and config.stream_chunks > 0:
+                size = -(-len(text) // config.stream_chunks)
+                for i in range(0, len(text), size):
+                    await asyncio.sleep(config.run_latency / 2 / config.stream_chunks)
+                    chunk = {**answer, "id": _event_id(rng), "partial": True}
+                    chunk["content"] = {"parts": [{"text": text[i : i + size]}], "role": "model"}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+            else:
+                await asyncio.sleep(config.run_latency / 2)
+            append_event(session, answer)
+            session["state"]["last_response"] = text
+            yield f"data: {json.dumps(answer)}\n\n"
+
+        return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+    @app.get("/debug/trace/{event_id}")
+    async def get_trace(event_id: str):
+        await asyncio.sleep(config.debug_latency)
+        session, event = events_by_id.get(event_id, (None, None))
+        # user events have no span
+        if event is None or event["author"] == "user":
+            raise HTTPException(status_code=404, detail="Trace not found")
+        return _trace_for(session, event)
+
+    @app.get("/apps/{app_name}/users/{user_id}/sessions/{session_id}/events/{event_id}/graph")
+    async def get_graph(app_name: str, user_id: str, session_id: str, event_id: str):
+        await asyncio.sleep(config.debug_latency)
+        if event_id not in events_by_id:
+            return {}
+        return {"dotSrc": GRAPH_DOT_SRC}
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(config: FakeADKConfig, port: int) -> None:
+    uvicorn.run(
+        create_fake_adk_app(config), host="127.0.0.1", port=port, log_level="warning"
+    )
+
+
+class FakeADKServer:
+    """Runs the fake ADK API server with uvicorn in a separate process.
+
+    The server gets its own interpreter so that it does not compete for the GIL
+    with the clients being measured.
+
+    Usage:
+        with FakeADKServer(FakeADKConfig(run_latency=0.1)) as server:
+            client = ADKChatClient(base_url=server.base_url)
+    """
+
+    def __init__(self, config: Optional[FakeADKConfig] = None, port: Optional[int] = None):
+        self.config = config or FakeADKConfig()
+        self.port = port or _free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._process = multiprocessing.get_context("spawn").Process(
+            target=_serve, args=(self.config, self.port), daemon=True
+        )
+
+    def start(self, timeout: float = 30.0) -> "FakeADKServer":
+        self._process.start()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return self
+            except OSError:
+                time.sleep(0.05)
+        self.stop()
+        raise RuntimeError(f"Fake ADK server did not start on port {self.port}")
+
+    def stop(self) -> None:
+        self._process.terminate()
+        self._process.join()
+
+    def __enter__(self) -> "FakeADKServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,32 @@
+"""Latency statistics shared by the benchmark scripts."""
+
+import statistics
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """`q`-th percentile (0-100) of `sorted_values`, by linear interpolation."""
+    if not sorted_values:
+        return float("nan")
+    k = (len(sorted_values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def latency_summary(latencies: List[float], prefix: str = "turn") -> Dict:
+    """p50/p95/p99/mean/max, in milliseconds, of `latencies` given in seconds."""
+    values = sorted(latencies)
+    if not values:
+        return {}
+
+    def ms(value: float) -> float:
+        return round(value * 1000, 2)
+
+    return {
+        f"{prefix}_p50_ms": ms(percentile(values, 50)),
+        f"{prefix}_p95_ms": ms(percentile(values, 95)),
+        f"{prefix}_p99_ms": ms(percentile(values, 99)),
+        f"{prefix}_mean_ms": ms(statistics.fmean(values)),
+        f"{prefix}_max_ms": ms(values[-1]),
+    }
@@ -0,0 +1,104 @@
+"""Sync counterparts of the chat handlers of `app.py`, for the benchmarks.
+
+The app only wires the async handlers (`chat_turn_async`,
+`load_event_details_async`) to its Blocks. These run the same turn with the sync
+`ADKChatClient` on a thread, as Gradio runs sync handlers on its worker pool, so
+the benchmarks can compare both paths.
+"""
+
+import logging
+from typing import Iterator, List, Tuple
+import uuid
+
+import gradio as gr
+from gradio_agent_inspector import InspectorPatch, InspectorSession
+
+from adk_gradio_example.adk_chat_turn import (
+    append_error,
+    append_stream_event,
+    patch_with_new_events,
+    selected_event_to_enrich,
+    stream_event_patch,
+)
+from adk_gradio_example.adk_enrichment import enrich_session_sync
+from adk_gradio_example.adk_simple_client import adk_client
+
+logger = logging.getLogger(__name__)
+
+
+def _new_events_patch(
+    client, history: list, inspector: InspectorSession
+) -> InspectorPatch:
+    try:
+        res = client.get_new_events()
+    except Exception as e:
+        logger.exception("Could not fetch the events of session %s", client.session_id)
+        append_error(history, f"Could not update the inspector: {e}")
+        return gr.skip()
+    if not isinstance(res, dict):
+        logger.error("Could not fetch the events: %s", res)
+        append_error(history, res)
+        return inspector.reset()
+    return patch_with_new_events(inspector, res)
+
+
+def load_event_details(
+    inspector: InspectorSession, evt: gr.SelectData, request: gr.Request
+):
+    """Sync version of `app.load_event_details_async`"""
+    res = selected_event_to_enrich(inspector, evt.value)
+    if res is None:
+        return gr.skip(), inspector
+    session_id = request.session_hash if request else str(uuid.uuid4())
+    client = adk_client(session_id)
+    enrich_session_sync(client, res)
+    patch = inspector.upsert_events(res["events"], resolve=client.trace_store.lookup)
+    return patch, inspector
+
+
+def _stream_agent_response(
+    client, user_message: str, history: list, inspector: InspectorSession
+) -> Iterator[Tuple]:
+    if not user_message.strip() or not client.session_id:
+        if user_message.strip():
+            history.append(
+                gr.ChatMessage(
+                    role="assistant",
+                    content="Please setup the agent connection first using the Setup tab.",
+                )
+            )
+        yield history, gr.skip(), inspector
+        return
+
+    streamed = None
+    try:
+        for event in client.stream_message(user_message):
+            streamed = append_stream_event(history, event, streamed)
+            patch = stream_event_patch(inspector, event, client.session_id)
+            yield history, patch, inspector
+    except Exception as e:
+        logger.exception("Streamed turn of session %s failed", client.session_id)
+        append_error(history, f"The agent could not answer: {e}")
+        yield history, gr.skip(), inspector
+
+
+def chat_turn(
+    user_message: str,
+    history: List[Tuple[str, str]],
+    inspector: InspectorSession,
+    request: gr.Request,
+) -> Iterator[Tuple]:
+    """Sync version of `app.chat_turn_async`"""
+    session_id = request.session_hash if request else str(uuid.uuid4())
+    client = adk_client(session_id)
+    if user_message.strip():
+        history.append(gr.ChatMessage(role="user", content=user_message))
+    yield "", history, gr.skip(), inspector
+
+    for history, patch, inspector in _stream_agent_response(
+        client, user_message, history, inspector
+    ):
+        yield gr.skip(), history, patch, inspector
+    if not user_message.strip() or not client.session_id:
+        return
+    yield gr.skip(), history, _new_events_patch(client, history, inspector), inspector
@@ -0,0 +1,92 @@
+import asyncio
+import itertools
+
+from adk_gradio_example.adk_session_registry import (
+    AsyncSessionRegistry,
+    SessionRegistry,
+)
+
+_session_ids = itertools.count()
+
+
+class FakeClient:
+    def __init__(self, key, base_url=None):
+        self.key = key
+        self.base_url = base_url or "http://adk"
+        self.session_id = None
+        self.custom_api_key = None
+
+    def set_custom_api_key(self, custom_api_key):
+        self.custom_api_key = custom_api_key
+
+    def start_session(self):
+        self.session_id = f"session-{next(_session_ids)}"
+        return True
+
+    def end_session(self):
+        self.session_id = None
+
+
+class AsyncFakeClient(FakeClient):
+    async def start_session(self):
+        return super().start_session()
+
+    async def end_session(self):
+        super().end_session()
+
+
+def test_api_key_survives_eviction_and_rebind():
+    registry = SessionRegistry(FakeClient, capacity=1, idle_ttl=None)
+    first = registry.get("a")
+    registry.set_api_key("a", "key-a")
+    assert first.custom_api_key == "key-a"
+
+    registry.get("b")
+    assert "a" not in registry
+
+    rebound = registry.get("a")
+    assert rebound is not first
+    assert rebound.session_id == first.session_id
+    assert rebound.custom_api_key == "key-a"
+    assert registry.stats().rebinds == 1
+
+
+def test_eviction_keeps_the_adk_session():
+    evicted = []
+    registry = SessionRegistry(
+        FakeClient,
+        capacity=1,
+        idle_ttl=None,
+        on_evict=lambda key, client: evicted.append((key, client)),
+    )
+    first = registry.get("a")
+    session_id = first.session_id
+    registry.get("b")
+
+    assert evicted == [("a", first)]
+    assert first.session_id == session_id
+    assert registry.stats().evictions == 1
+
+
+def test_api_key_is_forgotten_on_discard():
+    registry = SessionRegistry(FakeClient, capacity=1, idle_ttl=None)
+    registry.get("a")
+    registry.set_api_key("a", "key-a")
+    registry.discard("a")
+
+    assert registry.get("a").custom_api_key is None
+
+
+def test_async_api_key_survives_eviction_and_rebind():
+    async def run():
+        registry = AsyncSessionRegistry(AsyncFakeClient, capacity=1, idle_ttl=None)
+        first = await registry.get("a")
+        registry.set_api_key("a", "key-a")
+        await registry.get("b")
+
+        rebound = await registry.get("a")
+        assert rebound is not first
+        assert rebound.session_id == first.session_id
+        assert rebound.custom_api_key == "key-a"
+
+    asyncio.run(run())
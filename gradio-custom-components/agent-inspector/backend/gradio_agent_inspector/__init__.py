@@ -1,4 +1,6 @@
-
 from .agent_inspector import AgentInspector
+from .archive import ArchiveReplay, ArchiveWriter, SessionArchive
+from .interning import intern_graph, intern_request, rehydrate_graph, rehydrate_request
+from .patch import InspectorPatch, InspectorSession, diff_sessions
 
-__all__ = ['AgentInspector']
+__all__ = ['AgentInspector', 'ArchiveReplay', 'ArchiveWriter', 'SessionArchive', 'InspectorPatch', 'InspectorSession', 'diff_sessions', 'intern_graph', 'intern_request', 'rehydrate_graph', 'rehydrate_request']
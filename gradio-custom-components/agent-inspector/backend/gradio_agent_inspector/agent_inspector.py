@@ -7,24 +7,36 @@ from gradio.components.base import Component, FormComponent
 from gradio.events import Events
 from gradio.i18n import I18nData
 
+from .patch import InspectorPatch
+from .serialization import loads, to_jsonable
+
 if TYPE_CHECKING:
     from gradio.components import Timer
 
 
 class AgentInspector(FormComponent):
     """
-    Creates a very simple textbox for user to enter string input or display string output.
+    Displays an ADK session (its state and events, with their traces and graphs).
+
+    The value is the session as a dict (or a Pydantic model such as an ADK `Session`),
+    or an `InspectorPatch` to apply to the displayed session. JSON strings are still
+    accepted and parsed.
+
+    Opening an event triggers `select`, with the event id as `gr.SelectData.value` and
+    its position in the event list as `index`: events can be sent without their
+    `trace` and `graph`, which a `select` listener adds when the event is opened.
     """
 
     EVENTS = [
         Events.change,
         Events.input,
         Events.submit,
+        Events.select,
     ]
 
     def __init__(
         self,
-        value: str | Callable | None = None,
+        value: dict | str | Callable | None = None,
         *,
         placeholder: str | None = None,
         label: str | I18nData | None = None,
@@ -44,7 +56,7 @@ class AgentInspector(FormComponent):
     ):
         """
         Parameters:
-            value: default text to provide in textbox. If a function is provided, the function will be called each time the app loads to set the initial value of this component.
+            value: session to display, as a dict, a Pydantic model or a JSON string. If a function is provided, the function will be called each time the app loads to set the initial value of this component.
             placeholder: placeholder hint to provide behind textbox.
             label: the label for this component, displayed above the component if `show_label` is `True` and is also used as the header if there are a table of examples for this component. If None and used in a `gr.Interface`, the label will be the name of the parameter this component corresponds to.
             every: Continously calls `value` to recalculate it if `value` is a function (has no effect otherwise). Can provide a Timer whose tick resets `value`, or a float that provides the regular interval for the reset Timer.
@@ -80,29 +92,81 @@ class AgentInspector(FormComponent):
             preserved_by_key=preserved_by_key,
         )
 
-    def preprocess(self, payload: str | None) -> str | None:
+    def preprocess(self, payload: dict | str | None) -> dict | InspectorPatch | None:
         """
         Parameters:
-            payload: the text entered in the textarea.
+            payload: the last value sent to the frontend, not the displayed session: a whole session, or the `{"ops": [...]}` of the last patch applied to it. Keep the displayed session server-side (see `InspectorSession`) to read it.
         Returns:
-            Passes text value as a {str} into the function.
+            Passes a whole session as a {dict}, or the last patch as an {InspectorPatch}, into the function.
         """
-        return None if payload is None else str(payload)
+        if isinstance(payload, (str, bytes)):
+            payload = loads(payload) if payload else None
+        if isinstance(payload, dict) and isinstance(payload.get("ops"), list):
+            return InspectorPatch(payload["ops"])
+        return payload
 
-    def postprocess(self, value: str | None) -> str | None:
+    def postprocess(self, value: Any) -> dict | None:
         """
         Parameters:
-            value: Expects a {str} returned from function and sets textarea value to it.
+            value: Expects a session {dict} (or a Pydantic model, or a JSON {str}) returned from function, or an {InspectorPatch} to apply to the displayed session.
         Returns:
-            The value to display in the textarea.
+            The value to send to the frontend.
         """
-        return None if value is None else str(value)
+        if value is None:
+            return None
+        if isinstance(value, InspectorPatch):
+            return to_jsonable(value.to_payload())
+        if isinstance(value, (str, bytes)):
+            return loads(value) if value else None
+        return to_jsonable(value)
 
     def api_info(self) -> dict[str, Any]:
-        return {"type": "string"}
+        event = {
+            "type": "object",
+            "properties": {
+                "id": {"type": "string"},
+                "author": {"type": "string"},
+                "timestamp": {"type": "number"},
+                "invocationId": {"type": "string"},
+                "content": {"type": "object"},
+                "actions": {"type": "object"},
+                "trace": {"type": "object"},
+                "graph": {"type": "object"},
+            },
+            "required": ["id"],
+            "additionalProperties": True,
+        }
+        session = {
+            "type": "object",
+            "properties": {
+                "id": {"type": "string"},
+                "appName": {"type": "string"},
+                "userId": {"type": "string"},
+                "state": {"type": "object"},
+                "events": {"type": "array", "items": event},
+                "lastUpdateTime": {"type": "number"},
+            },
+            "additionalProperties": True,
+        }
+        patch = {
+            "type": "object",
+            "properties": {
+                "ops": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"op": {"type": "string"}},
+                        "required": ["op"],
+                        "additionalProperties": True,
+                    },
+                }
+            },
+            "required": ["ops"],
+        }
+        return {"anyOf": [session, patch, {"type": "null"}]}
 
     def example_payload(self) -> Any:
-        return "Hello!!"
+        return {"id": "session-id", "state": {}, "events": []}
 
     def example_value(self) -> Any:
-        return "Hello!!"
+        return {"id": "session-id", "state": {}, "events": []}
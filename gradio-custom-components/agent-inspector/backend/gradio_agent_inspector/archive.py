@@ -0,0 +1,436 @@
+"""Session archives: recorded ADK sessions, replayed step by step in an AgentInspector.
+
+An archive is an append-only file of gzip members, each holding NDJSON records:
+
+- the first member holds the session header, {"type": "session", "id", "appName",
+  "userId", "version"}
+- each step (e.g. a turn of the conversation) is one member: a {"type": "step",
+  "index", "state", "fields"} record, then an {"type": "intern", "values"} record
+  with the values first referenced in this step, then one {"type": "event",
+  "event"} record per event added by the step
+- every `checkpoint_every` steps, a checkpoint member follows the step: a
+  {"type": "checkpoint", "index", "state", "fields", "events"} record with the
+  session after that step (all its events so far)
+
+The traces are stored parsed (their `llm_request` and `llm_response` are JSON, not
+strings), and their request contents and config, and the event graphs, are interned
+(see `interning`): each distinct value is stored once in the archive, in the step
+that first uses it. Concatenated gzip members form a valid gzip file, so
+`zcat session.ndjson.gz` shows every record.
+
+A sidecar index, `<archive>.idx`, holds the offset and length of each member, the
+step of each checkpoint and the step holding each interned value. Reading a step
+is then one seek and the decompression of one member, whatever the size of the
+archive, and the session after any step is read from the checkpoint before it
+and at most `checkpoint_every - 1` steps. The index is rebuilt by scanning the
+members when it is missing or does not match the archive (e.g. after an
+interrupted append).
+
+    with ArchiveWriter("session.ndjson.gz", {"id": ..., "appName": ..., "userId": ...}) as w:
+        w.append_step(events, state=state)
+
+    archive = SessionArchive("session.ndjson.gz")
+    replay = ArchiveReplay(archive)
+    patch = replay.next()  # the InspectorPatch adding the events of the first step
+"""
+
+from __future__ import annotations
+
+import bisect
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+import copy
+from dataclasses import dataclass, field
+import gzip
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Any
+import zlib
+
+from .interning import LLM_REQUEST_KEY, event_refs, intern_graph, intern_request
+from .patch import InspectorPatch, InspectorSession, SessionValue
+from .serialization import dumps, loads, to_jsonable
+
+ARCHIVE_VERSION = 1
+CHECKPOINT_EVERY = 16
+LLM_RESPONSE_KEY = "gcp.vertex.agent.llm_response"
+HEADER_FIELDS = ("id", "appName", "userId")
+
+
+@dataclass
+class ArchiveStep:
+    """The records of one step of an archive."""
+
+    index: int
+    state: dict[str, Any]
+    # other session fields set by the step (e.g. lastUpdateTime)
+    fields: dict[str, Any]
+    events: list[dict[str, Any]]
+    # interned values first referenced by this step, by hash
+    values: dict[str, Any] = field(default_factory=dict)
+
+
+def index_path(path: str | os.PathLike) -> Path:
+    return Path(f"{os.fspath(path)}.idx")
+
+
+def _encode(records: Iterable[dict[str, Any]]) -> bytes:
+    data = "".join(dumps(r) + "\n" for r in records).encode()
+    # mtime=0: the same records give the same bytes
+    return gzip.compress(data, mtime=0)
+
+
+def _decode(member: bytes) -> list[dict[str, Any]]:
+    return [loads(line) for line in gzip.decompress(member).splitlines() if line]
+
+
+def _step_from_records(records: list[dict[str, Any]]) -> ArchiveStep:
+    header = records[0]
+    step = ArchiveStep(header["index"], header.get("state", {}), header.get("fields", {}), [])
+    for r in records[1:]:
+        if r["type"] == "event":
+            step.events.append(r["event"])
+        elif r["type"] == "intern":
+            step.values.update(r["values"])
+    return step
+
+
+def _new_index() -> dict[str, Any]:
+    return {
+        "version": ARCHIVE_VERSION,
+        "header": None,
+        "steps": [],
+        # [step index, offset, length] of each checkpoint
+        "checkpoints": [],
+        "refs": {},
+        "size": 0,
+    }
+
+
+def _scan(path: Path) -> dict[str, Any]:
+    """Rebuilds the index of the complete members of the archive at `path`."""
+    index = _new_index()
+    data = memoryview(path.read_bytes())
+    pos = 0
+    while pos < len(data):
+        decompressor = zlib.decompressobj(wbits=31)
+        try:
+            content = decompressor.decompress(data[pos:])
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            # truncated member: the end of an interrupted append
+            break
+        length = len(data) - pos - len(decompressor.unused_data)
+        records = [loads(line) for line in content.splitlines() if line]
+        if records and records[0]["type"] == "session":
+            index["header"] = [pos, length]
+        elif records and records[0]["type"] == "step":
+            step = _step_from_records(records)
+            for h in step.values:
+                index["refs"].setdefault(h, step.index)
+            index["steps"].append([pos, length])
+        elif records and records[0]["type"] == "checkpoint":
+            index["checkpoints"].append([records[0]["index"], pos, length])
+        pos += length
+    index["size"] = pos
+    return index
+
+
+def _load_index(path: Path) -> dict[str, Any]:
+    try:
+        with index_path(path).open("r", encoding="utf-8") as f:
+            index = json.load(f)
+        if (
+            index.get("version") == ARCHIVE_VERSION
+            and index.get("size") == path.stat().st_size
+            and "checkpoints" in index
+        ):
+            return index
+    except (OSError, ValueError):
+        pass
+    return _scan(path)
+
+
+def _archived_event(event: dict[str, Any], intern: Callable[[str, Any], None]) -> dict[str, Any]:
+    """A copy of `event` with its trace parsed and its request and graph interned."""
+    e = dict(event)
+    for key in ("trace", "graph"):
+        # a trace or graph not fetched (e.g. a failed fetch) is not archived
+        if key in e and not isinstance(e[key], dict):
+            del e[key]
+    trace = e.get("trace")
+    if isinstance(trace, dict):
+        trace = dict(trace)
+        for key in (LLM_REQUEST_KEY, LLM_RESPONSE_KEY):
+            # as returned by the ADK API server: JSON strings
+            if isinstance(trace.get(key), str):
+                trace[key] = loads(trace[key])
+        if isinstance(trace.get(LLM_REQUEST_KEY), dict):
+            trace[LLM_REQUEST_KEY] = intern_request(trace[LLM_REQUEST_KEY], intern)
+        e["trace"] = trace
+    if isinstance(e.get("graph"), dict):
+        e["graph"] = intern_graph(e["graph"], intern)
+    return e
+
+
+class ArchiveWriter:
+    """Appends steps to the archive at `path`, created with the `session` header fields if new.
+
+    Opening an existing archive continues it: a member left incomplete by an
+    interrupted append is dropped. A checkpoint is written every
+    `checkpoint_every` steps (0: none). The index is written by `close` (and on
+    exit of a `with` block).
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        session: dict[str, Any] | None = None,
+        checkpoint_every: int = CHECKPOINT_EVERY,
+    ):
+        self.path = Path(path)
+        self.checkpoint_every = checkpoint_every
+        self.event_ids: set[str] = set()
+        # the session after the last step, for the checkpoints
+        self._fields: dict[str, Any] = {}
+        self._events: list[dict[str, Any]] = []
+        if self.path.exists() and self.path.stat().st_size > 0:
+            self._index = _load_index(self.path)
+            if self._index["size"] != self.path.stat().st_size:
+                os.truncate(self.path, self._index["size"])
+            archive = SessionArchive(self.path)
+            if len(archive):
+                value = archive.session_at(len(archive) - 1)
+                self._events = value.pop("events")
+                self._fields = {
+                    k: v for k, v in value.items() if k not in ("state", *HEADER_FIELDS)
+                }
+            self.event_ids.update(e["id"] for e in self._events)
+        else:
+            self._index = _new_index()
+            header = {k: v for k, v in (session or {}).items() if k in HEADER_FIELDS}
+            self._index["header"] = self._write(
+                [{"type": "session", "version": ARCHIVE_VERSION, **header}]
+            )
+
+    def __len__(self) -> int:
+        return len(self._index["steps"])
+
+    def _write(self, records: list[dict[str, Any]]) -> list[int]:
+        member = _encode(records)
+        with self.path.open("ab") as f:
+            offset = f.tell()
+            f.write(member)
+        self._index["size"] = offset + len(member)
+        return [offset, len(member)]
+
+    def append_step(
+        self,
+        events: list[dict[str, Any]],
+        state: dict[str, Any] | None = None,
+        resolve: Callable[[str], Any] | None = None,
+        **fields: Any,
+    ) -> int:
+        """Appends a step adding `events` and setting the session `state` and `fields`.
+
+        The traces and graphs of the events may already hold references to
+        interned values (e.g. from an ADK chat client's trace store): `resolve(hash)`
+        must then return the values not in the archive yet. Returns the step index.
+        """
+        refs = self._index["refs"]
+        values: dict[str, Any] = {}
+
+        def intern(h: str, value: Any) -> None:
+            if h not in refs:
+                values.setdefault(h, value)
+
+        archived = [_archived_event(to_jsonable(e), intern) for e in events]
+        for e in archived:
+            for h in event_refs(e):
+                if h in refs or h in values:
+                    continue
+                value = resolve(h) if resolve is not None else None
+                if value is None:
+                    raise ValueError(f"Event {e.get('id')} references an unknown value: {h}")
+                values[h] = value
+
+        index = len(self._index["steps"])
+        records: list[dict[str, Any]] = [
+            {"type": "step", "index": index, "state": state or {}, "fields": fields}
+        ]
+        if values:
+            records.append({"type": "intern", "values": values})
+        records.extend({"type": "event", "event": e} for e in archived)
+        self._index["steps"].append(self._write(records))
+        for h in values:
+            refs[h] = index
+        self.event_ids.update(e["id"] for e in archived)
+        self._events.extend(archived)
+        self._fields.update(fields)
+        if self.checkpoint_every > 0 and (index + 1) % self.checkpoint_every == 0:
+            checkpoint = {
+                "type": "checkpoint",
+                "index": index,
+                "state": state or {},
+                "fields": self._fields,
+                "events": self._events,
+            }
+            self._index["checkpoints"].append([index, *self._write([checkpoint])])
+        return index
+
+    def append_session(self, value: SessionValue | Any, resolve: Callable[[str], Any] | None = None) -> int:
+        """Appends a step with the events of the session `value` not archived yet, and its state."""
+        value = to_jsonable(value)
+        events = [e for e in value.get("events", []) if e["id"] not in self.event_ids]
+        fields = {
+            k: v for k, v in value.items() if k not in ("events", "state", *HEADER_FIELDS)
+        }
+        return self.append_step(events, value.get("state", {}), resolve=resolve, **fields)
+
+    def close(self) -> None:
+        tmp = index_path(self.path).with_suffix(".idx.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(self._index, f, separators=(",", ":"))
+        os.replace(tmp, index_path(self.path))
+
+    def __enter__(self) -> ArchiveWriter:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class SessionArchive:
+    """Read access to the archive at `path`, one step at a time.
+
+    Only the index is loaded up front; the last `cache_size` steps read are kept
+    decoded. Safe to share between threads (e.g. by every user of a Gradio app).
+    """
+
+    def __init__(self, path: str | os.PathLike, cache_size: int = 8):
+        self.path = Path(path)
+        self._index = _load_index(self.path)
+        self.cache_size = cache_size
+        self._cache: OrderedDict[int, ArchiveStep] = OrderedDict()
+        self._lock = threading.Lock()
+        header = _decode(self._read(self._index["header"]))[0] if self._index["header"] else {}
+        self.session: dict[str, Any] = {k: header[k] for k in HEADER_FIELDS if k in header}
+
+    def __len__(self) -> int:
+        return len(self._index["steps"])
+
+    def _read(self, location: list[int]) -> bytes:
+        offset, length = location
+        with self.path.open("rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def step(self, index: int) -> ArchiveStep:
+        """The records of step `index` (0-based)."""
+        with self._lock:
+            step = self._cache.get(index)
+            if step is not None:
+                self._cache.move_to_end(index)
+                return step
+        step = _step_from_records(_decode(self._read(self._index["steps"][index])))
+        with self._lock:
+            self._cache[index] = step
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return step
+
+    def steps(self) -> Iterator[ArchiveStep]:
+        for i in range(len(self)):
+            yield self.step(i)
+
+    def lookup(self, h: str) -> Any:
+        """The interned value of hash `h`, or None."""
+        index = self._index["refs"].get(h)
+        return None if index is None else self.step(index).values.get(h)
+
+    def initial_value(self) -> SessionValue:
+        """The session before the first step."""
+        return {**self.session, "state": {}, "events": []}
+
+    def _checkpoint_before(self, index: int) -> dict[str, Any] | None:
+        """The record of the last checkpoint at or before step `index`, if any."""
+        checkpoints = self._index["checkpoints"]
+        # written in step order
+        i = bisect.bisect_right(checkpoints, index, key=lambda c: c[0])
+        if i == 0:
+            return None
+        return _decode(self._read(checkpoints[i - 1][1:]))[0]
+
+    def session_at(self, index: int) -> SessionValue:
+        """The session after step `index`: its events hold references to interned values.
+
+        Reads the last checkpoint at or before `index`, then the steps after it.
+        """
+        value = self.initial_value()
+        events: list[dict[str, Any]] = []
+        start = 0
+        checkpoint = self._checkpoint_before(index)
+        if checkpoint is not None:
+            events.extend(checkpoint["events"])
+            value.update(checkpoint["fields"])
+            value["state"] = checkpoint["state"]
+            start = checkpoint["index"] + 1
+        for i in range(start, index + 1):
+            step = self.step(i)
+            events.extend(step.events)
+            value.update(step.fields)
+            value["state"] = step.state
+        value["events"] = events
+        return value
+
+
+class ArchiveReplay:
+    """Replays an archive in an AgentInspector: one per user, e.g. in a `gr.State`.
+
+    `position` is the last step shown (-1: none). Moving to the next step sends
+    the events of that step only; moving elsewhere sends the difference between
+    the displayed session and the session at that step. Copies (as made by
+    `gr.State` for each user) share the archive.
+    """
+
+    def __init__(self, archive: SessionArchive):
+        self.archive = archive
+        self.inspector = InspectorSession()
+        self.position = -1
+
+    def __deepcopy__(self, memo: dict) -> ArchiveReplay:
+        replay = ArchiveReplay(self.archive)
+        replay.inspector = copy.deepcopy(self.inspector, memo)
+        replay.position = self.position
+        return replay
+
+    def __len__(self) -> int:
+        return len(self.archive)
+
+    def seek(self, index: int) -> InspectorPatch:
+        """Shows the session after step `index` (-1: before the first one)."""
+        index = max(-1, min(index, len(self.archive) - 1))
+        if index == self.position and self.inspector.value is not None:
+            patch = InspectorPatch()
+        elif index == self.position + 1 and self.inspector.value is not None:
+            step = self.archive.step(index)
+            patch = self.inspector.upsert_events(
+                step.events, resolve=self.archive.lookup, state=step.state, **step.fields
+            )
+        elif index == -1:
+            patch = self.inspector.update(self.archive.initial_value())
+        else:
+            patch = self.inspector.update(
+                self.archive.session_at(index), resolve=self.archive.lookup
+            )
+        self.position = index
+        return patch
+
+    def next(self) -> InspectorPatch:
+        return self.seek(self.position + 1)
+
+    def reset(self) -> InspectorPatch:
+        return self.seek(-1)
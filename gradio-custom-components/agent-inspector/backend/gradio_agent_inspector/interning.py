@@ -0,0 +1,113 @@
+"""Shared, content-addressed parts of the events displayed by the inspector.
+
+Each LLM request of a trace (`gcp.vertex.agent.llm_request`) repeats the whole
+conversation so far and the same config (system instruction, tools), and the
+graphs of the events of an agent only differ by the highlighted node. To avoid
+storing and sending these parts once per event, they can be replaced by
+references, `{"$ref": hash}`, to values stored once in an intern table:
+
+- `intern_request` replaces each entry of `contents` and the `config` of a request
+  with a reference
+- `intern_graph` replaces the graph of an event with a reference
+- the frontend receives the referenced values with an `intern` patch operation,
+  {"op": "intern", "values": {hash: value}}, before the events using them, and
+  rehydrates the requests and graphs when they are displayed (see
+  `InspectorSession`); it renders each graph once, by hash
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterator
+import hashlib
+import json
+from typing import Any
+
+REF_KEY = "$ref"
+LLM_REQUEST_KEY = "gcp.vertex.agent.llm_request"
+GRAPH_KEY = "graph"
+
+
+def content_hash(value: Any) -> str:
+    """Hash of the canonical JSON form of `value`."""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode(), digest_size=12).hexdigest()
+
+
+def is_ref(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and REF_KEY in value
+
+
+def _ref(value: Any, intern: Callable[[str, Any], None]) -> dict[str, str]:
+    if is_ref(value):
+        return value
+    h = content_hash(value)
+    intern(h, value)
+    return {REF_KEY: h}
+
+
+def intern_request(
+    llm_request: dict[str, Any], intern: Callable[[str, Any], None]
+) -> dict[str, Any]:
+    """Returns a copy of `llm_request` whose contents and config are references.
+
+    `intern(hash, value)` is called for every referenced value.
+    """
+    interned = dict(llm_request)
+    if isinstance(interned.get("contents"), list):
+        interned["contents"] = [_ref(c, intern) for c in interned["contents"]]
+    if interned.get("config"):
+        interned["config"] = _ref(interned["config"], intern)
+    return interned
+
+
+def intern_graph(
+    graph: dict[str, Any], intern: Callable[[str, Any], None]
+) -> dict[str, str]:
+    """Returns a reference to `graph` (an event graph, `{"dotSrc": ...}`)."""
+    return _ref(graph, intern)
+
+
+def request_refs(llm_request: Any) -> Iterator[str]:
+    if not isinstance(llm_request, dict):
+        return
+    for c in llm_request.get("contents") or []:
+        if is_ref(c):
+            yield c[REF_KEY]
+    if is_ref(llm_request.get("config")):
+        yield llm_request["config"][REF_KEY]
+
+
+def event_refs(event: dict[str, Any]) -> Iterator[str]:
+    """Hashes referenced by the graph of `event` and the LLM request of its trace."""
+    trace = event.get("trace")
+    if isinstance(trace, dict):
+        yield from request_refs(trace.get(LLM_REQUEST_KEY))
+    if is_ref(event.get(GRAPH_KEY)):
+        yield event[GRAPH_KEY][REF_KEY]
+
+
+def rehydrate_request(
+    llm_request: dict[str, Any], lookup: Callable[[str], Any]
+) -> dict[str, Any]:
+    """Inverse of `intern_request`; unknown references are left as is."""
+
+    def resolve(value: Any) -> Any:
+        if is_ref(value):
+            resolved = lookup(value[REF_KEY])
+            return value if resolved is None else resolved
+        return value
+
+    rehydrated = dict(llm_request)
+    if isinstance(rehydrated.get("contents"), list):
+        rehydrated["contents"] = [resolve(c) for c in rehydrated["contents"]]
+    if "config" in rehydrated:
+        rehydrated["config"] = resolve(rehydrated["config"])
+    return rehydrated
+
+
+def rehydrate_graph(graph: Any, lookup: Callable[[str], Any]) -> Any:
+    """Inverse of `intern_graph`; an unknown reference is left as is."""
+    if is_ref(graph):
+        resolved = lookup(graph[REF_KEY])
+        return graph if resolved is None else resolved
+    return graph
@@ -0,0 +1,182 @@
+"""Incremental updates for the AgentInspector value.
+
+Instead of sending the whole session on every update, an `InspectorPatch` carries a
+list of operations that the frontend applies in place to the session it displays:
+
+- {"op": "reset", "value": session}: replace the whole session
+- {"op": "append_events", "events": [...]}: append new events
+- {"op": "insert_events", "before": event_id, "events": [...]}: insert new events
+  before an existing one (e.g. the user event of a turn whose agent events were
+  streamed first)
+- {"op": "patch_event", "id": event_id, "fields": {...}, "remove": [...]}: set or
+  remove top-level fields of an event (e.g. attach its trace and graph)
+- {"op": "patch_state", "set": {...}, "remove": [...]}: set or remove state keys
+- {"op": "set", "key": key, "value": value}: set another top-level session field
+- {"op": "intern", "values": {hash: value}}: add values referenced by the LLM
+  requests of the events to the frontend intern table (see `interning`)
+
+The cost of an update is then proportional to what changed, not to the size of the
+session.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from .interning import event_refs
+from .serialization import to_jsonable
+
+SessionValue = dict[str, Any]
+
+
+@dataclass
+class InspectorPatch:
+    """A list of operations to apply to the session displayed by an AgentInspector."""
+
+    ops: list[dict[str, Any]] = field(default_factory=list)
+
+    def to_payload(self) -> dict[str, Any]:
+        return {"ops": self.ops}
+
+
+def _diff_dict(previous: dict, current: dict) -> tuple[dict, list]:
+    changed = {k: v for k, v in current.items() if k not in previous or previous[k] != v}
+    removed = [k for k in previous if k not in current]
+    return changed, removed
+
+
+def diff_sessions(previous: SessionValue | None, current: SessionValue | None) -> InspectorPatch:
+    """Computes the operations turning `previous` into `current`.
+
+    Events are expected to be added only (as ADK session events are): if an event
+    of `previous` is missing from `current` or the order changed, a single reset
+    operation is returned.
+    """
+    if current is None:
+        return InspectorPatch([{"op": "reset", "value": None}])
+    if previous is None or previous.get("id") != current.get("id"):
+        return InspectorPatch([{"op": "reset", "value": current}])
+
+    previous_events = previous.get("events", [])
+    current_events = current.get("events", [])
+    ops = []
+    inserted = []
+    i = 0
+    for c in current_events:
+        if i < len(previous_events) and previous_events[i]["id"] == c["id"]:
+            if inserted:
+                ops.append({"op": "insert_events", "before": c["id"], "events": inserted})
+                inserted = []
+            p = previous_events[i]
+            i += 1
+            if p is c or p == c:
+                continue
+            fields, removed = _diff_dict(p, c)
+            ops.append({"op": "patch_event", "id": c["id"], "fields": fields, "remove": removed})
+        else:
+            inserted.append(c)
+    if i < len(previous_events):
+        # an event was removed or moved
+        return InspectorPatch([{"op": "reset", "value": current}])
+    if inserted:
+        ops.append({"op": "append_events", "events": inserted})
+
+    state_set, state_removed = _diff_dict(previous.get("state", {}), current.get("state", {}))
+    if state_set or state_removed:
+        ops.append({"op": "patch_state", "set": state_set, "remove": state_removed})
+
+    for key, value in current.items():
+        if key not in ("events", "state") and previous.get(key) != value:
+            ops.append({"op": "set", "key": key, "value": value})
+    return InspectorPatch(ops)
+
+
+def _op_events(op: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    if op["op"] == "reset" and op.get("value"):
+        yield from op["value"].get("events", [])
+    elif op["op"] in ("append_events", "insert_events"):
+        yield from op["events"]
+    elif op["op"] == "patch_event":
+        yield op["fields"]
+
+
+class InspectorSession:
+    """Server-side copy of the session displayed by one browser's AgentInspector.
+
+    Keep one per user (e.g. in a `gr.State`) and return the patches it produces from
+    event handlers whose output is the AgentInspector. Values passed in are kept by
+    reference and must not be mutated afterwards.
+    """
+
+    def __init__(self):
+        self.value: SessionValue | None = None
+        # hashes of the interned values already sent to the frontend
+        self.interned: set[str] = set()
+
+    def update(
+        self,
+        value: SessionValue | Any | None,
+        resolve: Callable[[str], Any] | None = None,
+    ) -> InspectorPatch:
+        """Replaces the displayed session (a dict or a Pydantic model) and returns the patch to send.
+
+        If the LLM requests of the events hold references to interned values,
+        `resolve(hash)` must return the referenced values: the ones the frontend
+        does not have yet are sent first, in an intern operation.
+        """
+        value = to_jsonable(value)
+        patch = diff_sessions(self.value, value)
+        self.value = value
+        if resolve is not None:
+            self._add_interned(patch, resolve)
+        return patch
+
+    def _add_interned(self, patch: InspectorPatch, resolve: Callable[[str], Any]) -> None:
+        values = {}
+        for op in patch.ops:
+            for e in _op_events(op):
+                for h in event_refs(e):
+                    if h in self.interned or h in values:
+                        continue
+                    value = resolve(h)
+                    if value is not None:
+                        values[h] = value
+        if values:
+            self.interned.update(values)
+            patch.ops.insert(0, {"op": "intern", "values": values})
+
+    def upsert_events(
+        self,
+        events: list[dict[str, Any]],
+        resolve: Callable[[str], Any] | None = None,
+        **fields: Any,
+    ) -> InspectorPatch:
+        """Adds or replaces events (matched by id), and sets other session fields.
+
+        New events are placed in timestamp order.
+        """
+        value = dict(self.value or {"state": {}, "events": []})
+        value.update(fields)
+        merged = list(value.get("events", []))
+        positions = {e["id"]: i for i, e in enumerate(merged)}
+        out_of_order = False
+        for e in events:
+            if e["id"] in positions:
+                merged[positions[e["id"]]] = e
+            else:
+                out_of_order = out_of_order or (
+                    bool(merged)
+                    and e.get("timestamp", 0) < merged[-1].get("timestamp", 0)
+                )
+                positions[e["id"]] = len(merged)
+                merged.append(e)
+        if out_of_order:
+            # stable: events with equal timestamps keep their order
+            merged.sort(key=lambda e: e.get("timestamp", 0))
+        value["events"] = merged
+        return self.update(value, resolve=resolve)
+
+    def reset(self) -> InspectorPatch:
+        return self.update(None)
@@ -0,0 +1,65 @@
+"""Compact JSON (de)serialization of inspector values.
+
+orjson (a dependency of gradio) is used when it is importable, the standard
+library otherwise. Both produce compact output, without indentation.
+
+orjson, which Gradio also uses to send component values to the browser, only
+encodes 64-bit integers, and the OpenTelemetry ids of ADK traces (`trace_id`) are
+128-bit: `to_jsonable` turns the integers out of that range into strings.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# range of the integers orjson encodes
+_INT_MIN = -(2**63)
+_INT_MAX = 2**64 - 1
+
+
+def dumps(value: Any) -> str:
+    value = to_jsonable(value)
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(value: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
+def _without_big_ints(value: Any) -> Any:
+    # returns `value` itself when it has no integer to convert
+    if isinstance(value, int):
+        return str(value) if not _INT_MIN <= value <= _INT_MAX else value
+    if isinstance(value, dict):
+        converted = {k: _without_big_ints(v) for k, v in value.items()}
+        if any(converted[k] is not v for k, v in value.items()):
+            return converted
+        return value
+    if isinstance(value, list):
+        converted = [_without_big_ints(v) for v in value]
+        if any(c is not v for c, v in zip(converted, value)):
+            return converted
+        return value
+    return value
+
+
+def to_jsonable(value: Any) -> Any:
+    """Converts a Pydantic model (e.g. an ADK `Session`) to JSON-compatible data.
+
+    Integers orjson cannot encode are replaced by their decimal string; other
+    values are returned as is (the containers of converted integers are copied).
+    """
+    model_dump = getattr(value, "model_dump", None)
+    if callable(model_dump):
+        value = model_dump(mode="json", by_alias=True, exclude_none=True)
+    return _without_big_ints(value)
@@ -0,0 +1,51 @@
+"""Builds the session archive replayed by the demo from the recorded samples.
+
+Each `session-sample/value-*.json` is a snapshot of the session after a turn: the
+events it adds to the previous one, with their trace and graph from `event-trace`,
+become a step of `session-sample.ndjson.gz` (see `gradio_agent_inspector.archive`).
+
+    python demo/build_archive.py
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+from gradio_agent_inspector import ArchiveWriter
+
+DEMO_DIR = Path(__file__).resolve().parent
+
+
+def _load(path: Path):
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_archive(output: Path, samples: Path, traces: Path) -> int:
+    output.unlink(missing_ok=True)
+    snapshots = [_load(p) for p in sorted(samples.glob("value-[0-9]*.json"))]
+    with ArchiveWriter(output, snapshots[0]) as writer:
+        for snapshot in snapshots:
+            for e in snapshot["events"]:
+                # the trace keeps its llm_request / llm_response strings: they
+                # are parsed once, when archived
+                if (traces / f"trace-{e['id']}.json").exists():
+                    e["trace"] = _load(traces / f"trace-{e['id']}.json")
+                if (traces / f"graph-{e['id']}.json").exists():
+                    e["graph"] = _load(traces / f"graph-{e['id']}.json")
+            writer.append_session(snapshot)
+    return len(snapshots)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--output", default=DEMO_DIR / "session-sample.ndjson.gz", type=Path)
+    parser.add_argument("--samples", default=DEMO_DIR / "session-sample", type=Path)
+    parser.add_argument("--traces", default=DEMO_DIR / "event-trace", type=Path)
+    args = parser.parse_args()
+    steps = build_archive(args.output, args.samples, args.traces)
+    print(f"{args.output}: {steps} steps, {args.output.stat().st_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Synthetic large session, to measure the render and update time of the AgentInspector.
+
+`make_session(turns)` builds an ADK session of `turns` weather turns (user
+message, function call, function response, answer), with a trace and a graph on
+each agent event, like the ones in `event-trace`. The app shows it in an
+AgentInspector and measures:
+
+- "Load": the whole session sent to the inspector
+- "Append turn": one more turn, sent as a patch (only the new events)
+
+For each, the time to build the patch and its size on the server, and the time
+from the click to the next frame painted by the browser after the update.
+
+    python demo/large_session.py --turns 1000
+    python demo/large_session.py --turns 1000 --output session-large.json
+"""
+
+import argparse
+import json
+import random
+import time
+
+import gradio as gr
+from gradio_agent_inspector import AgentInspector, InspectorSession
+
+CITIES = ["New York", "London", "Tokyo", "Paris", "Berlin", "Sydney"]
+
+GRAPH = {
+    "dotSrc": 'digraph {\n\tgraph [bgcolor="#333537" rankdir=LR]\n'
+    '\tweather_agent_v1 [label="🤖 weather_agent_v1" color="#0F5223" fillcolor="#0F5223" '
+    'fontcolor="#cccccc" shape=ellipse style="filled,rounded"]\n'
+    '\tget_weather [label="🔧 get_weather" color="#cccccc" fontcolor="#cccccc" '
+    "shape=box style=rounded]\n"
+    '\tweather_agent_v1 -> get_weather [arrowhead=none color="#cccccc"]\n}\n'
+}
+
+
+def _event_id(rng: random.Random) -> str:
+    alphabet = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    return "".join(rng.choice(alphabet) for _ in range(8))
+
+
+def _trace(event_id: str, invocation_id: str, parts: list) -> dict:
+    return {
+        "gen_ai.system": "gcp.vertex.agent",
+        "gen_ai.request.model": "gemini-2.0-flash",
+        "gcp.vertex.agent.invocation_id": invocation_id,
+        "gcp.vertex.agent.event_id": event_id,
+        "gcp.vertex.agent.llm_request": {
+            "model": "gemini-2.0-flash",
+            "config": {"system_instruction": "You are a helpful weather assistant."},
+            "contents": [{"parts": [{"text": "what is the weather"}], "role": "user"}],
+        },
+        "gcp.vertex.agent.llm_response": {"content": {"parts": parts, "role": "model"}},
+    }
+
+
+def make_turn(rng: random.Random, timestamp: float, with_traces: bool = True) -> list:
+    """The four events of a weather turn."""
+    city = rng.choice(CITIES)
+    invocation_id = f"e-{rng.getrandbits(64):016x}"
+    call_id = f"adk-{rng.getrandbits(64):016x}"
+    report = f"The weather in {city} is sunny with a temperature of {rng.randint(0, 35)}°C."
+    contents = [
+        ("user", "user", [{"text": f"what is the weather in {city}"}]),
+        (
+            "weather_agent_v1",
+            "model",
+            [{"functionCall": {"id": call_id, "args": {"city": city}, "name": "get_weather"}}],
+        ),
+        (
+            "weather_agent_v1",
+            "user",
+            [
+                {
+                    "functionResponse": {
+                        "id": call_id,
+                        "name": "get_weather",
+                        "response": {"status": "success", "report": report},
+                    }
+                }
+            ],
+        ),
+        ("weather_agent_v1", "model", [{"text": report + "\n"}]),
+    ]
+    events = []
+    for i, (author, role, parts) in enumerate(contents):
+        event_id = _event_id(rng)
+        event = {
+            "content": {"parts": parts, "role": role},
+            "invocationId": invocation_id,
+            "author": author,
+            "actions": {"stateDelta": {}, "artifactDelta": {}, "requestedAuthConfigs": {}},
+            "id": event_id,
+            "timestamp": timestamp + i * 0.001,
+        }
+        if with_traces and author != "user":
+            event["trace"] = _trace(event_id, invocation_id, parts)
+            event["graph"] = GRAPH
+        events.append(event)
+    return events
+
+
+def make_session(turns: int, seed: int = 0, with_traces: bool = True) -> dict:
+    rng = random.Random(seed)
+    events = []
+    for t in range(turns):
+        events.extend(make_turn(rng, 1749409305.0 + t, with_traces))
+    return {
+        "id": "large-session",
+        "appName": "weather_agent",
+        "userId": "user",
+        "state": {"last_city_checked_stateful": CITIES[0]},
+        "events": events,
+    }
+
+
+# runs before the handler: start of the measure
+START_JS = "(...args) => { window.__inspector_t0 = performance.now(); return args; }"
+# runs after the update: waits for the next painted frame
+PAINT_JS = """(server) => new Promise((resolve) => requestAnimationFrame(() => setTimeout(() =>
+  resolve(server + `, click to paint: ${(performance.now() - window.__inspector_t0).toFixed(0)} ms`)
+)))"""
+
+
+def _timing(label: str, start: float, patch, events: int) -> str:
+    elapsed = (time.perf_counter() - start) * 1000
+    size = len(json.dumps(patch.to_payload()))
+    return f"{label} ({events} events): patch {elapsed:.1f} ms, {size / 1024:.0f} KiB"
+
+
+def build_demo(turns: int, seed: int = 0) -> gr.Blocks:
+    with gr.Blocks() as demo:
+        gr.Markdown(f"# 🕵️ Agent Inspector: session of {turns * 4} events")
+        inspector_session = gr.State(InspectorSession())
+        next_turn = gr.State(turns)
+        agent_inspector = AgentInspector()
+        with gr.Row():
+            load_btn = gr.Button("⏬ Load", variant="primary")
+            append_btn = gr.Button("➕ Append turn", variant="secondary")
+        server_timing = gr.Textbox(visible=False)
+        timing = gr.Textbox(label="Timing", interactive=False)
+
+        def load(inspector: InspectorSession):
+            start = time.perf_counter()
+            session = make_session(turns, seed)
+            inspector.reset()
+            patch = inspector.update(session)
+            return patch, inspector, turns, _timing("Load", start, patch, len(session["events"]))
+
+        def append(inspector: InspectorSession, turn: int):
+            start = time.perf_counter()
+            events = make_turn(random.Random(seed + turn), 1749409305.0 + turn)
+            patch = inspector.upsert_events(events)
+            total = len(inspector.value["events"])
+            return patch, inspector, turn + 1, _timing("Append turn", start, patch, total)
+
+        for btn, fn, inputs in (
+            (load_btn, load, [inspector_session]),
+            (append_btn, append, [inspector_session, next_turn]),
+        ):
+            btn.click(
+                fn,
+                inputs=inputs,
+                outputs=[agent_inspector, inspector_session, next_turn, server_timing],
+                js=START_JS,
+            ).then(None, inputs=[server_timing], outputs=[timing], js=PAINT_JS)
+    return demo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--turns", type=int, default=1000, help="4 events per turn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="writes the session as JSON instead of serving it")
+    args = parser.parse_args()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(make_session(args.turns, args.seed), f)
+        return
+    build_demo(args.turns, args.seed).launch()
+
+
+if __name__ == "__main__":
+    main()